@@ -0,0 +1,87 @@
+"""Database throughput per engine profile.
+
+Each profile runs in its own process (settings are read at import) against a
+fresh SQLite file: WRITERS tasks commit one leaderboard row at a time while
+READERS tasks read the top 100 of the leaderboard from the table (the
+in-memory leaderboard cache is turned off), for DURATION seconds.
+
+    uv run python benchmarks/db_profiles.py [--duration 5] [--writers 8] [--readers 8]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+PROFILES = {
+    # What db.py did before engine profiles: SQL echo and SQLite's rollback journal
+    "legacy": {"DB_PROFILE": "development", "SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL",
+               "SQLITE_MMAP_SIZE": "0"},
+    "development": {"DB_PROFILE": "development"},
+    "production": {"DB_PROFILE": "production", "AUTH_SECRET_KEYS": "bench:benchmark-only-secret"},
+}
+
+
+async def run(duration: float, writers: int, readers: int) -> dict:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.db import init_db, close_db_connection, AsyncSessionLocal
+    from src.database import get_leaderboard
+    from src.tables import LeaderboardEntry
+
+    await init_db()
+    deadline = time.perf_counter() + duration
+    counts = {"writes": 0, "reads": 0}
+
+    async def write(n: int):
+        while time.perf_counter() < deadline:
+            async with AsyncSessionLocal() as session:
+                session.add(LeaderboardEntry(id=str(uuid.uuid4()), username=f"bench{n}", score=counts["writes"], gameMode="walls", date=datetime.now()))
+                await session.commit()
+            counts["writes"] += 1
+
+    async def read():
+        while time.perf_counter() < deadline:
+            async with AsyncSessionLocal() as session:
+                await get_leaderboard(session, "walls", 100)
+            counts["reads"] += 1
+
+    await asyncio.gather(*[write(n) for n in range(writers)], *[read() for _ in range(readers)])
+    await close_db_connection()
+    return {name: round(count / duration, 1) for name, count in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        # Child process: SQL echo goes to stdout, so the result is printed to stderr
+        result = asyncio.run(run(args.duration, args.writers, args.readers))
+        print(json.dumps(result), file=sys.stderr)
+        return
+
+    results = {}
+    for profile, settings in PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, **settings, "DATABASE_URL": f"sqlite+aiosqlite:///{directory}/bench.db",
+                   "LEADERBOARD_CACHE_ENABLED": "false"}
+            child = subprocess.run(
+                [sys.executable, __file__, "--profile", profile, "--duration", str(args.duration),
+                 "--writers", str(args.writers), "--readers", str(args.readers)],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+            )
+            results[profile] = json.loads(child.stderr.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -21,16 +21,15 @@ async def inspect():
         count = result.scalar()
         print(f"Total Users: {count}")
         
-        result = await session.execute(select(User))
-        users = result.scalars().all()
-        for user in users:
+        # Streamed in batches, so memory stays flat however large the tables are
+        users = await session.stream_scalars(select(User).execution_options(yield_per=1000))
+        async for user in users:
             print(f"  ID: {user.id}, Username: {user.username}, Email: {user.email}")
 
         # List Leaderboard
         print("\n--- Leaderboard Entries ---")
-        result = await session.execute(select(LeaderboardEntry).order_by(LeaderboardEntry.score.desc()))
-        entries = result.scalars().all()
-        for entry in entries:
+        entries = await session.stream_scalars(select(LeaderboardEntry).order_by(LeaderboardEntry.score.desc()).execution_options(yield_per=1000))
+        async for entry in entries:
             print(f"  User: {entry.username}, Score: {entry.score}, Mode: {entry.gameMode}, Date: {entry.date}")
 
 if __name__ == "__main__":
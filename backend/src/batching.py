@@ -0,0 +1,126 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from .models import LeaderboardEntry as PydanticLeaderboardEntry
+from .tables import LeaderboardEntry, PersonalBest
+
+
+def dialect_insert(session: AsyncSession):
+    """insert() with ON CONFLICT support for the session's database (PostgreSQL or SQLite)."""
+    return postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+
+
+async def upsert_personal_bests(session: AsyncSession, entries: List[dict]):
+    """Record new leaderboard entries in personal_bests where they beat the user's best for the mode.
+
+    One INSERT ... ON CONFLICT DO UPDATE for the whole list. A tie keeps the
+    existing row, which is older and so ranks first.
+    """
+    best: Dict[Tuple[str, str], dict] = {}
+    for values in entries:
+        key = (values["username"], values["gameMode"])
+        # A statement may only touch each row once, so reduce to one entry per key first
+        current = best.get(key)
+        if current is None or (-values["score"], values["date"], values["id"]) < (-current["score"], current["date"], current["id"]):
+            best[key] = values
+    if not best:
+        return
+    statement = dialect_insert(session)(PersonalBest).values([
+        {"username": v["username"], "gameMode": v["gameMode"], "entryId": v["id"], "score": v["score"], "date": v["date"]}
+        for v in best.values()
+    ])
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=[PersonalBest.username, PersonalBest.gameMode],
+        set_={"entryId": statement.excluded.entryId, "score": statement.excluded.score, "date": statement.excluded.date},
+        where=PersonalBest.score < statement.excluded.score,
+    ))
+
+
+class ScoreBatcher:
+    """Group commit for leaderboard inserts.
+
+    The first submission of a batch becomes its leader: it waits up to
+    `max_delay` seconds for concurrent submissions to join (or until
+    `max_size` is reached), then writes the whole batch with one multi-row
+    INSERT ... RETURNING and one commit on a session of its own, together
+    with the personal_bests rows the batch improves. Every caller still
+    gets back its own entry. The write opens a fresh session on the
+    leader's engine rather than using the leader's session, so it can
+    outlive a cancelled leader and never commits the leader's unrelated
+    pending work.
+    """
+
+    def __init__(self, max_delay: float, max_size: int):
+        self.max_delay = max_delay
+        self.max_size = max_size
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._full: Optional[asyncio.Event] = None
+        self.batches = 0
+        self.entries = 0
+        self.largest_batch = 0
+
+    async def submit(self, session: AsyncSession, values: dict) -> PydanticLeaderboardEntry:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((values, future))
+        if len(self._pending) == 1:
+            self._full = asyncio.Event()
+            try:
+                await self._wait_for_followers()
+            finally:
+                # Take the batch even if this request was cancelled, so followers are never stranded
+                batch, self._pending = self._pending, []
+                write = asyncio.ensure_future(self._write(session.bind, batch))
+            await asyncio.shield(write)
+        elif len(self._pending) >= self.max_size:
+            self._full.set()
+        return await future
+
+    async def _wait_for_followers(self):
+        if self.max_delay <= 0 or self.max_size <= 1:
+            return
+        try:
+            await asyncio.wait_for(self._full.wait(), self.max_delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _write(self, bind, batch: List[Tuple[dict, asyncio.Future]]):
+        try:
+            async with AsyncSession(bind, expire_on_commit=False) as session:
+                result = await session.execute(
+                    insert(LeaderboardEntry)
+                    .values([values for values, _ in batch])
+                    .returning(LeaderboardEntry.id, LeaderboardEntry.username, LeaderboardEntry.score, LeaderboardEntry.gameMode, LeaderboardEntry.date)
+                )
+                # Multi-row RETURNING does not promise row order, so match rows by id
+                rows = {row.id: row for row in result}
+                await upsert_personal_bests(session, [values for values, _ in batch])
+                await session.commit()
+        except Exception as e:
+            # Leaving the session block has already rolled back the failed transaction
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.entries += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for values, future in batch:
+            row = rows[values["id"]]
+            future.set_result(PydanticLeaderboardEntry(
+                id=row.id,
+                username=row.username,
+                score=row.score,
+                gameMode=row.gameMode,
+                date=row.date
+            ))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "entries": self.entries,
+            "averageBatchSize": self.entries / self.batches if self.batches else 0.0,
+            "largestBatch": self.largest_batch
+        }
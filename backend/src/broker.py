@@ -0,0 +1,437 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import struct
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from .config import LIVE_BROKER, LIVE_BROKER_SOCKET, LIVE_BROKER_CHANNEL, LIVE_BROKER_QUEUE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], None]
+
+# Messages are JSON objects: "k" names the handler ("game" or "leaderboard"),
+# "o" is the publishing broker, and the remaining keys are the event itself.
+# Every broker hears its own messages on some transports, so receivers drop
+# anything carrying their own origin.
+
+
+class Broker(ABC):
+    """Carries live-state events between the worker processes of one deployment.
+
+    Publishing never blocks: `publish` is called from the synchronous update
+    paths of the live hub and leaderboard cache, so transports queue the
+    message and send it from a background task. Received messages are handed
+    to the handler registered for their kind.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex[:12]
+        self._handlers: Dict[str, Handler] = {}
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    @property
+    def active(self) -> bool:
+        """Whether anyone else can hear a publish; publishers skip building events otherwise."""
+        return False
+
+    async def start(self, handlers: Dict[str, Handler]):
+        self._handlers = dict(handlers)
+
+    async def stop(self):
+        self._handlers = {}
+
+    @abstractmethod
+    def publish(self, kind: str, event: dict):
+        """Queue `event` for the other workers' `kind` handler."""
+
+    async def drain(self, timeout: float = 10.0):
+        """Wait until everything published so far has been handed to the transport."""
+
+    def _deliver(self, message: dict):
+        if message.get("o") == self.origin:
+            return
+        handler = self._handlers.get(message.get("k"))
+        if handler is None:
+            return
+        self.received += 1
+        try:
+            handler(message)
+        except Exception:
+            logger.exception("Failed to apply %s event from broker", message.get("k"))
+
+    def stats(self) -> dict:
+        return {"published": self.published, "received": self.received, "dropped": self.dropped}
+
+
+class LocalBus:
+    def __init__(self):
+        self.members: List["LocalBroker"] = []
+
+
+class LocalBroker(Broker):
+    """In-process delivery between brokers sharing a LocalBus.
+
+    The default broker has a bus of its own, so with a single worker
+    nothing is ever published. Tests connect several hubs through one bus.
+    """
+
+    def __init__(self, bus: Optional[LocalBus] = None):
+        super().__init__()
+        self.bus = bus if bus is not None else LocalBus()
+
+    @property
+    def active(self) -> bool:
+        return len(self.bus.members) > 1
+
+    async def start(self, handlers: Dict[str, Handler]):
+        await super().start(handlers)
+        if self not in self.bus.members:
+            self.bus.members.append(self)
+
+    async def stop(self):
+        if self in self.bus.members:
+            self.bus.members.remove(self)
+        await super().stop()
+
+    def publish(self, kind: str, event: dict):
+        message = {"k": kind, "o": self.origin, **event}
+        self.published += 1
+        loop = asyncio.get_running_loop()
+        for member in self.bus.members:
+            if member is not self:
+                loop.call_soon(member._deliver, message)
+
+
+class QueuedBroker(Broker):
+    """Base for transports that send from a background task through a bounded queue."""
+
+    def __init__(self):
+        super().__init__()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def active(self) -> bool:
+        return self._queue is not None
+
+    async def start(self, handlers: Dict[str, Handler]):
+        await super().start(handlers)
+        self._queue = asyncio.Queue(maxsize=LIVE_BROKER_QUEUE_LIMIT)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._queue = None
+        await super().stop()
+
+    def publish(self, kind: str, event: dict):
+        if self._queue is None:
+            return
+        payload = json.dumps({"k": kind, "o": self.origin, **event}, separators=(",", ":")).encode()
+        try:
+            self._queue.put_nowait(payload)
+            self.published += 1
+        except asyncio.QueueFull:
+            # Replicas resync from the next full game state, so shedding beats stalling the publisher
+            self.dropped += 1
+
+    async def drain(self, timeout: float = 10.0):
+        if self._queue is not None:
+            await asyncio.wait_for(self._queue.join(), timeout)
+
+    def _receive(self, payload: bytes):
+        self._deliver(json.loads(payload))
+
+
+_FRAME = struct.Struct(">I")
+
+
+class UnixSocketBroker(QueuedBroker):
+    """Workers on one host exchange events over a Unix domain socket.
+
+    Whichever worker takes the lock file first serves the socket and relays
+    every frame to the other connections; the rest connect as clients. If
+    the relaying worker exits, the others reconnect and one of them takes
+    over. Frames are length-prefixed JSON.
+    """
+
+    RETRY_DELAY = 0.1
+    # A peer whose socket buffer grows past this is too slow to keep up and is dropped
+    MAX_PEER_BUFFER = 4 * 1024 * 1024
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._lock_file = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self._connected = asyncio.Event()
+        self.leader = False
+
+    async def start(self, handlers: Dict[str, Handler]):
+        await super().start(handlers)
+        self._connected = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._send_loop())]
+        try:
+            await asyncio.wait_for(self._connected.wait(), 5)
+        except asyncio.TimeoutError:
+            logger.warning("Live broker socket %s not reachable yet; events are queued", self.path)
+
+    async def stop(self):
+        # Close connections first: a listening server only finishes once its connections have
+        for writer in list(self._peers):
+            writer.close()
+        self._peers.clear()
+        await super().stop()
+        if self._lock_file is not None:
+            if self.leader and os.path.exists(self.path):
+                os.remove(self.path)
+            self._lock_file.close()
+            self._lock_file = None
+        self.leader = False
+
+    def _try_lead(self) -> bool:
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _run(self):
+        while True:
+            if self._try_lead():
+                self.leader = True
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                server = await asyncio.start_unix_server(self._serve_peer, self.path)
+                self._connected.set()
+                try:
+                    await server.serve_forever()
+                finally:
+                    server.close()
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(self.RETRY_DELAY)
+                continue
+            self._peers.add(writer)
+            self._connected.set()
+            try:
+                await self._read_frames(reader, writer)
+            finally:
+                self._peers.discard(writer)
+                self._connected.clear()
+                writer.close()
+            await asyncio.sleep(self.RETRY_DELAY)
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        try:
+            await self._read_frames(reader, writer)
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _read_frames(self, reader: asyncio.StreamReader, source: asyncio.StreamWriter):
+        while True:
+            try:
+                header = await reader.readexactly(_FRAME.size)
+                payload = await reader.readexactly(_FRAME.unpack(header)[0])
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            if self.leader:
+                # Relay to every other client before applying locally
+                self._write(header + payload, exclude=source)
+            self._receive(payload)
+
+    def _write(self, frame: bytes, exclude: Optional[asyncio.StreamWriter] = None):
+        for writer in list(self._peers):
+            if writer is exclude:
+                continue
+            if writer.transport.get_write_buffer_size() > self.MAX_PEER_BUFFER:
+                self._peers.discard(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+
+    async def _send_loop(self):
+        while True:
+            payload = await self._queue.get()
+            await self._connected.wait()
+            self._write(_FRAME.pack(len(payload)) + payload)
+            self._queue.task_done()
+
+    async def drain(self, timeout: float = 10.0):
+        await super().drain(timeout)
+        for writer in list(self._peers):
+            await asyncio.wait_for(writer.drain(), timeout)
+
+
+class PostgresBroker(QueuedBroker):
+    """LISTEN/NOTIFY on a dedicated asyncpg connection, outside the engine's pool.
+
+    The connection is watched: when asyncpg reports it closed, or a periodic
+    ping fails, it is replaced with backoff and LISTEN is issued again.
+    Events published meanwhile wait in the queue. Notifications sent while
+    disconnected are lost, so after a reconnect the leaderboard cache is told
+    to reload; live games catch up at their next full state.
+    """
+
+    # PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+    MAX_PAYLOAD = 7999
+    RETRY_DELAY = 0.5
+    MAX_RETRY_DELAY = 30.0
+    # Seconds between pings, which catch connections dropped without the socket closing
+    HEALTH_CHECK_INTERVAL = 30.0
+    HEALTH_CHECK_TIMEOUT = 5.0
+
+    def __init__(self, connect: Callable[[], Awaitable], channel: str):
+        super().__init__()
+        self.connect = connect
+        self.channel = channel
+        self._driver = None
+        self._connected = asyncio.Event()
+        self._lost = asyncio.Event()
+        # asyncpg runs one operation at a time per connection: NOTIFYs and pings take turns
+        self._lock = asyncio.Lock()
+        self.reconnects = 0
+
+    async def start(self, handlers: Dict[str, Handler]):
+        await super().start(handlers)
+        self._connected = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._send_loop())]
+        try:
+            await asyncio.wait_for(self._connected.wait(), 5)
+        except asyncio.TimeoutError:
+            logger.warning("Live broker cannot reach PostgreSQL yet; events are queued")
+
+    async def _run(self):
+        delay = self.RETRY_DELAY
+        listened = False
+        while True:
+            try:
+                driver = await self.connect()
+            except Exception:
+                logger.warning("Live broker cannot connect to PostgreSQL; retrying in %.1f s", delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.MAX_RETRY_DELAY)
+                continue
+            # Per connection, so the old connection closing cannot cut off its replacement
+            lost = asyncio.Event()
+            try:
+                driver.add_termination_listener(lambda connection: lost.set())
+                await driver.add_listener(self.channel, self._on_notify)
+            except Exception:
+                driver.terminate()
+                logger.warning("Live broker could not LISTEN on PostgreSQL; retrying in %.1f s", delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.MAX_RETRY_DELAY)
+                continue
+            delay = self.RETRY_DELAY
+            if listened:
+                self.reconnects += 1
+                logger.warning("Live broker reconnected to PostgreSQL")
+                self._resync()
+            listened = True
+            self._driver, self._lost = driver, lost
+            self._connected.set()
+            try:
+                await self._watch(driver, lost)
+            finally:
+                self._connected.clear()
+                self._driver = None
+                if not driver.is_closed():
+                    driver.terminate()
+            logger.warning("Live broker lost its PostgreSQL connection; reconnecting")
+            await asyncio.sleep(self.RETRY_DELAY)
+
+    async def _watch(self, driver, lost: asyncio.Event):
+        """Return once the connection is closed or stops answering."""
+        while not driver.is_closed():
+            try:
+                await asyncio.wait_for(lost.wait(), self.HEALTH_CHECK_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                async with self._lock:
+                    await asyncio.wait_for(driver.execute("SELECT 1"), self.HEALTH_CHECK_TIMEOUT)
+            except Exception:
+                return
+
+    def _resync(self):
+        # Changes other workers made while this one was not listening are gone
+        handler = self._handlers.get("leaderboard")
+        if handler is not None:
+            handler({"t": "resync"})
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._receive(payload.encode())
+
+    async def _send_loop(self):
+        while True:
+            payload = await self._queue.get()
+            try:
+                await self._notify(payload)
+            finally:
+                self._queue.task_done()
+
+    async def _notify(self, payload: bytes):
+        if len(payload) > self.MAX_PAYLOAD:
+            self.dropped += 1
+            return
+        await self._connected.wait()
+        driver = self._driver
+        try:
+            async with self._lock:
+                await driver.execute("SELECT pg_notify($1, $2)", self.channel, payload.decode())
+        except Exception:
+            self.dropped += 1
+            if driver.is_closed():
+                # _run reconnects; later events wait for it instead of failing one by one
+                if driver is self._driver:
+                    self._connected.clear()
+                    self._lost.set()
+            else:
+                logger.exception("Failed to publish live event")
+
+
+def postgres_connector(url) -> Callable[[], Awaitable]:
+    """Opens asyncpg connections to the database of SQLAlchemy URL `url`."""
+    dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+    async def connect():
+        import asyncpg
+        return await asyncpg.connect(dsn)
+
+    return connect
+
+
+def create_broker(kind: str) -> Broker:
+    if kind == "local":
+        return LocalBroker()
+    if kind == "unix":
+        return UnixSocketBroker(LIVE_BROKER_SOCKET)
+    if kind == "postgres":
+        from .db import engine
+        if engine.dialect.name != "postgresql":
+            raise ValueError("LIVE_BROKER=postgres needs a PostgreSQL DATABASE_URL")
+        return PostgresBroker(postgres_connector(engine.url), LIVE_BROKER_CHANNEL)
+    raise ValueError(f"Unknown LIVE_BROKER {kind!r}, expected local, unix or postgres")
+
+
+broker = create_broker(LIVE_BROKER)
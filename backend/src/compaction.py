@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import select, delete, func
+from .db import AsyncSessionLocal, init_db, close_db_connection
+from .tables import LeaderboardEntry
+from .replay import replay_recorder
+from .broker import Broker, LocalBroker, broker as default_broker
+
+# Offline retention for the leaderboard table. Only each user's top `keep`
+# entries per game mode are kept, so the table grows with the number of
+# players rather than games played. Personal bests are always among them,
+# and entries newer than `min_age` are left alone so the windowed boards
+# keep every score of their window. Work is done a group of users at a time
+# and deleted in transactions of at most `batch_size` rows, pausing between
+# them, so the job never holds locks for long next to a running server.
+# Each deleted batch is published as leaderboard "remove" events through
+# the configured LIVE_BROKER, so running servers drop those entries from
+# their caches too. With LIVE_BROKER=local no other process can hear them,
+# so restart the server afterwards.
+
+DEFAULT_KEEP = 10
+DEFAULT_MIN_AGE = timedelta(days=32)
+DEFAULT_BATCH_SIZE = 500
+USERS_PER_SCAN = 200
+
+
+async def _surplus_ids(session, usernames: List[str], keep: int, cutoff: datetime) -> List[str]:
+    """Entries of these users outside their top `keep` per mode and older than `cutoff`."""
+    position = func.row_number().over(
+        partition_by=(LeaderboardEntry.username, LeaderboardEntry.gameMode),
+        order_by=(LeaderboardEntry.score.desc(), LeaderboardEntry.date, LeaderboardEntry.id)
+    ).label("position")
+    ranked = select(LeaderboardEntry.id, LeaderboardEntry.date, position).where(LeaderboardEntry.username.in_(usernames)).subquery()
+    result = await session.execute(select(ranked.c.id).where(ranked.c.position > keep, ranked.c.date < cutoff))
+    return list(result.scalars())
+
+
+async def compact(keep: int = DEFAULT_KEEP, min_age: timedelta = DEFAULT_MIN_AGE, batch_size: int = DEFAULT_BATCH_SIZE,
+                  archive: Optional[str] = None, pause: float = 0.05, now: Optional[datetime] = None,
+                  broker: Optional[Broker] = None) -> dict:
+    """Delete surplus leaderboard entries and their replays; returns counts.
+
+    With `archive`, the rows are appended to that file as JSON lines before
+    they are deleted. With a started `broker`, each deleted entry is
+    published as a leaderboard "remove" event.
+    """
+    if keep < 1:
+        raise ValueError("keep must be at least 1, or personal bests would be deleted")
+    cutoff = (now or datetime.now()) - min_age
+    stats = {"users": 0, "deleted": 0, "batches": 0}
+    archive_file = open(archive, "a") if archive else None
+    last_username = None
+    try:
+        while True:
+            async with AsyncSessionLocal() as session:
+                query = select(LeaderboardEntry.username).distinct().order_by(LeaderboardEntry.username).limit(USERS_PER_SCAN)
+                if last_username is not None:
+                    query = query.where(LeaderboardEntry.username > last_username)
+                usernames = list((await session.execute(query)).scalars())
+                if not usernames:
+                    break
+                surplus = await _surplus_ids(session, usernames, keep, cutoff)
+                await session.rollback()
+
+                for start in range(0, len(surplus), batch_size):
+                    ids = surplus[start:start + batch_size]
+                    deleted = (await session.execute(
+                        delete(LeaderboardEntry).where(LeaderboardEntry.id.in_(ids))
+                        .returning(LeaderboardEntry.id, LeaderboardEntry.username, LeaderboardEntry.score, LeaderboardEntry.gameMode, LeaderboardEntry.date)
+                    )).all()
+                    if archive_file is not None:
+                        for row in deleted:
+                            archive_file.write(json.dumps({
+                                "id": row.id, "username": row.username, "score": row.score,
+                                "gameMode": row.gameMode, "date": row.date.isoformat() if row.date else None
+                            }) + "\n")
+                        archive_file.flush()
+                        os.fsync(archive_file.fileno())
+                    await session.commit()
+                    if broker is not None:
+                        for row in deleted:
+                            broker.publish("leaderboard", {"t": "remove", "id": row.id})
+                        # Sent before the next batch, so a long run never overflows the broker's queue
+                        await broker.drain()
+                    for row in deleted:
+                        path = replay_recorder.path_for(row.id)
+                        if path is not None:
+                            os.remove(path)
+                    stats["deleted"] += len(deleted)
+                    stats["batches"] += 1
+                    await asyncio.sleep(pause)
+            stats["users"] += len(usernames)
+            last_username = usernames[-1]
+    finally:
+        if archive_file is not None:
+            archive_file.close()
+    return stats
+
+
+async def _main(args):
+    await init_db()
+    await default_broker.start({})
+    try:
+        stats = await compact(args.keep, timedelta(days=args.min_age_days), args.batch_size, args.archive, args.pause,
+                              broker=default_broker)
+    finally:
+        await default_broker.stop()
+        await close_db_connection()
+    print(f"Deleted {stats['deleted']} leaderboard entries of {stats['users']} users in {stats['batches']} batches")
+    if stats["deleted"] and isinstance(default_broker, LocalBroker):
+        print("LIVE_BROKER=local: running servers were not told; restart them so their leaderboards drop these entries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete leaderboard entries outside each user's top scores per game mode.")
+    parser.add_argument("--keep", type=int, default=DEFAULT_KEEP, help="entries kept per user and game mode")
+    parser.add_argument("--min-age-days", type=float, default=DEFAULT_MIN_AGE.days, help="never delete entries newer than this")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows deleted per transaction")
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds to wait between transactions")
+    parser.add_argument("--archive", help="append deleted rows to this file as JSON lines first")
+    asyncio.run(_main(parser.parse_args()))
@@ -1,4 +1,6 @@
 import os
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 
 # Default to SQLite for local development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./nokia_nostalgia.db")
@@ -9,3 +11,128 @@ if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
 elif DATABASE_URL and DATABASE_URL.startswith("postgresql://"):
      DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+# Seconds between write-behind flushes of live games to the active_games table
+LIVE_FLUSH_INTERVAL = float(os.getenv("LIVE_FLUSH_INTERVAL", "2.0"))
+
+# Spectators whose socket cannot accept a frame within this many seconds are disconnected
+SPECTATOR_SEND_TIMEOUT = float(os.getenv("SPECTATOR_SEND_TIMEOUT", "2.0"))
+# Seconds between keep-alive comments on idle Server-Sent Events streams
+SPECTATOR_KEEPALIVE_INTERVAL = float(os.getenv("SPECTATOR_KEEPALIVE_INTERVAL", "15.0"))
+
+# Delta protocol: spectators get a full keyframe after this many deltas
+DELTA_KEYFRAME_INTERVAL = int(os.getenv("DELTA_KEYFRAME_INTERVAL", "100"))
+# Number of recent deltas kept per game for GET /spectate/{id}/delta catch-up
+DELTA_HISTORY_SIZE = int(os.getenv("DELTA_HISTORY_SIZE", "64"))
+# Delta spectators with more than this many unsent frames are resynced with a keyframe
+SPECTATOR_DELTA_BUFFER = int(os.getenv("SPECTATOR_DELTA_BUFFER", "32"))
+
+# Default and maximum page size for GET /api/leaderboard
+LEADERBOARD_PAGE_SIZE = int(os.getenv("LEADERBOARD_PAGE_SIZE", "100"))
+LEADERBOARD_MAX_PAGE_SIZE = int(os.getenv("LEADERBOARD_MAX_PAGE_SIZE", "500"))
+
+# Serve leaderboard reads from the in-memory ranked cache instead of querying the table
+LEADERBOARD_CACHE_ENABLED = os.getenv("LEADERBOARD_CACHE_ENABLED", "true").lower() == "true"
+
+# bcrypt cost factor; stored hashes made with a different cost are rehashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads hashing passwords in parallel, and how many more calls may wait before logins are rejected
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "16"))
+
+# Session token signing keys, comma-separated and newest first. The first key signs new tokens; it is
+# "key_id:secret", or a bare secret with the key id "default". Every other key only verifies tokens and
+# is "key_id:secret:not_after", where not_after (unix seconds, or a YYYY-MM-DD date in UTC) ends it.
+_DEV_SECRET_KEY = "insecure-development-key"
+
+def _parse_secret_keys(value: str) -> List[Tuple[str, str, Optional[float]]]:
+    keys = []
+    for pair in value.split(","):
+        if not pair:
+            continue
+        kid, separator, secret = pair.partition(":")
+        if not keys:
+            keys.append((kid, secret, None) if separator else ("default", kid, None))
+            continue
+        secret, separator, not_after = secret.rpartition(":")
+        if not separator or not secret:
+            raise ValueError(f"AUTH_SECRET_KEYS: key {kid!r} only verifies tokens, so it needs an expiry: key_id:secret:not_after")
+        if not_after.isdigit():
+            expires = float(not_after)
+        else:
+            expires = datetime.strptime(not_after, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+        keys.append((kid, secret, expires))
+    return keys
+
+AUTH_SECRET_KEYS = _parse_secret_keys(os.getenv("AUTH_SECRET_KEYS", f"dev:{_DEV_SECRET_KEY}"))
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", str(7 * 24 * 3600)))
+# Verified tokens remembered so repeat requests skip the HMAC and JSON decode
+AUTH_CLAIMS_CACHE_SIZE = int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "4096"))
+
+# Group commit for score submissions: how long the first submission waits for others to join its batch
+SCORE_BATCH_MAX_DELAY_MS = float(os.getenv("SCORE_BATCH_MAX_DELAY_MS", "5"))
+SCORE_BATCH_MAX_SIZE = int(os.getenv("SCORE_BATCH_MAX_SIZE", "500"))
+
+# Directory holding per-game binary replay files; set REPLAYS_ENABLED=false to stop recording
+REPLAY_DIR = os.getenv("REPLAY_DIR", "./replays")
+REPLAYS_ENABLED = os.getenv("REPLAYS_ENABLED", "true").lower() == "true"
+
+# Serve the spectate and leaderboard reads as pre-encoded JSON (orjson when installed) instead of response models
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "false").lower() == "true"
+
+# Games without a player update for this many seconds are removed from the live set and the active_games table
+ACTIVE_GAME_TTL = float(os.getenv("ACTIVE_GAME_TTL", "30"))
+ACTIVE_GAME_SWEEP_INTERVAL = float(os.getenv("ACTIVE_GAME_SWEEP_INTERVAL", "5"))
+
+# Default and maximum page size for GET /api/spectate/active
+SPECTATE_PAGE_SIZE = int(os.getenv("SPECTATE_PAGE_SIZE", "50"))
+SPECTATE_MAX_PAGE_SIZE = int(os.getenv("SPECTATE_MAX_PAGE_SIZE", "200"))
+
+# Built frontend served for non-API paths; files up to STATIC_MEMORY_LIMIT bytes are held in memory
+STATIC_DIR = os.getenv("STATIC_DIR", os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "static")))
+STATIC_MEMORY_LIMIT = int(os.getenv("STATIC_MEMORY_LIMIT", str(2 * 1024 * 1024)))
+
+# Database engine profile. "development" echoes every SQL statement; "production" turns echo off and
+# pre-pings and recycles pooled connections. Each DB_* setting below overrides its profile default.
+DB_PROFILE = os.getenv("DB_PROFILE", "development").lower()
+_DB_PROFILES = {
+    "development": {"DB_ECHO": "true", "DB_POOL_PRE_PING": "false", "DB_POOL_RECYCLE": "-1"},
+    "production": {"DB_ECHO": "false", "DB_POOL_PRE_PING": "true", "DB_POOL_RECYCLE": "1800"},
+}
+if DB_PROFILE not in _DB_PROFILES:
+    raise ValueError(f"Unknown DB_PROFILE {DB_PROFILE!r}, expected one of {', '.join(_DB_PROFILES)}")
+if DB_PROFILE == "production" and any(secret == _DEV_SECRET_KEY for _, secret, _ in AUTH_SECRET_KEYS):
+    # Anyone could sign tokens for any user with the published development key
+    raise ValueError("AUTH_SECRET_KEYS must be set to a secret of your own with DB_PROFILE=production")
+
+def _db_setting(name: str, default: str = "") -> str:
+    return os.getenv(name, _DB_PROFILES[DB_PROFILE].get(name, default))
+
+DB_ECHO = _db_setting("DB_ECHO").lower() == "true"
+DB_POOL_PRE_PING = _db_setting("DB_POOL_PRE_PING").lower() == "true"
+# Seconds after which a pooled connection is replaced; -1 keeps connections forever
+DB_POOL_RECYCLE = int(_db_setting("DB_POOL_RECYCLE"))
+DB_POOL_SIZE = int(_db_setting("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(_db_setting("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(_db_setting("DB_POOL_TIMEOUT", "30"))
+# Prepared statements cached per connection (asyncpg's prepared statement cache, sqlite3's cached_statements)
+DB_STATEMENT_CACHE_SIZE = int(_db_setting("DB_STATEMENT_CACHE_SIZE", "256"))
+# "version" skips schema creation at startup when the stored schema version matches tables.py;
+# "full" always runs create_all and the migrations
+DB_INIT_MODE = os.getenv("DB_INIT_MODE", "version").lower()
+# Open the pool's connections in the background right after startup
+DB_POOL_PREWARM = os.getenv("DB_POOL_PREWARM", "true").lower() == "true"
+
+# SQLite pragmas applied to every new connection; an empty value leaves SQLite's default
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Cross-worker live state: "local" keeps it in one process, "unix" shares it between workers on one
+# host over a Unix socket, "postgres" uses LISTEN/NOTIFY on the DATABASE_URL server
+LIVE_BROKER = os.getenv("LIVE_BROKER", "local").lower()
+LIVE_BROKER_SOCKET = os.getenv("LIVE_BROKER_SOCKET", "/tmp/nokia-nostalgia-live.sock")
+LIVE_BROKER_CHANNEL = os.getenv("LIVE_BROKER_CHANNEL", "nokia_nostalgia_live")
+# Events waiting to be sent before new ones are dropped
+LIVE_BROKER_QUEUE_LIMIT = int(os.getenv("LIVE_BROKER_QUEUE_LIMIT", "10000"))
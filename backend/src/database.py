@@ -1,9 +1,16 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
-from .models import User as PydanticUser, LeaderboardEntry as PydanticLeaderboardEntry, ActiveGame as PydanticActiveGame, SnakeSegment, Position
-from .tables import User, LeaderboardEntry, ActiveGame
+from sqlalchemy import select, update, delete, or_, and_, func
+from .models import User as PydanticUser, LeaderboardEntry as PydanticLeaderboardEntry, ActiveGame as PydanticActiveGame, ActiveGameSummary, SnakeSegment, Position
+from .tables import User, LeaderboardEntry, PersonalBest, ActiveGame
+from .live import hub as live_hub, GameFrame, LiveGame
+from .ranking import leaderboard_cache, window_start
+from .batching import ScoreBatcher
+from .replay import replay_recorder
+from .config import LEADERBOARD_CACHE_ENABLED, SCORE_BATCH_MAX_DELAY_MS, SCORE_BATCH_MAX_SIZE
 from datetime import datetime
+import base64
+import json
 import uuid
 
 # User Methods
@@ -14,6 +21,13 @@ async def get_user_by_email(session: AsyncSession, email: str) -> Optional[Pydan
         return PydanticUser(id=user.id, username=user.username, email=user.email)
     return None
 
+async def get_user_by_id(session: AsyncSession, user_id: str) -> Optional[PydanticUser]:
+    result = await session.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
+    if user:
+        return PydanticUser(id=user.id, username=user.username, email=user.email)
+    return None
+
 async def get_user_by_username(session: AsyncSession, username: str) -> Optional[PydanticUser]:
     result = await session.execute(select(User).where(User.username == username))
     user = result.scalar_one_or_none()
@@ -37,15 +51,80 @@ async def create_user(session: AsyncSession, username: str, email: str, hashed_p
     await session.refresh(new_user)
     return PydanticUser(id=new_user.id, username=new_user.username, email=new_user.email)
 
+async def update_user_password_hash(session: AsyncSession, user_id: str, hashed_password: str):
+    await session.execute(update(User).where(User.id == user_id).values(hashed_password=hashed_password))
+    await session.commit()
+
 # Leaderboard Methods
-async def get_leaderboard(session: AsyncSession, game_mode: Optional[str] = None) -> List[PydanticLeaderboardEntry]:
-    query = select(LeaderboardEntry)
+score_batcher = ScoreBatcher(SCORE_BATCH_MAX_DELAY_MS / 1000, SCORE_BATCH_MAX_SIZE)
+
+# Ranking order is score DESC, then earliest date, then id as a tie-breaker.
+# Cursors encode the last entry of a page so the next page is a keyset seek.
+LeaderboardCursor = Tuple[int, datetime, str]
+
+def encode_leaderboard_cursor(entry: PydanticLeaderboardEntry) -> str:
+    raw = json.dumps([entry.score, entry.date.isoformat(), entry.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_leaderboard_cursor(cursor: str) -> Optional[LeaderboardCursor]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, date, entry_id = json.loads(raw)
+        return int(score), datetime.fromisoformat(date), str(entry_id)
+    except (ValueError, TypeError):
+        return None
+
+def _leaderboard_source(game_mode: Optional[str], window: Optional[str], best: bool):
+    """The entries a leaderboard ranks, as a selectable with the LeaderboardEntry columns."""
+    columns = (LeaderboardEntry.id, LeaderboardEntry.username, LeaderboardEntry.score, LeaderboardEntry.gameMode, LeaderboardEntry.date)
+    if best and not window:
+        query = select(PersonalBest.entryId.label("id"), PersonalBest.username, PersonalBest.score, PersonalBest.gameMode, PersonalBest.date)
+        if game_mode:
+            query = query.where(PersonalBest.gameMode == game_mode)
+        return query.subquery()
+    if best:
+        # Best entry per user and mode inside the window
+        position = func.row_number().over(
+            partition_by=(LeaderboardEntry.username, LeaderboardEntry.gameMode),
+            order_by=(LeaderboardEntry.score.desc(), LeaderboardEntry.date, LeaderboardEntry.id)
+        ).label("position")
+        query = select(*columns, position)
+    else:
+        query = select(*columns)
     if game_mode:
         query = query.where(LeaderboardEntry.gameMode == game_mode)
-    query = query.order_by(LeaderboardEntry.score.desc())
+    if window:
+        query = query.where(LeaderboardEntry.date >= window_start(window, datetime.now()))
+    source = query.subquery()
+    if best:
+        source = select(*(source.c[c.key] for c in columns)).where(source.c.position == 1).subquery()
+    return source
+
+async def get_leaderboard(session: AsyncSession, game_mode: Optional[str] = None, limit: Optional[int] = None, after: Optional[LeaderboardCursor] = None, window: Optional[str] = None, best: bool = True) -> List[PydanticLeaderboardEntry]:
+    """Ranked entries, all-time or (with `window` one of ranking.WINDOWS) since the window's start.
+
+    With `best`, only each user's best entry per game mode is ranked.
+    """
+    if LEADERBOARD_CACHE_ENABLED:
+        board = await leaderboard_cache.read(session, game_mode, window, best)
+        return board.page(limit if limit is not None else len(board), after)
+
+    leaderboard_cache.record_database_read()
+    source = _leaderboard_source(game_mode, window, best)
+    query = select(source)
+    if after:
+        score, date, entry_id = after
+        query = query.where(or_(
+            source.c.score < score,
+            and_(source.c.score == score, source.c.date > date),
+            and_(source.c.score == score, source.c.date == date, source.c.id > entry_id)
+        ))
+    query = query.order_by(source.c.score.desc(), source.c.date, source.c.id)
+    if limit is not None:
+        query = query.limit(limit)
     
     result = await session.execute(query)
-    entries = result.scalars().all()
+    entries = result.all()
     
     return [
         PydanticLeaderboardEntry(
@@ -58,78 +137,136 @@ async def get_leaderboard(session: AsyncSession, game_mode: Optional[str] = None
     ]
 
 async def submit_score(session: AsyncSession, username: str, score: int, game_mode: str) -> PydanticLeaderboardEntry:
-    entry = LeaderboardEntry(
-        id=str(uuid.uuid4()),
-        username=username,
-        score=score,
-        gameMode=game_mode,
-        date=datetime.now()
-    )
-    session.add(entry)
+    # Concurrent submissions are grouped into one INSERT and one commit
+    result = await score_batcher.submit(session, {
+        "id": str(uuid.uuid4()),
+        "username": username,
+        "score": score,
+        "gameMode": game_mode,
+        "date": datetime.now()
+    })
+    leaderboard_cache.add(result)
+    # The game that produced this score becomes the entry's replay, and the game is over
+    game = live_hub.get_live_by_username(username)
+    if game is not None:
+        await replay_recorder.finish(game.id, score, result.id)
+        live_hub.remove(game.id)
+    return result
+
+async def delete_leaderboard_entry(session: AsyncSession, entry_id: str) -> bool:
+    deleted = (await session.execute(
+        delete(LeaderboardEntry).where(LeaderboardEntry.id == entry_id).returning(LeaderboardEntry.username, LeaderboardEntry.gameMode)
+    )).first()
+    if deleted is not None:
+        await refresh_personal_best(session, deleted.username, deleted.gameMode)
     await session.commit()
-    await session.refresh(entry)
-    return PydanticLeaderboardEntry(
-        id=entry.id,
-        username=entry.username,
-        score=entry.score,
-        gameMode=entry.gameMode,
-        date=entry.date
+    leaderboard_cache.remove(entry_id)
+    return deleted is not None
+
+async def refresh_personal_best(session: AsyncSession, username: str, game_mode: str):
+    """Recompute a user's personal_bests row for a mode from their remaining entries."""
+    best = (await session.execute(
+        select(LeaderboardEntry)
+        .where(LeaderboardEntry.username == username, LeaderboardEntry.gameMode == game_mode)
+        .order_by(LeaderboardEntry.score.desc(), LeaderboardEntry.date, LeaderboardEntry.id)
+        .limit(1)
+    )).scalar_one_or_none()
+    await session.execute(delete(PersonalBest).where(PersonalBest.username == username, PersonalBest.gameMode == game_mode))
+    if best is not None:
+        session.add(PersonalBest(username=username, gameMode=game_mode, entryId=best.id, score=best.score, date=best.date))
+
+async def get_leaderboard_rank(session: AsyncSession, username: str, game_mode: Optional[str] = None, radius: int = 0, window: Optional[str] = None, best: bool = True) -> Optional[Tuple[int, List[Tuple[int, PydanticLeaderboardEntry]]]]:
+    """Rank of the user's best score and the ranked entries around it, or None if the user has no entries."""
+    if LEADERBOARD_CACHE_ENABLED:
+        board = await leaderboard_cache.read(session, game_mode, window, best)
+        found = board.rank_of(username)
+        if found is None:
+            return None
+        rank, _ = found
+        return rank, board.around(rank, radius)
+
+    leaderboard_cache.record_database_read()
+    source = _leaderboard_source(game_mode, window, best)
+    ranked = select(source, func.row_number().over(order_by=(source.c.score.desc(), source.c.date, source.c.id)).label("rank")).subquery()
+    rank = (await session.execute(select(func.min(ranked.c.rank)).where(ranked.c.username == username))).scalar()
+    if rank is None:
+        return None
+    result = await session.execute(
+        select(ranked).where(ranked.c.rank.between(rank - radius, rank + radius)).order_by(ranked.c.rank)
     )
+    return rank, [
+        (e.rank, PydanticLeaderboardEntry(id=e.id, username=e.username, score=e.score, gameMode=e.gameMode, date=e.date))
+        for e in result.all()
+    ]
 
 # Spectate Methods
+# Active games are served from the in-memory live hub; the database only sees periodic flushes
 async def get_active_games(session: AsyncSession) -> List[PydanticActiveGame]:
-    result = await session.execute(select(ActiveGame))
-    games = result.scalars().all()
-    return [
-        PydanticActiveGame(
-            id=g.id,
-            username=g.username,
-            score=g.score,
-            gameMode=g.gameMode,
-            snake=[SnakeSegment(**s) for s in g.snake] if g.snake else [],
-            food=Position(**g.food) if g.food else Position(x=0, y=0)
-        ) for g in games
-    ]
+    await live_hub.ensure_loaded(session)
+    return live_hub.games()
 
 async def get_game_state(session: AsyncSession, game_id: str) -> Optional[PydanticActiveGame]:
-    result = await session.execute(select(ActiveGame).where(ActiveGame.id == game_id))
-    game = result.scalar_one_or_none()
-    if game:
-        # We are not simulating movement here anymore as it should be client driven or handled differently
-        # But for compatibility with previous logic, we just return the state
-        return PydanticActiveGame(
-            id=game.id,
-            username=game.username,
-            score=game.score,
-            gameMode=game.gameMode,
-            snake=[SnakeSegment(**s) for s in game.snake] if game.snake else [],
-            food=Position(**game.food) if game.food else Position(x=0, y=0)
-        )
-    return None
+    await live_hub.ensure_loaded(session)
+    return live_hub.get(game_id)
+
+# Active games are ordered in memory by the live hub, highest sort value first.
+# Cursors encode the sort value and id of the last game on a page.
+ActiveGameCursor = Tuple[float, str]
+
+def encode_active_games_cursor(game: LiveGame, sort: str) -> str:
+    raw = json.dumps([live_hub.sort_value(game, sort), game.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_active_games_cursor(cursor: str) -> Optional[ActiveGameCursor]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, game_id = json.loads(raw)
+        return float(value), str(game_id)
+    except (ValueError, TypeError):
+        return None
+
+async def get_active_game_page(session: AsyncSession, sort: str = "score", limit: Optional[int] = None, after: Optional[ActiveGameCursor] = None, game_mode: Optional[str] = None) -> List[LiveGame]:
+    await live_hub.ensure_loaded(session)
+    return live_hub.page(sort, limit, after, game_mode)
+
+def summarize_active_game(game: LiveGame) -> ActiveGameSummary:
+    return ActiveGameSummary.model_construct(
+        id=game.id,
+        username=game.username,
+        score=game.score,
+        gameMode=game.gameMode,
+        snakeLength=len(game.snake),
+        viewers=live_hub.viewer_count(game.id)
+    )
+
+async def get_game_snapshot(session: AsyncSession, game_id: str) -> Optional[GameFrame]:
+    await live_hub.ensure_loaded(session)
+    game = live_hub.get_live(game_id)
+    return game.snapshot() if game else None
+
+async def is_game_active(session: AsyncSession, game_id: str) -> bool:
+    await live_hub.ensure_loaded(session)
+    return live_hub.get_live(game_id) is not None
 
 async def update_active_game(session: AsyncSession, username: str, score: int, game_mode: str, snake: List[SnakeSegment], food: Position):
-    # Find existing game for user
-    result = await session.execute(select(ActiveGame).where(ActiveGame.username == username))
-    game = result.scalar_one_or_none()
-    
-    snake_dicts = [s.model_dump() for s in snake]
-    food_dict = food.model_dump()
-
-    if game:
-        game.score = score
-        game.gameMode = game_mode
-        game.snake = snake_dicts
-        game.food = food_dict
-    else:
-        new_game = ActiveGame(
-            id=f"game-{username}-{uuid.uuid4()}", # Using uuid to ensure uniqueness if needed, but keeping format similar
-            username=username,
-            score=score,
-            gameMode=game_mode,
-            snake=snake_dicts,
-            food=food_dict
-        )
-        session.add(new_game)
-    
-    await session.commit()
+    # Hydrate first so a returning player keeps the game id already stored in the table
+    await live_hub.ensure_loaded(session)
+    live_hub.upsert(username, score, game_mode, snake, food)
+
+async def apply_game_delta(session: AsyncSession, username: str, seq: int, heads: List[SnakeSegment], pops: int, food: Optional[Position], score: Optional[int]) -> bool:
+    await live_hub.ensure_loaded(session)
+    return live_hub.apply_delta(username, seq, heads, pops, food, score) is not None
+
+async def get_game_seq(session: AsyncSession, username: str) -> Optional[int]:
+    await live_hub.ensure_loaded(session)
+    game = live_hub.get_live_by_username(username)
+    return game.seq if game else None
 
+async def get_game_frames(session: AsyncSession, game_id: str, since: Optional[int]) -> Optional[List[GameFrame]]:
+    """Frames that bring a spectator at `since` up to date: deltas if retained, otherwise one keyframe."""
+    await live_hub.ensure_loaded(session)
+    game = live_hub.get_live(game_id)
+    if game is None:
+        return None
+    frames = live_hub.frames_since(game_id, since) if since is not None else None
+    return frames if frames is not None else [game.keyframe()]
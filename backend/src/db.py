@@ -1,14 +1,177 @@
+import asyncio
+import hashlib
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from typing import AsyncGenerator
-from .config import DATABASE_URL
-from .tables import Base
+from sqlalchemy import event, inspect, select, insert, update, delete, bindparam, text, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import QueuePool
+from .config import (
+    DATABASE_URL, DB_ECHO, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT, DB_STATEMENT_CACHE_SIZE, DB_INIT_MODE,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE
+)
+from .tables import Base, ActiveGame, LeaderboardEntry, PersonalBest, SchemaVersion
+from .models import SnakeSegment, Position
+from .protocol import encode_game_state
+from .metrics import TimedQueuePool, instrument_engine
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+def engine_options(url: str) -> dict:
+    """create_async_engine arguments for the configured profile (see DB_PROFILE in config.py)."""
+    url = make_url(url)
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"cached_statements": DB_STATEMENT_CACHE_SIZE}
+        if url.database in (None, "", ":memory:"):
+            # In-memory databases use a single static connection, which takes no pool sizing
+            return options
+    elif url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    options.update(poolclass=TimedQueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run during a write, and NORMAL only syncs at checkpoints, which WAL keeps safe
+    pragmas = [("journal_mode", SQLITE_JOURNAL_MODE), ("synchronous", SQLITE_SYNCHRONOUS),
+               ("busy_timeout", SQLITE_BUSY_TIMEOUT_MS), ("mmap_size", SQLITE_MMAP_SIZE)]
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas:
+        if value != "":
+            cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+instrument_engine(engine)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
-async def init_db():
+def _create_schema(sync_conn):
+    had_personal_bests = inspect(sync_conn).has_table(PersonalBest.__tablename__)
+    Base.metadata.create_all(sync_conn)
+    _add_missing_columns(sync_conn)
+    # create_all skips tables that already exist, so add indexes introduced since they were created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+    _migrate_active_games(sync_conn)
+    if not had_personal_bests:
+        _backfill_personal_bests(sync_conn)
+
+def _add_missing_columns(sync_conn):
+    """create_all skips existing tables, so add the (nullable) columns introduced since they were created."""
+    inspector = inspect(sync_conn)
+    quote = sync_conn.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=sync_conn.dialect)
+                sync_conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+
+def _migrate_active_games(sync_conn):
+    """One-time move of the JSON snake/food columns into the packed state column."""
+    table = ActiveGame.__table__
+    rows = sync_conn.execute(
+        select(table.c.id, table.c.snake, table.c.food)
+        .where(table.c.state.is_(None), table.c.snake.is_not(None))
+    ).all()
+    if not rows:
+        return
+    sync_conn.execute(
+        update(table).where(table.c.id == bindparam("row_id")).values(state=bindparam("packed"), snake=None, food=None),
+        [
+            {
+                "row_id": row.id,
+                "packed": encode_game_state(
+                    [SnakeSegment(**s) for s in row.snake],
+                    Position(**row.food) if row.food else Position(x=0, y=0)
+                )
+            }
+            for row in rows
+        ]
+    )
+
+def _backfill_personal_bests(sync_conn):
+    """One-time fill of personal_bests from the leaderboard entries that predate it."""
+    entries = LeaderboardEntry.__table__
+    ranked = select(
+        entries.c.username, entries.c.gameMode, entries.c.id, entries.c.score, entries.c.date,
+        func.row_number().over(
+            partition_by=(entries.c.username, entries.c.gameMode),
+            order_by=(entries.c.score.desc(), entries.c.date, entries.c.id)
+        ).label("position")
+    ).where(entries.c.username.is_not(None), entries.c.gameMode.is_not(None)).subquery()
+    sync_conn.execute(insert(PersonalBest.__table__).from_select(
+        ["username", "gameMode", "entryId", "score", "date"],
+        select(ranked.c.username, ranked.c.gameMode, ranked.c.id, ranked.c.score, ranked.c.date).where(ranked.c.position == 1)
+    ))
+
+def schema_fingerprint() -> str:
+    """Changes whenever a table, column or index is added to or changed in tables.py."""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        if table.name == SchemaVersion.__tablename__:
+            continue
+        columns = ",".join(f"{c.name}:{c.type}:{int(c.primary_key)}" for c in table.columns)
+        indexes = ",".join(sorted(f"{i.name}({','.join(str(e) for e in i.expressions)})" for i in table.indexes))
+        parts.append(f"{table.name}[{columns}][{indexes}]")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+async def _stored_schema_version():
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1))).scalar()
+    except DBAPIError:
+        # No schema_version table yet: a new database, or one created before versioning
+        return None
+
+async def init_db() -> bool:
+    """Create and migrate the schema; returns False if the stored version showed it was current.
+
+    With DB_INIT_MODE=version that check is a single query, so a cold start
+    against an up-to-date database skips create_all's catalog lookups.
+    """
+    version = schema_fingerprint()
+    if DB_INIT_MODE == "version" and await _stored_schema_version() == version:
+        return False
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_schema)
+        await conn.execute(delete(SchemaVersion))
+        await conn.execute(insert(SchemaVersion).values(id=1, version=version))
+    return True
+
+async def prewarm_pool(size: int) -> int:
+    """Open up to `size` pooled connections at once, so early requests find them ready; returns how many opened."""
+    if not isinstance(engine.pool, QueuePool):
+        return 0
+    attempted = 0
+    opened = 0
+    all_attempted = asyncio.Event()
+
+    def attempt_finished():
+        nonlocal attempted
+        attempted += 1
+        if attempted == size:
+            all_attempted.set()
+
+    async def open_one():
+        nonlocal opened
+        try:
+            connection = await engine.connect()
+        except Exception:
+            attempt_finished()
+            raise
+        try:
+            opened += 1
+            attempt_finished()
+            # Held until every attempt has finished, so each one opens a connection of its own
+            await all_attempted.wait()
+        finally:
+            await connection.close()
+
+    await asyncio.gather(*(open_one() for _ in range(size)), return_exceptions=True)
+    return opened
 
 async def reset_db():
     async with engine.begin() as conn:
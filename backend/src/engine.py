@@ -0,0 +1,264 @@
+import random
+from typing import List, Literal, Optional, Sequence, Tuple
+import numpy as np
+from pydantic import BaseModel
+from .models import GameMode, Position, SnakeSegment
+
+# Server-side port of frontend/src/lib/gameLogic.ts. The scalar functions
+# mirror the TypeScript ones one-to-one; GameBatch steps many games at once
+# with NumPy arrays for simulation and score verification.
+
+GRID_SIZE = 20
+INITIAL_SPEED = 150
+SPEED_INCREMENT = 5
+MIN_SPEED = 50
+SCORE_PER_FOOD = 10
+
+Direction = Literal['UP', 'DOWN', 'LEFT', 'RIGHT']
+
+OPPOSITES = {'UP': 'DOWN', 'DOWN': 'UP', 'LEFT': 'RIGHT', 'RIGHT': 'LEFT'}
+DELTAS = {'UP': (0, -1), 'DOWN': (0, 1), 'LEFT': (-1, 0), 'RIGHT': (1, 0)}
+
+
+class GameState(BaseModel):
+    snake: List[SnakeSegment]
+    food: Position
+    direction: Direction
+    score: int
+    isPlaying: bool
+    isGameOver: bool
+    gameMode: GameMode
+    gridSize: int
+
+
+def get_opposite_direction(direction: Direction) -> Direction:
+    return OPPOSITES[direction]
+
+def is_valid_direction_change(current: Direction, next: Direction) -> bool:
+    return next != get_opposite_direction(current)
+
+def calculate_new_position(head: Position, direction: Direction, grid_size: int, game_mode: GameMode) -> Tuple[Position, bool]:
+    """New head position and whether it hit a wall."""
+    dx, dy = DELTAS[direction]
+    new_x = head.x + dx
+    new_y = head.y + dy
+
+    if game_mode == 'walls':
+        if new_x < 0 or new_x >= grid_size or new_y < 0 or new_y >= grid_size:
+            return Position(x=new_x, y=new_y), True
+    else:
+        # Pass-through mode - wrap around
+        new_x %= grid_size
+        new_y %= grid_size
+
+    return Position(x=new_x, y=new_y), False
+
+def check_self_collision(head: Position, body: Sequence[Position]) -> bool:
+    return any(segment.x == head.x and segment.y == head.y for segment in body)
+
+def check_food_collision(head: Position, food: Position) -> bool:
+    return head.x == food.x and head.y == food.y
+
+def generate_food_position(snake: Sequence[Position], grid_size: int, rng: random.Random = random) -> Position:
+    """Random free cell; after grid_size**2 failed attempts the last candidate is used anyway."""
+    occupied = {(s.x, s.y) for s in snake}
+    for _ in range(grid_size * grid_size):
+        food = Position(x=rng.randrange(grid_size), y=rng.randrange(grid_size))
+        if (food.x, food.y) not in occupied:
+            break
+    return food
+
+def create_initial_snake(grid_size: int) -> List[SnakeSegment]:
+    center_x = grid_size // 2
+    center_y = grid_size // 2
+    return [
+        SnakeSegment(x=center_x, y=center_y, dotSide='left'),
+        SnakeSegment(x=center_x - 1, y=center_y, dotSide='right'),
+        SnakeSegment(x=center_x - 2, y=center_y, dotSide='left'),
+    ]
+
+def create_new_head(position: Position, previous_head: SnakeSegment) -> SnakeSegment:
+    return SnakeSegment(
+        x=position.x,
+        y=position.y,
+        dotSide='right' if previous_head.dotSide == 'left' else 'left'
+    )
+
+def calculate_speed(score: int) -> int:
+    """Tick interval in milliseconds for a score."""
+    return max(MIN_SPEED, INITIAL_SPEED - (score // 50) * SPEED_INCREMENT)
+
+def get_initial_game_state(game_mode: GameMode, rng: random.Random = random) -> GameState:
+    snake = create_initial_snake(GRID_SIZE)
+    return GameState(
+        snake=snake,
+        food=generate_food_position(snake, GRID_SIZE, rng),
+        direction='RIGHT',
+        score=0,
+        isPlaying=False,
+        isGameOver=False,
+        gameMode=game_mode,
+        gridSize=GRID_SIZE
+    )
+
+def process_game_tick(state: GameState, direction: Direction, rng: random.Random = random) -> GameState:
+    if not state.isPlaying or state.isGameOver:
+        return state
+
+    head = state.snake[0]
+    new_position, hit_wall = calculate_new_position(head, direction, state.gridSize, state.gameMode)
+
+    if hit_wall:
+        return state.model_copy(update={"isPlaying": False, "isGameOver": True})
+
+    # Check self collision (excluding the tail that will be removed)
+    if check_self_collision(new_position, state.snake[:-1]):
+        return state.model_copy(update={"isPlaying": False, "isGameOver": True})
+
+    new_snake = [create_new_head(new_position, head), *state.snake]
+    new_food = state.food
+    new_score = state.score
+
+    if check_food_collision(new_position, state.food):
+        new_score += SCORE_PER_FOOD
+        new_food = generate_food_position(new_snake, state.gridSize, rng)
+    else:
+        new_snake.pop()
+
+    return state.model_copy(update={
+        "snake": new_snake,
+        "food": new_food,
+        "score": new_score,
+        "direction": direction
+    })
+
+def is_within_bounds(position: Position, grid_size: int) -> bool:
+    return 0 <= position.x < grid_size and 0 <= position.y < grid_size
+
+def calculate_snake_length(score: int, initial_length: int = 3) -> int:
+    return initial_length + score // SCORE_PER_FOOD
+
+
+# Direction codes used by GameBatch
+UP, DOWN, LEFT, RIGHT = 0, 1, 2, 3
+DIRECTION_CODES = {'UP': UP, 'DOWN': DOWN, 'LEFT': LEFT, 'RIGHT': RIGHT}
+DIRECTION_NAMES = ('UP', 'DOWN', 'LEFT', 'RIGHT')
+_DX = np.array([0, 0, -1, 1], dtype=np.int32)
+_DY = np.array([-1, 1, 0, 0], dtype=np.int32)
+
+
+class GameBatch:
+    """Many games stepped together with array operations instead of per-game Python loops.
+
+    Snakes live in per-game ring buffers of cell indices (y * grid_size + x),
+    with an occupancy count grid for O(1) collision checks. Segment dot sides
+    alternate from the head, so only the head's dot side is stored.
+    """
+
+    def __init__(self, count: int, grid_size: int = GRID_SIZE, walls: Optional[np.ndarray] = None, seed: Optional[int] = None):
+        cells = grid_size * grid_size
+        self.count = count
+        self.grid_size = grid_size
+        self.rng = np.random.default_rng(seed)
+        self.walls = np.ones(count, dtype=bool) if walls is None else np.asarray(walls, dtype=bool)
+        self.body = np.zeros((count, cells), dtype=np.int16)
+        self.head = np.zeros(count, dtype=np.int32)
+        self.length = np.zeros(count, dtype=np.int32)
+        self.head_dot = np.zeros(count, dtype=np.uint8)  # 0 = 'left', 1 = 'right'
+        self.occupancy = np.zeros((count, cells), dtype=np.uint8)
+        self.food = np.zeros(count, dtype=np.int32)
+        self.score = np.zeros(count, dtype=np.int32)
+        self.direction = np.full(count, RIGHT, dtype=np.int8)
+        self.alive = np.zeros(count, dtype=bool)
+        self._rows = np.arange(count)
+
+    @classmethod
+    def from_states(cls, states: Sequence[GameState], seed: Optional[int] = None) -> "GameBatch":
+        grid_size = states[0].gridSize
+        batch = cls(len(states), grid_size, np.array([s.gameMode == 'walls' for s in states]), seed)
+        for i, state in enumerate(states):
+            batch.load(i, state)
+        return batch
+
+    def load(self, i: int, state: GameState):
+        g = self.grid_size
+        cells = [s.y * g + s.x for s in state.snake]
+        n = len(cells)
+        # The head sits at index n - 1 and the tail at 0, so pushes go forward in the ring
+        self.body[i, :n] = cells[::-1]
+        self.head[i] = n - 1
+        self.length[i] = n
+        self.head_dot[i] = 0 if state.snake[0].dotSide == 'left' else 1
+        self.occupancy[i] = 0
+        np.add.at(self.occupancy[i], cells, 1)
+        self.food[i] = state.food.y * g + state.food.x
+        self.score[i] = state.score
+        self.direction[i] = DIRECTION_CODES[state.direction]
+        self.walls[i] = state.gameMode == 'walls'
+        self.alive[i] = state.isPlaying and not state.isGameOver
+
+    def snake(self, i: int) -> List[SnakeSegment]:
+        g = self.grid_size
+        capacity = self.body.shape[1]
+        segments = []
+        for k in range(self.length[i]):
+            cell = int(self.body[i, (self.head[i] - k) % capacity])
+            dot = self.head_dot[i] ^ (k & 1)
+            segments.append(SnakeSegment(x=cell % g, y=cell // g, dotSide='left' if dot == 0 else 'right'))
+        return segments
+
+    def step(self, directions: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Advance every live game one tick.
+
+        `directions` holds one direction code per game (defaults to the
+        current directions). Returns boolean arrays of games that ate and
+        games that died on this tick.
+        """
+        g = self.grid_size
+        capacity = self.body.shape[1]
+        rows = self._rows
+        active = self.alive.copy()
+        direction = self.direction if directions is None else np.asarray(directions, dtype=np.int8)
+
+        head_cell = self.body[rows, self.head]
+        new_x = head_cell % g + _DX[direction]
+        new_y = head_cell // g + _DY[direction]
+        hit_wall = self.walls & ((new_x < 0) | (new_x >= g) | (new_y < 0) | (new_y >= g))
+        new_cell = (new_y % g) * g + (new_x % g)
+
+        # The tail moves out of the way this tick, so it does not count as a collision
+        tail_cell = self.body[rows, (self.head - self.length + 1) % capacity]
+        blocked = self.occupancy[rows, new_cell].astype(np.int32) - (new_cell == tail_cell)
+        died = active & (hit_wall | (blocked > 0))
+        moving = active & ~died
+        ate = moving & (new_cell == self.food)
+        shrinking = moving & ~ate
+
+        self.alive &= ~died
+        self.direction = np.where(moving, direction, self.direction).astype(np.int8)
+
+        m = rows[shrinking]
+        self.occupancy[m, tail_cell[shrinking]] -= 1
+        m = rows[moving]
+        self.head[m] = (self.head[m] + 1) % capacity
+        self.body[m, self.head[m]] = new_cell[moving]
+        self.occupancy[m, new_cell[moving]] += 1
+        self.head_dot[m] ^= 1
+        self.length[ate] += 1
+        self.score[ate] += SCORE_PER_FOOD
+
+        if ate.any():
+            self._respawn_food(rows[ate])
+        return ate, died
+
+    def _respawn_food(self, games: np.ndarray):
+        cells = self.grid_size * self.grid_size
+        food = self.rng.integers(0, cells, size=len(games))
+        pending = np.ones(len(games), dtype=bool)
+        # Same rejection sampling as the frontend, but for every eater at once
+        for _ in range(cells):
+            pending &= self.occupancy[games, food] > 0
+            if not pending.any():
+                break
+            food[pending] = self.rng.integers(0, cells, size=int(pending.sum()))
+        self.food[games] = food
@@ -0,0 +1,28 @@
+import secrets
+from typing import Optional
+from fastapi.responses import Response
+
+# Strong ETags built from in-memory version counters. The counters are per
+# process, so every tag carries a random epoch: a restart or another worker
+# never produces a tag an old client could mistake for its own.
+EPOCH = secrets.token_hex(4)
+
+def make_etag(kind: str, version) -> str:
+    return f'"{kind}-{EPOCH}-{version}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Strong comparison against an If-None-Match header; weak tags never match."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def tag_response(response: Response, etag: str) -> Response:
+    # no-cache lets browsers store the body but revalidate it with If-None-Match every time
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
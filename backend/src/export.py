@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Iterator, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .db import AsyncSessionLocal, init_db, close_db_connection
+from .tables import LeaderboardEntry
+from .batching import dialect_insert, upsert_personal_bests
+from .fastjson import dumps
+
+# Leaderboard export and import for analytics and restores. Exports read
+# through a server-side cursor (asyncpg) or fetchmany (SQLite) in batches
+# of `batch_size` rows, and each batch is encoded and handed on before the
+# next is fetched, so memory stays flat whatever the table size. Rows come
+# in rank order, which the rank indexes return without a sort.
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+COLUMNS = ("id", "username", "score", "gameMode", "date")
+DEFAULT_BATCH_SIZE = 1000
+
+
+def export_query(game_mode: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    query = select(LeaderboardEntry.id, LeaderboardEntry.username, LeaderboardEntry.score, LeaderboardEntry.gameMode, LeaderboardEntry.date)
+    if game_mode:
+        query = query.where(LeaderboardEntry.gameMode == game_mode)
+    if since:
+        query = query.where(LeaderboardEntry.date >= since)
+    if until:
+        query = query.where(LeaderboardEntry.date < until)
+    return query.order_by(LeaderboardEntry.score.desc(), LeaderboardEntry.date, LeaderboardEntry.id)
+
+
+def _encode_ndjson(rows) -> bytes:
+    return b"".join(dumps({
+        "id": row.id, "username": row.username, "score": row.score, "gameMode": row.gameMode, "date": row.date
+    }) + b"\n" for row in rows)
+
+def _encode_csv(rows, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(COLUMNS)
+    writer.writerows((row.id, row.username, row.score, row.gameMode, row.date.isoformat() if row.date else "") for row in rows)
+    return buffer.getvalue().encode()
+
+
+async def export_chunks(fmt: str, game_mode: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                        batch_size: int = DEFAULT_BATCH_SIZE, session: Optional[AsyncSession] = None) -> AsyncIterator[bytes]:
+    """Encoded export, one chunk per batch of rows.
+
+    Opens its own session unless one is given, so a StreamingResponse can
+    keep reading after the request's dependencies have been closed.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    if session is None:
+        async with AsyncSessionLocal() as own_session:
+            async for chunk in export_chunks(fmt, game_mode, since, until, batch_size, own_session):
+                yield chunk
+        return
+
+    if fmt == "csv":
+        yield _encode_csv((), header=True)
+    result = await session.stream(export_query(game_mode, since, until).execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield _encode_ndjson(rows) if fmt == "ndjson" else _encode_csv(rows, header=False)
+
+
+def read_records(lines: Iterable[str], fmt: str) -> Iterator[dict]:
+    """Leaderboard entries from export lines, with scores and dates parsed."""
+    if fmt == "csv":
+        records = csv.DictReader(lines)
+    else:
+        records = (json.loads(line) for line in lines if line.strip())
+    for record in records:
+        yield {
+            "id": record["id"],
+            "username": record["username"],
+            "score": int(record["score"]),
+            "gameMode": record["gameMode"],
+            "date": datetime.fromisoformat(record["date"]) if record.get("date") else None,
+        }
+
+
+async def import_records(records: Iterable[dict], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Insert exported entries in batches, one transaction each; returns the rows inserted.
+
+    Entries whose id already exists are skipped, so an interrupted import
+    can simply be run again. personal_bests is updated as for submissions.
+    """
+    inserted = 0
+    batch: List[dict] = []
+    async with AsyncSessionLocal() as session:
+        async def write():
+            nonlocal inserted
+            statement = dialect_insert(session)(LeaderboardEntry).values(batch).on_conflict_do_nothing(index_elements=[LeaderboardEntry.id])
+            result = await session.execute(statement)
+            await upsert_personal_bests(session, batch)
+            await session.commit()
+            inserted += result.rowcount
+            batch.clear()
+
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                await write()
+        if batch:
+            await write()
+    return inserted
+
+
+def _date(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+async def _export(args):
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async for chunk in export_chunks(args.format, args.game_mode, args.since, args.until, args.batch_size):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+async def _import(args):
+    await init_db()
+    fmt = args.format or ("csv" if args.input.endswith(".csv") else "ndjson")
+    with open(args.input, newline="") as f:
+        inserted = await import_records(read_records(f, fmt), args.batch_size)
+    print(f"Imported {inserted} leaderboard entries", file=sys.stderr)
+
+async def _main(args):
+    try:
+        await (_export(args) if args.command == "export" else _import(args))
+    finally:
+        await close_db_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream the leaderboard to NDJSON or CSV, or load such a file back.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write entries to stdout or --output")
+    export.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    export.add_argument("--game-mode", choices=["pass-through", "walls"])
+    export.add_argument("--since", type=_date, help="only entries at or after this ISO date/time")
+    export.add_argument("--until", type=_date, help="only entries before this ISO date/time")
+    export.add_argument("--output", "-o")
+    export.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows fetched per round trip")
+    restore = commands.add_parser("import", help="insert entries from an export file")
+    restore.add_argument("input")
+    restore.add_argument("--format", choices=sorted(FORMATS), help="default: from the file extension")
+    restore.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows inserted per transaction")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,64 @@
+import json
+from datetime import datetime
+from typing import Iterable, Optional
+from fastapi.responses import Response
+from .models import LeaderboardEntry as PydanticLeaderboardEntry
+
+try:
+    import orjson
+except ImportError:  # Optional speedup: pip install backend[fast]
+    orjson = None
+
+# Pre-encoded JSON for the hot read routes. Documents are built from plain
+# dicts and encoded once, skipping the pydantic models FastAPI would
+# validate and serialize again through response_model. The bytes match
+# what the regular path produces for the same data.
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+def active_game_document(game) -> dict:
+    return {
+        "id": game.id,
+        "username": game.username,
+        "score": game.score,
+        "gameMode": game.gameMode,
+        "snake": [{"x": s.x, "y": s.y, "dotSide": s.dotSide} for s in game.snake],
+        "food": {"x": game.food.x, "y": game.food.y},
+    }
+
+def active_game_summary_document(game, viewers: int) -> dict:
+    return {
+        "id": game.id,
+        "username": game.username,
+        "score": game.score,
+        "gameMode": game.gameMode,
+        "snakeLength": len(game.snake),
+        "viewers": viewers,
+    }
+
+def leaderboard_entry_document(entry: PydanticLeaderboardEntry) -> dict:
+    return {
+        "id": entry.id,
+        "username": entry.username,
+        "score": entry.score,
+        "gameMode": entry.gameMode,
+        "date": entry.date,
+    }
+
+def json_array(items: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+def api_response(data: bytes, next_cursor: Optional[str] = None, page: bool = False) -> Response:
+    """A successful ApiResponse (or PageResponse when `page`) around already-encoded `data`."""
+    body = b'{"success":true,"data":' + data + b',"error":null'
+    if page:
+        body += b',"nextCursor":' + dumps(next_cursor)
+    return Response(body + b"}", media_type="application/json")
@@ -0,0 +1,526 @@
+import asyncio
+import heapq
+import logging
+import struct
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete
+from datetime import datetime
+from .models import ActiveGame as PydanticActiveGame, SnakeSegment, Position
+from .tables import ActiveGame
+from .protocol import encode_keyframe, encode_delta, decode_game_state, encode_game_state, parse_keyframe, parse_delta
+from .config import DELTA_KEYFRAME_INTERVAL, DELTA_HISTORY_SIZE, SPECTATOR_DELTA_BUFFER
+from .replay import replay_recorder
+from .fastjson import dumps, active_game_document
+from .broker import Broker, broker as default_broker
+import json
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class GameFrame:
+    """A game state or delta serialized once and shared by every subscriber."""
+
+    __slots__ = ("text", "_data", "_sse")
+
+    def __init__(self, text: str, data: Optional[bytes] = None):
+        self.text = text
+        self._data = data
+        self._sse: Optional[bytes] = None
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "GameFrame":
+        return cls(data.decode(), data)
+
+    @property
+    def data(self) -> bytes:
+        if self._data is None:
+            self._data = self.text.encode()
+        return self._data
+
+    @property
+    def sse(self) -> bytes:
+        if self._sse is None:
+            self._sse = b"data: " + self.data + b"\n\n"
+        return self._sse
+
+
+class LiveGame:
+    __slots__ = ("id", "username", "score", "gameMode", "snake", "food", "seq",
+                 "history", "deltas_since_keyframe", "_keyframe", "_snapshot", "updated_at", "version")
+
+    def __init__(self, id: str, username: str, score: int, gameMode: str, snake: List[SnakeSegment], food: Position, updated_at: Optional[float] = None):
+        self.id = id
+        self.username = username
+        self.score = score
+        self.gameMode = gameMode
+        self.snake: Deque[SnakeSegment] = deque(snake)
+        self.food = food
+        self.seq = 0
+        self.history: Deque[Tuple[int, GameFrame]] = deque(maxlen=DELTA_HISTORY_SIZE)
+        self.deltas_since_keyframe = 0
+        self._keyframe: Optional[GameFrame] = None
+        self._snapshot: Optional[GameFrame] = None
+        self.updated_at = updated_at if updated_at is not None else time.time()
+        self.version = 0
+
+    def keyframe(self) -> GameFrame:
+        if self._keyframe is None:
+            self._keyframe = GameFrame(encode_keyframe(self.seq, self.score, self.gameMode, self.snake, self.food))
+        return self._keyframe
+
+    def snapshot(self) -> GameFrame:
+        """The full ActiveGame JSON, encoded once per state change."""
+        if self._snapshot is None:
+            self._snapshot = GameFrame.from_bytes(dumps(active_game_document(self)))
+        return self._snapshot
+
+    def changed(self):
+        self._keyframe = None
+        self._snapshot = None
+        self.updated_at = time.time()
+        self.version += 1
+
+    def to_model(self) -> PydanticActiveGame:
+        return PydanticActiveGame.model_construct(
+            id=self.id,
+            username=self.username,
+            score=self.score,
+            gameMode=self.gameMode,
+            snake=list(self.snake),
+            food=self.food
+        )
+
+
+class Subscription:
+    """Holds only the newest full game state, so a slow consumer skips ahead instead of queueing."""
+
+    delta = False
+
+    def __init__(self, game_id: str):
+        self.game_id = game_id
+        self._frame: Optional[GameFrame] = None
+        self._event = asyncio.Event()
+        self.closed = False
+
+    def push(self, frame: GameFrame):
+        self._frame = frame
+        self._event.set()
+
+    def close(self):
+        self.closed = True
+        self._event.set()
+
+    async def next(self) -> Optional[GameFrame]:
+        """The newest frame, or None once the game has left the live set."""
+        await self._event.wait()
+        self._event.clear()
+        return None if self.closed else self._frame
+
+
+class DeltaSubscription:
+    """Queues delta frames; a consumer that overflows the queue is resynced with a keyframe."""
+
+    delta = True
+
+    def __init__(self, game_id: str, hub: "LiveGameHub"):
+        self.game_id = game_id
+        self._hub = hub
+        self._frames: Deque[GameFrame] = deque()
+        self._resync = True
+        self._event = asyncio.Event()
+        self._event.set()
+        self.closed = False
+
+    def push(self, frame: GameFrame):
+        # While a resync is pending the keyframe it sends already covers this frame
+        if not self._resync:
+            if len(self._frames) >= SPECTATOR_DELTA_BUFFER:
+                self._frames.clear()
+                self._resync = True
+            else:
+                self._frames.append(frame)
+        self._event.set()
+
+    def close(self):
+        self.closed = True
+        self._event.set()
+
+    async def next(self) -> Optional[GameFrame]:
+        while True:
+            if self.closed:
+                return None
+            if self._resync:
+                game = self._hub.get_live(self.game_id)
+                if game is not None:
+                    self._resync = False
+                    return game.keyframe()
+            elif self._frames:
+                return self._frames.popleft()
+            await self._event.wait()
+            self._event.clear()
+
+
+class LiveGameHub:
+    """Process-local store of every active game.
+
+    Player updates only touch memory; dirty games are written back to the
+    active_games table by a background flush loop. Games leave the live set
+    when their score is submitted or when a sweeper finds them idle for
+    longer than the TTL, and the next flush deletes their rows.
+    """
+
+    def __init__(self, broker: Optional[Broker] = None):
+        # Changes are published to the other workers, and theirs applied here (see apply_event)
+        self.broker = broker
+        self._games: Dict[str, LiveGame] = {}
+        self._ids_by_username: Dict[str, str] = {}
+        self._dirty: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._loaded = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._sweep_task: Optional[asyncio.Task] = None
+        self._subscribers: Dict[str, Set] = {}
+        # ETag versions: `version` moves on any change, `summary_version` only when
+        # a field of the active-games summary (membership, score, mode, length, viewers) does
+        self.version = 0
+        self.summary_version = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def _changed(self, summary: bool = True):
+        self.version += 1
+        if summary:
+            self.summary_version += 1
+
+    async def ensure_loaded(self, session: AsyncSession):
+        # Hydrate once from the database so games persisted by a previous run stay visible
+        if self._loaded:
+            return
+        # Only the packed state; the legacy JSON columns are never read
+        result = await session.execute(select(
+            ActiveGame.id, ActiveGame.username, ActiveGame.score, ActiveGame.gameMode,
+            ActiveGame.state, ActiveGame.updatedAt
+        ))
+        for g in result.all():
+            if g.id in self._games:
+                continue
+            snake, food = decode_game_state(g.state) if g.state else ([], Position(x=0, y=0))
+            self._games[g.id] = LiveGame(
+                id=g.id,
+                username=g.username,
+                score=g.score,
+                gameMode=g.gameMode,
+                snake=snake,
+                food=food,
+                updated_at=g.updatedAt.timestamp() if g.updatedAt else None
+            )
+            self._ids_by_username.setdefault(g.username, g.id)
+        self._loaded = True
+        self._changed()
+
+    def games(self) -> List[PydanticActiveGame]:
+        return [g.to_model() for g in self._games.values()]
+
+    def get(self, game_id: str) -> Optional[PydanticActiveGame]:
+        game = self._games.get(game_id)
+        return game.to_model() if game else None
+
+    def sort_value(self, game: LiveGame, sort: str) -> float:
+        if sort == "viewers":
+            return self.viewer_count(game.id)
+        if sort == "recent":
+            return game.updated_at
+        return game.score
+
+    def page(self, sort: str = "score", limit: Optional[int] = None, after: Optional[Tuple[float, str]] = None, game_mode: Optional[str] = None) -> List[LiveGame]:
+        """Games ordered by `sort` (highest first, then id), starting after the (value, id) cursor."""
+        keyed = (((-self.sort_value(g, sort), g.id), g) for g in self._games.values() if game_mode is None or g.gameMode == game_mode)
+        if after is not None:
+            start = (-after[0], after[1])
+            keyed = (item for item in keyed if item[0] > start)
+        if limit is None:
+            ordered = sorted(keyed, key=lambda item: item[0])
+        else:
+            ordered = heapq.nsmallest(limit, keyed, key=lambda item: item[0])
+        return [game for _, game in ordered]
+
+    def get_live(self, game_id: str) -> Optional[LiveGame]:
+        return self._games.get(game_id)
+
+    def get_live_by_username(self, username: str) -> Optional[LiveGame]:
+        game_id = self._ids_by_username.get(username)
+        return self._games.get(game_id) if game_id else None
+
+    def upsert(self, username: str, score: int, game_mode: str, snake: List[SnakeSegment], food: Position, seq: Optional[int] = None) -> LiveGame:
+        """Replace a player's whole game state (a keyframe)."""
+        game = self._store(username, score, game_mode, snake, food, seq)
+        self._dirty.add(game.id)
+        replay_recorder.observe(game)
+        self._broadcast_state(game)
+        return game
+
+    def _store(self, username: str, score: int, game_mode: str, snake: List[SnakeSegment], food: Position, seq: Optional[int], game_id: Optional[str] = None) -> LiveGame:
+        game = self._games.get(game_id) if game_id else self.get_live_by_username(username)
+        if game is None:
+            game_id = game_id or f"game-{username}-{uuid.uuid4()}"
+            self._ids_by_username[username] = game_id
+            game = LiveGame(game_id, username, score, game_mode, snake, food)
+            self._games[game_id] = game
+            self._changed()
+        else:
+            self._changed(summary=(score, game_mode, len(snake)) != (game.score, game.gameMode, len(game.snake)))
+            game.score = score
+            game.gameMode = game_mode
+            game.snake = deque(snake)
+            game.food = food
+        game.seq = seq if seq is not None else game.seq + 1
+        game.history.clear()
+        game.deltas_since_keyframe = 0
+        game.changed()
+        self._publish(game, game.keyframe())
+        return game
+
+    def apply_delta(self, username: str, seq: int, heads: List[SnakeSegment], pops: int, food: Optional[Position], score: Optional[int]) -> Optional[LiveGame]:
+        """Apply an incremental update in O(1) of snake length.
+
+        Returns None when the game is unknown or the delta does not directly
+        follow the last applied sequence number; the player must then send a
+        keyframe.
+        """
+        game = self._apply_delta(username, seq, heads, pops, food, score)
+        if game is None:
+            return None
+        self._dirty.add(game.id)
+        replay_recorder.observe(game)
+        if game.deltas_since_keyframe == 0:
+            self._broadcast_state(game)
+        else:
+            self._broadcast({"t": "delta", "u": username, "f": game.history[-1][1].text})
+        return game
+
+    def _apply_delta(self, username: str, seq: int, heads: List[SnakeSegment], pops: int, food: Optional[Position], score: Optional[int]) -> Optional[LiveGame]:
+        game = self.get_live_by_username(username)
+        if game is None or seq != game.seq + 1:
+            return None
+        self._changed(summary=len(heads) != pops or (score is not None and score != game.score))
+        for head in heads:
+            game.snake.appendleft(head)
+        for _ in range(min(pops, len(game.snake))):
+            game.snake.pop()
+        if food is not None:
+            game.food = food
+        if score is not None:
+            game.score = score
+        game.seq = seq
+        game.changed()
+
+        game.deltas_since_keyframe += 1
+        if game.deltas_since_keyframe >= DELTA_KEYFRAME_INTERVAL:
+            # Periodic keyframe so spectators never drift for long
+            game.deltas_since_keyframe = 0
+            game.history.clear()
+            self._publish(game, game.keyframe())
+        else:
+            frame = GameFrame(encode_delta(seq, heads, pops, food, score))
+            game.history.append((seq, frame))
+            self._publish(game, frame)
+        return game
+
+    def remove(self, game_id: str) -> bool:
+        """Take a game out of the live set and end its spectator streams."""
+        if not self._drop(game_id):
+            return False
+        self._removed.add(game_id)
+        self._broadcast({"t": "remove", "id": game_id})
+        return True
+
+    def _drop(self, game_id: str) -> bool:
+        game = self._games.pop(game_id, None)
+        if game is None:
+            return False
+        if self._ids_by_username.get(game.username) == game_id:
+            del self._ids_by_username[game.username]
+        self._dirty.discard(game_id)
+        self._changed()
+        for subscription in self._subscribers.pop(game_id, ()):
+            subscription.close()
+        return True
+
+    def _broadcast(self, event: dict):
+        if self.broker is not None and self.broker.active:
+            self.broker.publish("game", event)
+
+    def _broadcast_state(self, game: LiveGame):
+        if self.broker is not None and self.broker.active:
+            self.broker.publish("game", {"t": "state", "id": game.id, "u": game.username, "f": game.keyframe().text})
+
+    def apply_event(self, event: dict):
+        """Apply a change published by another worker.
+
+        Replicated games are only held in memory: the worker that received
+        the player's update writes it to the database and the replay file.
+        A delta that does not follow the replica's sequence is skipped; the
+        next periodic keyframe brings the replica back in step.
+        """
+        kind = event["t"]
+        if kind == "state":
+            frame = json.loads(event["f"])
+            score, mode, snake, food = parse_keyframe(frame, "walls")
+            self._store(event["u"], score, mode, snake, food, frame["q"], event["id"])
+        elif kind == "delta":
+            self._apply_delta(event["u"], *parse_delta(json.loads(event["f"])))
+        elif kind == "remove":
+            self._drop(event["id"])
+
+    def sweep(self, ttl: float, now: Optional[float] = None) -> List[str]:
+        """Remove games that have not been updated for `ttl` seconds."""
+        cutoff = (now if now is not None else time.time()) - ttl
+        expired = [game.id for game in self._games.values() if game.updated_at < cutoff]
+        for game_id in expired:
+            self.remove(game_id)
+            replay_recorder.discard(game_id)
+        return expired
+
+    def frames_since(self, game_id: str, since: int) -> Optional[List[GameFrame]]:
+        """Delta frames after `since`, or None when they are no longer retained."""
+        game = self._games.get(game_id)
+        if game is None:
+            return None
+        if since == game.seq:
+            return []
+        if not game.history or since < game.history[0][0] - 1 or since > game.seq:
+            return None
+        return [frame for seq, frame in game.history if seq > since]
+
+    def _publish(self, game: LiveGame, delta_frame: GameFrame):
+        subscribers = self._subscribers.get(game.id)
+        if not subscribers:
+            return
+        for subscription in subscribers:
+            subscription.push(delta_frame if subscription.delta else game.snapshot())
+
+    def subscribe(self, game_id: str, delta: bool = False):
+        if delta:
+            subscription = DeltaSubscription(game_id, self)
+        else:
+            subscription = Subscription(game_id)
+            game = self._games.get(game_id)
+            if game is not None:
+                subscription.push(game.snapshot())
+        self._subscribers.setdefault(game_id, set()).add(subscription)
+        self._changed()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self._subscribers.get(subscription.game_id)
+        if subscribers is not None and subscription in subscribers:
+            subscribers.discard(subscription)
+            self._changed()
+            if not subscribers:
+                del self._subscribers[subscription.game_id]
+
+    def viewer_count(self, game_id: str) -> int:
+        return len(self._subscribers.get(game_id, ()))
+
+    def stats(self) -> dict:
+        return {
+            "games": len(self._games),
+            "spectators": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "pendingWrites": len(self._dirty) + len(self._removed)
+        }
+
+    async def flush(self, session: AsyncSession) -> int:
+        if not self._dirty and not self._removed:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        removed, self._removed = self._removed, set()
+        pending = {game_id: self._games[game_id] for game_id in dirty if game_id in self._games}
+        states = {}
+        for game_id, game in pending.items():
+            try:
+                states[game_id] = encode_game_state(game.snake, game.food)
+            except (struct.error, ValueError):
+                # Retrying cannot help, and failing the batch would keep every other game unsaved
+                logger.exception("Skipping live game %s: its state cannot be stored", game_id)
+        pending = {game_id: game for game_id, game in pending.items() if game_id in states}
+        try:
+            if removed:
+                await session.execute(delete(ActiveGame).where(ActiveGame.id.in_(removed)))
+            result = await session.execute(select(ActiveGame).where(ActiveGame.id.in_(pending.keys())))
+            existing = {g.id: g for g in result.scalars().all()}
+            for game_id, game in pending.items():
+                row = existing.get(game_id)
+                if row is None:
+                    row = ActiveGame(id=game_id)
+                    session.add(row)
+                row.username = game.username
+                row.score = game.score
+                row.gameMode = game.gameMode
+                row.state = states[game_id]
+                row.updatedAt = datetime.fromtimestamp(game.updated_at)
+            await session.commit()
+        except Exception:
+            # Keep the games dirty so the next flush retries them
+            self._dirty |= dirty & self._games.keys()
+            self._removed |= removed
+            raise
+        return len(pending) + len(removed)
+
+    async def _flush_loop(self, session_factory, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_factory() as session:
+                    await self.flush(session)
+            except Exception:
+                logger.exception("Failed to flush live games")
+            try:
+                await replay_recorder.flush()
+            except Exception:
+                logger.exception("Failed to flush replays")
+
+    async def _sweep_loop(self, ttl: float, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            expired = self.sweep(ttl)
+            if expired:
+                logger.info("Expired %d idle games", len(expired))
+
+    def start(self, session_factory, interval: float):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop(session_factory, interval))
+
+    def start_sweeper(self, ttl: float, interval: float):
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self._sweep_loop(ttl, interval))
+
+    async def stop(self, session_factory):
+        for task in (self._sweep_task, self._flush_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._sweep_task = None
+        self._flush_task = None
+        async with session_factory() as session:
+            await self.flush(session)
+        await replay_recorder.flush()
+
+    def clear(self):
+        self._games.clear()
+        self._ids_by_username.clear()
+        self._dirty.clear()
+        self._removed.clear()
+        self._subscribers.clear()
+        self._loaded = False
+
+
+hub = LiveGameHub(default_broker)
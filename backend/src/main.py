@@ -1,14 +1,47 @@
-from fastapi import FastAPI
+from .startup import startup_timer
+from fastapi import FastAPI, Header, HTTPException, status
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import auth, leaderboard, spectate
+from .routers import auth, leaderboard, spectate, replays, metrics
 
 from contextlib import asynccontextmanager
-from .db import init_db
+from .db import init_db, prewarm_pool, AsyncSessionLocal
+from .config import LIVE_FLUSH_INTERVAL, ACTIVE_GAME_TTL, ACTIVE_GAME_SWEEP_INTERVAL, DB_POOL_PREWARM, DB_POOL_SIZE
+from .live import hub as live_hub
+from .ranking import leaderboard_cache
+from .security import password_hasher
+from .static import static_site, IMMUTABLE_PREFIX
+from .metrics import MetricsMiddleware
+from .broker import broker
+
+async def _load_leaderboard_cache():
+    async with AsyncSessionLocal() as session:
+        await leaderboard_cache.ensure_loaded(session)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
+    startup_timer.mark("imports")
+    startup_timer.mark("schema created or migrated" if await init_db() else "schema version check")
+    # Listen before hydrating, so no change made by another worker in between is missed
+    await broker.start({"game": live_hub.apply_event, "leaderboard": leaderboard_cache.apply_event})
+    startup_timer.mark("broker")
+    async with AsyncSessionLocal() as session:
+        await live_hub.ensure_loaded(session)
+    live_hub.start(AsyncSessionLocal, LIVE_FLUSH_INTERVAL)
+    live_hub.start_sweeper(ACTIVE_GAME_TTL, ACTIVE_GAME_SWEEP_INTERVAL)
+    startup_timer.mark("live games")
+    # Requests are served meanwhile: leaderboard reads made before the cache is loaded load it
+    # themselves, and static requests made before the index is built wait for it
+    startup_timer.background("leaderboard cache", _load_leaderboard_cache())
+    startup_timer.background("static files", static_site.ensure_loaded())
+    if DB_POOL_PREWARM:
+        startup_timer.background("connection pool", prewarm_pool(DB_POOL_SIZE))
+    startup_timer.ready()
     yield
+    await startup_timer.cancel_background()
+    await live_hub.stop(AsyncSessionLocal)
+    await broker.stop()
+    password_hasher.shutdown()
 
 app = FastAPI(
     title="Nokia Nostalgia Snake API",
@@ -25,38 +58,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so request timings include every other middleware
+app.add_middleware(MetricsMiddleware)
 
 # Include Routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(leaderboard.router, prefix="/api")
 app.include_router(spectate.router, prefix="/api")
+app.include_router(replays.router, prefix="/api")
+app.include_router(metrics.router, prefix="/api")
 
-# Serve frontend static files
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-import os
-
-# Mount static files - check if directory exists to avoid errors in dev if not built
-static_dir = os.path.join(os.path.dirname(__file__), "../static")
-if os.path.exists(static_dir):
-    app.mount("/assets", StaticFiles(directory=os.path.join(static_dir, "assets")), name="assets")
-
-@app.get("/{full_path:path}")
-async def serve_app(full_path: str):
-    # API routes are already handled above because they are included first
-    # If the path is a file in static_dir, serve it? 
-    # Actually, for SPA, we usually serve index.html for everything that isn't an API route or a static asset.
-    # But we mounted /assets explicitly.
-    
-    # Check if a specific file exists in static dir (e.g. favicon.ico, manifest.json)
-    if os.path.exists(static_dir):
-        file_path = os.path.join(static_dir, full_path)
-        if os.path.isfile(file_path):
-             return FileResponse(file_path)
-
-    # Fallback to index.html
-    index_path = os.path.join(static_dir, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
-        
-    return {"message": "Frontend not found. Please build the frontend."}
+# Serve the built frontend: known files from the static index, index.html for client-side routes
+@app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
+async def serve_app(full_path: str, accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    entry = await static_site.get(full_path)
+    if entry is None:
+        if full_path.startswith(IMMUTABLE_PREFIX):
+            # A missing bundle file must not come back as HTML
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+        entry = await static_site.get("index.html")
+    if entry is None:
+        return {"message": "Frontend not found. Please build the frontend."}
+    return static_site.response(entry, accept_encoding, if_none_match)
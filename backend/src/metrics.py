@@ -0,0 +1,252 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Prometheus text exposition without a client library. Observing is a dict
+# lookup, a bisect and two additions, so the hooks stay on permanently; the
+# text is only built when /api/metrics is scraped.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    """A total that only goes up: incremented here, or read from `callback` at scrape time."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        if self.callback is not None:
+            return [f"{self.name} {_number(self.callback())}"]
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """A value set directly, or read from `callback` at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, help)
+        self.value = 0.0
+        self.callback = callback
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def samples(self) -> List[str]:
+        value = self.callback() if self.callback is not None else self.value
+        return [f"{self.name} {_number(value)}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_labels = _labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+http_requests_in_flight = registry.register(Gauge("http_requests_in_flight", "HTTP requests being handled."))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.",
+    LATENCY_BUCKETS, ("method", "route", "status")
+))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Database statement latency by statement type.",
+    QUERY_BUCKETS, ("statement",)
+))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "Database statements run while handling one HTTP request.",
+    COUNT_BUCKETS, ("route",)
+))
+db_pool_checkout_wait = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection, including opening new ones.",
+    QUERY_BUCKETS
+))
+
+# Statements run by the current request; None outside a request (e.g. the flush loop)
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+
+# id(route) -> prefix the route was included under
+_route_prefixes: Dict[int, str] = {}
+
+def route_template(scope) -> str:
+    """The matched route's path template, e.g. /api/spectate/{game_id}.
+
+    Depending on the FastAPI version, routes included with a prefix report
+    either the full path or the path relative to their router, so the prefix
+    is recovered once per route from the part of the URL its regex matches.
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return "unmatched"
+    prefix = _route_prefixes.get(id(route))
+    if prefix is None:
+        url = scope["path"]
+        prefix = ""
+        for i in range(len(url)):
+            if url[i] == "/" and route.path_regex.match(url[i:]):
+                prefix = url[:i]
+                break
+        _route_prefixes[id(route)] = prefix
+    return prefix + path
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by method, route template and status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            _request_queries.reset(token)
+            route = route_template(scope)
+            http_request_duration.observe(elapsed, scope["method"], route, str(status[0]))
+            db_queries_per_request.observe(queries[0], route)
+
+
+def _statement_type(statement: str) -> str:
+    keyword = statement.lstrip()[:6].upper()
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    db_query_duration.observe(time.perf_counter() - start, _statement_type(statement))
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
+def instrument_engine(engine):
+    """Attach the query timing hooks to an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """The async engines' default pool, timing how long each checkout waits."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - start)
@@ -1,17 +1,26 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import List, Optional, Literal
+from typing import Annotated, List, Optional, Literal, Tuple
 from datetime import datetime
 
 GameMode = Literal['pass-through', 'walls']
+LeaderboardWindow = Literal['all', 'daily', 'weekly', 'monthly']
+# best: each user's best score per game mode; all: every submitted score
+LeaderboardView = Literal['best', 'all']
 
 class User(BaseModel):
     id: str
     username: str
     email: EmailStr
 
+# Coordinates are stored as int16 (see protocol.encode_game_state). The grid
+# is not the bound: in walls mode the head that hit the wall lies outside it.
+COORDINATE_MIN = -32768
+COORDINATE_MAX = 32767
+Coordinate = Annotated[int, Field(ge=COORDINATE_MIN, le=COORDINATE_MAX)]
+
 class Position(BaseModel):
-    x: int
-    y: int
+    x: Coordinate
+    y: Coordinate
 
 class SnakeSegment(Position):
     dotSide: Literal['left', 'right']
@@ -31,6 +40,21 @@ class ActiveGame(BaseModel):
     snake: List[SnakeSegment]
     food: Position
 
+class ActiveGameSummary(BaseModel):
+    id: str
+    username: str
+    score: int
+    gameMode: GameMode
+    snakeLength: int
+    viewers: int
+
+class TokenClaims(BaseModel):
+    sub: str
+    username: str
+    iat: int
+    exp: int
+    kid: str
+
 class AuthResponse(BaseModel):
     success: bool
     user: Optional[User] = None
@@ -42,6 +66,9 @@ class ApiResponse(BaseModel):
     data: Optional[object] = None
     error: Optional[str] = None
 
+class PageResponse(ApiResponse):
+    nextCursor: Optional[str] = None
+
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
@@ -63,3 +90,11 @@ class UpdateGameRequest(BaseModel):
     snake: List[SnakeSegment]
     food: Position
 
+
+class UpdateGameDeltaRequest(BaseModel):
+    username: str
+    q: int
+    h: List[Tuple[Coordinate, Coordinate, Literal[0, 1]]] = []
+    p: int = Field(0, ge=0)
+    f: Optional[Tuple[Coordinate, Coordinate]] = None
+    s: Optional[int] = None
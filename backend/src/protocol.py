@@ -0,0 +1,117 @@
+import json
+import struct
+from typing import Iterable, List, Optional, Tuple
+from .models import SnakeSegment, Position, COORDINATE_MIN, COORDINATE_MAX
+
+# Compact wire format shared by player ingest and spectator streams.
+#
+# Segments travel as [x, y, dot] where dot is 0 for 'left' and 1 for 'right'.
+# Keyframe: {"q": seq, "s": score, "m": mode, "k": [segment, ...], "f": [x, y]}
+# Delta:    {"q": seq, "h": [segment, ...], "p": tail_pops, "f": [x, y]?, "s": score?}
+# A delta pushes the "h" segments onto the head (oldest first), pops "p"
+# segments off the tail and only carries food/score when they changed.
+
+DOT_SIDES = ('left', 'right')
+GAME_MODES = ('pass-through', 'walls')
+
+def is_keyframe(frame: dict) -> bool:
+    return "k" in frame
+
+def _coordinates(x, y) -> Tuple[int, int]:
+    x, y = int(x), int(y)
+    if not (COORDINATE_MIN <= x <= COORDINATE_MAX and COORDINATE_MIN <= y <= COORDINATE_MAX):
+        raise ValueError("Coordinate out of range")
+    return x, y
+
+def decode_segment(item) -> SnakeSegment:
+    x, y, d = item
+    if d not in (0, 1):
+        raise ValueError("Invalid dot side")
+    x, y = _coordinates(x, y)
+    return SnakeSegment.model_construct(x=x, y=y, dotSide=DOT_SIDES[d])
+
+def encode_segment(segment: SnakeSegment) -> list:
+    return [segment.x, segment.y, 0 if segment.dotSide == 'left' else 1]
+
+def decode_position(item) -> Position:
+    x, y = _coordinates(*item)
+    return Position.model_construct(x=x, y=y)
+
+def parse_keyframe(frame: dict, game_mode: str) -> Tuple[int, str, List[SnakeSegment], Position]:
+    score = frame["s"]
+    mode = frame.get("m", game_mode)
+    if not isinstance(score, int) or mode not in GAME_MODES:
+        raise ValueError("Invalid score or game mode")
+    return score, mode, [decode_segment(s) for s in frame["k"]], decode_position(frame["f"])
+
+def parse_delta(frame: dict) -> Tuple[int, List[SnakeSegment], int, Optional[Position], Optional[int]]:
+    seq = frame["q"]
+    pops = frame.get("p", 0)
+    score = frame.get("s")
+    if not isinstance(seq, int) or not isinstance(pops, int) or pops < 0:
+        raise ValueError("Invalid sequence number or pop count")
+    if score is not None and not isinstance(score, int):
+        raise ValueError("Invalid score")
+    heads = [decode_segment(s) for s in frame.get("h", ())]
+    food = decode_position(frame["f"]) if frame.get("f") is not None else None
+    return seq, heads, pops, food, score
+
+def encode_keyframe(seq: int, score: int, game_mode: str, snake: Iterable[SnakeSegment], food: Position) -> str:
+    return json.dumps({
+        "q": seq,
+        "s": score,
+        "m": game_mode,
+        "k": [encode_segment(s) for s in snake],
+        "f": [food.x, food.y]
+    }, separators=(",", ":"))
+
+def encode_delta(seq: int, heads: List[SnakeSegment], pops: int, food: Optional[Position], score: Optional[int]) -> str:
+    frame = {"q": seq, "h": [encode_segment(s) for s in heads], "p": pops}
+    if food is not None:
+        frame["f"] = [food.x, food.y]
+    if score is not None:
+        frame["s"] = score
+    return json.dumps(frame, separators=(",", ":"))
+
+
+# Packed storage format for the active_games.state column.
+#
+# Byte 0 selects the layout. PACKED_COMPACT stores the food and each segment
+# as one little-endian uint16: x | y << 5 | dot << 10 (food has no dot).
+# Coordinates outside 0..31 fall back to PACKED_WIDE: food as two int16 and
+# each segment as two int16 plus a dot byte.
+PACKED_COMPACT = 1
+PACKED_WIDE = 2
+_COMPACT_LIMIT = 32
+_WIDE_FOOD = struct.Struct("<hh")
+_WIDE_SEGMENT = struct.Struct("<hhB")
+
+# Every compact segment value maps to one shared SnakeSegment. Segments are
+# never mutated in place (updates replace them), so decoding is a table lookup.
+_COMPACT_SEGMENTS = [
+    SnakeSegment.model_construct(x=code & 31, y=(code >> 5) & 31, dotSide=DOT_SIDES[code >> 10])
+    for code in range(2 * _COMPACT_LIMIT * _COMPACT_LIMIT)
+]
+
+def encode_game_state(snake: Iterable[SnakeSegment], food: Position) -> bytes:
+    snake = list(snake)
+    if all(0 <= p.x < _COMPACT_LIMIT and 0 <= p.y < _COMPACT_LIMIT for p in (food, *snake)):
+        codes = [food.x | food.y << 5]
+        codes.extend(s.x | s.y << 5 | (0 if s.dotSide == 'left' else 1) << 10 for s in snake)
+        return bytes((PACKED_COMPACT,)) + struct.pack(f"<{len(codes)}H", *codes)
+    parts = [bytes((PACKED_WIDE,)), _WIDE_FOOD.pack(food.x, food.y)]
+    parts.extend(_WIDE_SEGMENT.pack(s.x, s.y, 0 if s.dotSide == 'left' else 1) for s in snake)
+    return b"".join(parts)
+
+def decode_game_state(data: bytes) -> Tuple[List[SnakeSegment], Position]:
+    if data[0] == PACKED_COMPACT:
+        food, *codes = struct.unpack_from(f"<{(len(data) - 1) // 2}H", data, 1)
+        return [_COMPACT_SEGMENTS[c] for c in codes], Position.model_construct(x=food & 31, y=food >> 5)
+    if data[0] == PACKED_WIDE:
+        x, y = _WIDE_FOOD.unpack_from(data, 1)
+        snake = [
+            SnakeSegment.model_construct(x=sx, y=sy, dotSide=DOT_SIDES[d])
+            for sx, sy, d in _WIDE_SEGMENT.iter_unpack(data[1 + _WIDE_FOOD.size:])
+        ]
+        return snake, Position.model_construct(x=x, y=y)
+    raise ValueError("Unknown packed game state format")
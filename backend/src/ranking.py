@@ -0,0 +1,337 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from .models import LeaderboardEntry as PydanticLeaderboardEntry
+from .tables import LeaderboardEntry
+from .broker import Broker, broker as default_broker
+
+# Sort key matching the SQL ordering: score DESC, date ASC, id ASC
+RankKey = Tuple[int, datetime, str]
+
+def rank_key(entry: PydanticLeaderboardEntry) -> RankKey:
+    return (-entry.score, entry.date, entry.id)
+
+LOAD_BATCH_SIZE = 1000
+
+# Windowed boards rank only the entries since the start of the current day,
+# week (from Monday) or month, on the same clock entry dates are taken from
+WINDOWS = ("daily", "weekly", "monthly")
+
+def window_start(window: str, now: datetime) -> datetime:
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == "daily":
+        return day
+    if window == "weekly":
+        return day - timedelta(days=day.weekday())
+    if window == "monthly":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown leaderboard window {window!r}")
+
+
+class RankedBoard:
+    """Entries of one board kept in rank order in a sorted array.
+
+    Lookups are binary searches; inserts and deletes shift the array.
+    """
+
+    def __init__(self):
+        self._keys: List[RankKey] = []
+        self._entries: Dict[str, PydanticLeaderboardEntry] = {}
+        self._user_keys: Dict[str, List[RankKey]] = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, entry_id: str) -> Optional[PydanticLeaderboardEntry]:
+        return self._entries.get(entry_id)
+
+    def best_of(self, username: str) -> Optional[PydanticLeaderboardEntry]:
+        user_keys = self._user_keys.get(username)
+        return self._entries[user_keys[0][2]] if user_keys else None
+
+    def add(self, entry: PydanticLeaderboardEntry):
+        if entry.id in self._entries:
+            self.remove(entry.id)
+        key = rank_key(entry)
+        insort(self._keys, key)
+        self._entries[entry.id] = entry
+        insort(self._user_keys.setdefault(entry.username, []), key)
+
+    def remove(self, entry_id: str) -> bool:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return False
+        key = rank_key(entry)
+        del self._keys[bisect_left(self._keys, key)]
+        user_keys = self._user_keys[entry.username]
+        del user_keys[bisect_left(user_keys, key)]
+        if not user_keys:
+            del self._user_keys[entry.username]
+        return True
+
+    def page(self, limit: int, after: Optional[RankKey] = None) -> List[PydanticLeaderboardEntry]:
+        start = 0
+        if after is not None:
+            score, date, entry_id = after
+            start = bisect_right(self._keys, (-score, date, entry_id))
+        return [self._entries[key[2]] for key in self._keys[start:start + limit]]
+
+    def rank_of(self, username: str) -> Optional[Tuple[int, PydanticLeaderboardEntry]]:
+        """1-based rank of the user's best entry."""
+        user_keys = self._user_keys.get(username)
+        if not user_keys:
+            return None
+        best = user_keys[0]
+        return bisect_left(self._keys, best) + 1, self._entries[best[2]]
+
+    def around(self, rank: int, radius: int) -> List[Tuple[int, PydanticLeaderboardEntry]]:
+        start = max(0, rank - 1 - radius)
+        keys = self._keys[start:rank + radius]
+        return [(start + i + 1, self._entries[key[2]]) for i, key in enumerate(keys)]
+
+
+class BoardSet:
+    """RankedBoards per game mode plus an all-modes board, over a set of entries.
+
+    `entries` boards rank every entry; `best` boards rank only each user's
+    best entry per game mode, which is what the default leaderboard view
+    shows. When a user's best entry is removed, their next best takes its
+    place from the game mode's entries board.
+    """
+
+    def __init__(self):
+        self.entries: Dict[Optional[str], RankedBoard] = {LeaderboardCache.ALL_MODES: RankedBoard()}
+        self.best: Dict[Optional[str], RankedBoard] = {LeaderboardCache.ALL_MODES: RankedBoard()}
+
+    def board(self, game_mode: Optional[str], best: bool) -> RankedBoard:
+        return (self.best if best else self.entries).get(game_mode) or RankedBoard()
+
+    def all_entries(self) -> List[PydanticLeaderboardEntry]:
+        everything = self.entries[LeaderboardCache.ALL_MODES]
+        return everything.page(len(everything))
+
+    def add(self, entry: PydanticLeaderboardEntry):
+        self.entries[LeaderboardCache.ALL_MODES].add(entry)
+        mode_board = self.entries.setdefault(entry.gameMode, RankedBoard())
+        previous = mode_board.best_of(entry.username)
+        mode_board.add(entry)
+        if previous is None or rank_key(entry) < rank_key(previous):
+            if previous is not None:
+                self._remove_best(previous)
+            self._add_best(entry)
+
+    def remove(self, entry_id: str) -> bool:
+        entry = self.entries[LeaderboardCache.ALL_MODES].get(entry_id)
+        if entry is None:
+            return False
+        self.entries[LeaderboardCache.ALL_MODES].remove(entry_id)
+        mode_board = self.entries[entry.gameMode]
+        mode_board.remove(entry_id)
+        if self.best[entry.gameMode].get(entry_id) is not None:
+            self._remove_best(entry)
+            replacement = mode_board.best_of(entry.username)
+            if replacement is not None:
+                self._add_best(replacement)
+        return True
+
+    def _add_best(self, entry: PydanticLeaderboardEntry):
+        self.best[LeaderboardCache.ALL_MODES].add(entry)
+        self.best.setdefault(entry.gameMode, RankedBoard()).add(entry)
+
+    def _remove_best(self, entry: PydanticLeaderboardEntry):
+        self.best[LeaderboardCache.ALL_MODES].remove(entry.id)
+        self.best[entry.gameMode].remove(entry.id)
+
+
+class LeaderboardCache:
+    """A BoardSet over every entry, plus one per window over the window's entries.
+
+    Loaded once from the database and then kept current by submit_score and
+    delete_leaderboard_entry, and by the same changes made on other workers
+    (see apply_event). Windowed boards hold only the entries of the current
+    window; when a read or write finds that the window has moved on, the
+    board keeps the entries still inside it and drops the rest.
+    """
+
+    ALL_MODES = None
+
+    def __init__(self, broker: Optional[Broker] = None, clock: Callable[[], datetime] = datetime.now):
+        self.broker = broker
+        self.clock = clock
+        self._boards = BoardSet()
+        # window -> (window start, boards over the entries since then)
+        self._windows: Dict[str, Tuple[datetime, BoardSet]] = {}
+        self._loaded = False
+        # Changes made while loads are reading the table, replayed once a load finishes
+        self._loads_in_flight = 0
+        self._changes_during_load: List[Tuple[str, object]] = []
+        # Reads answered from memory, reads that had to load the table first,
+        # and reads answered by SQL because LEADERBOARD_CACHE_ENABLED is off
+        self.hits = 0
+        self.misses = 0
+        self.database_reads = 0
+        # Bumped on every change whether or not the boards are loaded, for ETags
+        self._generation = 0
+        self._versions: Dict[Optional[str], int] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def read(self, session: AsyncSession, game_mode: Optional[str], window: Optional[str] = None, best: bool = True) -> RankedBoard:
+        """`board()` for a leaderboard read, loading the cache first if needed and counting the read."""
+        if self._loaded:
+            self.hits += 1
+        else:
+            self.misses += 1
+            await self.ensure_loaded(session)
+        return self.board(game_mode, window, best)
+
+    def record_database_read(self):
+        self.database_reads += 1
+
+    async def ensure_loaded(self, session: AsyncSession):
+        if self._loaded:
+            return
+        self._loads_in_flight += 1
+        first_change = len(self._changes_during_load)
+        try:
+            boards = BoardSet()
+            now = self.clock()
+            windows = {window: (window_start(window, now), BoardSet()) for window in WINDOWS}
+            # Plain rows in batches rather than ORM objects all at once
+            result = await session.stream(
+                select(LeaderboardEntry.id, LeaderboardEntry.username, LeaderboardEntry.score, LeaderboardEntry.gameMode, LeaderboardEntry.date)
+                .execution_options(yield_per=LOAD_BATCH_SIZE)
+            )
+            async for e in result:
+                entry = PydanticLeaderboardEntry(
+                    id=e.id,
+                    username=e.username,
+                    score=e.score,
+                    gameMode=e.gameMode,
+                    date=e.date
+                )
+                boards.add(entry)
+                for start, window_boards in windows.values():
+                    if entry.date >= start:
+                        window_boards.add(entry)
+        finally:
+            self._loads_in_flight -= 1
+            changes = self._changes_during_load[first_change:]
+            if self._loads_in_flight == 0:
+                self._changes_during_load = []
+        if self._loaded:
+            # A concurrent load finished first
+            return
+        self._boards, self._windows = boards, windows
+        self._loaded = True
+        # Submissions and deletions that landed while the table was being read; both are idempotent
+        for kind, change in changes:
+            if kind == "add":
+                self._add(change)
+            else:
+                self._remove(change)
+
+    def board(self, game_mode: Optional[str], window: Optional[str] = None, best: bool = True) -> RankedBoard:
+        """The board for `game_mode` (None for all modes), all-time or for one of WINDOWS.
+
+        With `best`, each user appears once per game mode, with their best entry.
+        """
+        boards = self._boards if window is None else self._window_boards(window)
+        return boards.board(game_mode, best) if boards is not None else RankedBoard()
+
+    def _window_boards(self, window: str) -> Optional[BoardSet]:
+        start = window_start(window, self.clock())
+        current = self._windows.get(window)
+        if current is None:
+            return None
+        if current[0] == start:
+            return current[1]
+        # Rollover. Entries dated by a clock slightly ahead of this one (another worker's) may
+        # already belong to the new window, so the old entries are filtered rather than dropped.
+        boards = BoardSet()
+        for entry in current[1].all_entries():
+            if entry.date >= start:
+                boards.add(entry)
+        self._windows[window] = (start, boards)
+        return boards
+
+    def _add(self, entry: PydanticLeaderboardEntry):
+        self._boards.add(entry)
+        for window in self._windows:
+            boards = self._window_boards(window)
+            if entry.date >= self._windows[window][0]:
+                boards.add(entry)
+
+    def version(self, game_mode: Optional[str], window: Optional[str] = None) -> str:
+        """Changes whenever the board for `game_mode` (None for all modes) and `window` may have changed."""
+        version = f"{self._generation}.{self._versions.get(game_mode, 0)}"
+        if window is not None:
+            version += f".{window_start(window, self.clock()):%Y%m%d}"
+        return version
+
+    def add(self, entry: PydanticLeaderboardEntry):
+        self._record_add(entry)
+        self._broadcast({"t": "add", "e": entry.model_dump(mode="json")})
+
+    def _record_add(self, entry: PydanticLeaderboardEntry):
+        self._versions[entry.gameMode] = self._versions.get(entry.gameMode, 0) + 1
+        self._versions[self.ALL_MODES] = self._versions.get(self.ALL_MODES, 0) + 1
+        # Nothing to maintain until the first read loads the boards
+        if self._loaded:
+            self._add(entry)
+        elif self._loads_in_flight:
+            self._changes_during_load.append(("add", entry))
+
+    def remove(self, entry_id: str):
+        self._record_remove(entry_id)
+        self._broadcast({"t": "remove", "id": entry_id})
+
+    def _record_remove(self, entry_id: str):
+        # The entry's mode is unknown here, so every board gets a new version
+        self._generation += 1
+        if self._loaded:
+            self._remove(entry_id)
+        elif self._loads_in_flight:
+            self._changes_during_load.append(("remove", entry_id))
+
+    def _remove(self, entry_id: str):
+        self._boards.remove(entry_id)
+        for _, boards in self._windows.values():
+            boards.remove(entry_id)
+
+    def _broadcast(self, event: dict):
+        if self.broker is not None and self.broker.active:
+            self.broker.publish("leaderboard", event)
+
+    def apply_event(self, event: dict):
+        """Apply an entry added or deleted on another worker, or reload after missing some."""
+        if event["t"] == "add":
+            self._record_add(PydanticLeaderboardEntry.model_validate(event["e"]))
+        elif event["t"] == "remove":
+            self._record_remove(event["id"])
+        elif event["t"] == "resync":
+            self.invalidate()
+
+    def invalidate(self):
+        """Drop everything; the next read reloads from the database."""
+        self._generation += 1
+        self._boards = BoardSet()
+        self._windows = {}
+        self._loaded = False
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses + self.database_reads
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "databaseReads": self.database_reads,
+            "hitRate": self.hits / total if total else 0.0,
+            "entries": len(self._boards.entries[self.ALL_MODES]) if self._loaded else 0
+        }
+
+
+leaderboard_cache = LeaderboardCache(default_broker)
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from .engine import GRID_SIZE, DIRECTION_CODES, create_initial_snake
+from .config import REPLAY_DIR, REPLAYS_ENABLED
+
+# Replay file layout, all little-endian:
+#   header  (16 bytes): magic "NNRP", version, game mode (0 walls, 1 pass-through), grid size,
+#                       initial food x, initial food y, 3 pad bytes, start time (unix seconds)
+#   records  (5 bytes): direction code | flags, food x, food y, score
+# Every game starts from create_initial_snake(), so a record per tick is enough to
+# re-simulate the game with src.engine: the direction gives the move and the food
+# gives the next spawn after the snake eats.
+HEADER = struct.Struct("<4sBBBBB3xI")
+RECORD = struct.Struct("<BBBH")
+MAGIC = b"NNRP"
+VERSION = 1
+FLAG_ATE = 0x04
+GAME_MODE_CODES = {'walls': 0, 'pass-through': 1}
+_MOVES = {(0, -1): DIRECTION_CODES['UP'], (0, 1): DIRECTION_CODES['DOWN'], (-1, 0): DIRECTION_CODES['LEFT'], (1, 0): DIRECTION_CODES['RIGHT']}
+_REPLAY_ID = re.compile(r"^[A-Za-z0-9-]{1,64}$")
+# Largest food coordinate and score the header and record fields hold
+_MAX_FOOD = 255
+_MAX_SCORE = 65535
+
+logger = logging.getLogger(__name__)
+
+
+class Recording:
+    __slots__ = ("head", "score", "pending", "path", "ticks")
+
+    def __init__(self, head: Tuple[int, int], score: int, header: bytes, path: str):
+        self.head = head
+        self.score = score
+        self.pending = bytearray(header)
+        self.path = path
+        self.ticks = 0
+
+
+class ReplayRecorder:
+    """Records each live game's ticks into an append-only replay file.
+
+    `observe` runs on the update path and only packs a few bytes into an
+    in-memory buffer; `flush` appends the buffers to `<game id>.part` files
+    from the live hub's flush loop. When the player submits a score the
+    recording is renamed to `<leaderboard entry id>.nnr`, where
+    `GET /api/replays/{id}` serves it.
+    """
+
+    def __init__(self, directory: str, enabled: bool = True):
+        self.directory = directory
+        self.enabled = enabled
+        self._recordings: Dict[str, Recording] = {}
+        # Files of discarded recordings, deleted before anything is appended
+        self._stale: Set[str] = set()
+        self._initial_snake = [(s.x, s.y) for s in create_initial_snake(GRID_SIZE)]
+
+    def observe(self, game):
+        """Record the tick that produced the live game's current state.
+
+        Never raises: a tick that cannot be recorded discards the recording,
+        since the update itself must still go through.
+        """
+        if not self.enabled or not game.snake:
+            return
+        try:
+            self._observe(game)
+        except Exception:
+            logger.exception("Discarding the replay of game %s", game.id)
+            self.discard(game.id)
+
+    def _observe(self, game):
+        head = (game.snake[0].x, game.snake[0].y)
+        recording = self._recordings.get(game.id)
+        fits = 0 <= game.food.x <= _MAX_FOOD and 0 <= game.food.y <= _MAX_FOOD and 0 <= game.score <= _MAX_SCORE
+
+        if game.score == 0 and len(game.snake) == 3 and [(s.x, s.y) for s in game.snake] == self._initial_snake:
+            if recording is None or recording.ticks > 0:
+                # A fresh game: anything recorded before it never reached a submitted score
+                self.discard(game.id)
+                if fits:
+                    self._recordings[game.id] = Recording(head, 0, HEADER.pack(
+                        MAGIC, VERSION, GAME_MODE_CODES.get(game.gameMode, 0), GRID_SIZE,
+                        game.food.x, game.food.y, int(time.time())
+                    ), os.path.join(self.directory, f"{game.id}.part"))
+            return
+        if recording is None or head == recording.head:
+            return
+
+        px, py = recording.head
+        dx = (head[0] - px) % GRID_SIZE
+        dy = (head[1] - py) % GRID_SIZE
+        direction = _MOVES.get((dx - GRID_SIZE if dx > 1 else dx, dy - GRID_SIZE if dy > 1 else dy))
+        if direction is None or not fits:
+            # A lost update leaves a gap the replay cannot bridge, and the format cannot hold the values
+            self.discard(game.id)
+            return
+        flags = FLAG_ATE if game.score > recording.score else 0
+        recording.pending += RECORD.pack(direction | flags, game.food.x, game.food.y, game.score)
+        recording.head = head
+        recording.score = game.score
+        recording.ticks += 1
+
+    def discard(self, game_id: str):
+        """Drop the game's recording; its file is deleted by the next write, off the event loop."""
+        recording = self._recordings.pop(game_id, None)
+        if recording is not None:
+            self._stale.add(recording.path)
+
+    def _write(self, batches: List[Tuple[str, bytes]], stale: Iterable[str] = ()):
+        for path in stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        os.makedirs(self.directory, exist_ok=True)
+        for path, data in batches:
+            with open(path, "ab") as f:
+                f.write(data)
+
+    def _take_pending(self, recordings) -> List[Tuple[str, bytes]]:
+        batches = []
+        for recording in recordings:
+            if recording.pending:
+                batches.append((recording.path, bytes(recording.pending)))
+                recording.pending.clear()
+        return batches
+
+    async def flush(self) -> int:
+        """Append every buffered tick to its file; returns the number of files written."""
+        batches = self._take_pending(self._recordings.values())
+        stale, self._stale = self._stale, set()
+        if batches or stale:
+            try:
+                await asyncio.to_thread(self._write, batches, stale)
+            except Exception:
+                self._stale |= stale
+                raise
+        return len(batches)
+
+    async def finish(self, game_id: Optional[str], score: int, replay_id: str) -> bool:
+        """Keep the game's recording as replay `replay_id` if it ended on `score`."""
+        recording = self._recordings.get(game_id) if game_id else None
+        if recording is None or recording.score != score or recording.ticks == 0:
+            return False
+        del self._recordings[game_id]
+        final_path = os.path.join(self.directory, f"{replay_id}.nnr")
+        # A discarded recording of the same game may have left its file behind
+        stale = {recording.path} & self._stale
+        self._stale -= stale
+
+        def write_and_rename():
+            self._write(self._take_pending([recording]), stale)
+            os.replace(recording.path, final_path)
+
+        await asyncio.to_thread(write_and_rename)
+        return True
+
+    def path_for(self, replay_id: str) -> Optional[str]:
+        if not _REPLAY_ID.match(replay_id):
+            return None
+        path = os.path.join(self.directory, f"{replay_id}.nnr")
+        return path if os.path.isfile(path) else None
+
+    def clear(self):
+        self._recordings.clear()
+        self._stale.clear()
+
+
+class ReplayStore:
+    """Finished replays memory-mapped on first read; the files never change afterwards."""
+
+    def __init__(self, max_open: int = 64):
+        self._max_open = max_open
+        self._maps: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+
+    def open(self, path: str) -> mmap.mmap:
+        data = self._maps.get(path)
+        if data is not None:
+            self._maps.move_to_end(path)
+            return data
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[path] = data
+        if len(self._maps) > self._max_open:
+            _, oldest = self._maps.popitem(last=False)
+            oldest.close()
+        return data
+
+    def clear(self):
+        for data in self._maps.values():
+            data.close()
+        self._maps.clear()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Resolve a single `bytes=start-end` Range header to a half-open [start, end) span."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[6:].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) + 1 if end_text else size
+        else:
+            start = max(0, size - int(end_text))
+            end = size
+    except ValueError:
+        return None
+    end = min(end, size)
+    if start >= end:
+        return None
+    return start, end
+
+
+replay_recorder = ReplayRecorder(REPLAY_DIR, REPLAYS_ENABLED)
+replay_store = ReplayStore()
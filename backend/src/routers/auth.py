@@ -1,18 +1,37 @@
 from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..models import AuthResponse, LoginRequest, SignupRequest, ApiResponse, User
-from ..database import get_user_by_email, get_user_by_username, create_user, get_user_with_password
+from typing import Optional
+from ..models import AuthResponse, LoginRequest, SignupRequest, ApiResponse, User, TokenClaims
+from ..database import get_user_by_email, get_user_by_username, get_user_by_id, create_user, get_user_with_password, update_user_password_hash
 from ..db import get_db
-from ..security import get_password_hash, verify_password
+from ..security import password_hasher, password_needs_rehash, PasswordHasherBusy, create_access_token, get_optional_user
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
+def _busy_response():
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=AuthResponse(success=False, error="Server busy, please try again").model_dump(),
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/login", response_model=AuthResponse)
 async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     user_db = await get_user_with_password(db, request.email)
-    if user_db and verify_password(request.password, user_db.hashed_password):
+    try:
+        valid = user_db is not None and await password_hasher.verify(request.password, user_db.hashed_password)
+    except PasswordHasherBusy:
+        return _busy_response()
+    if valid:
+        if password_needs_rehash(user_db.hashed_password):
+            # The configured bcrypt cost changed since this hash was made
+            try:
+                await update_user_password_hash(db, user_db.id, await password_hasher.hash(request.password))
+            except PasswordHasherBusy:
+                pass # Retried on a later login
         user = User(id=user_db.id, username=user_db.username, email=user_db.email)
-        token = f"mock-token-{user.id}-{user.username}"
+        token = create_access_token(user)
         return AuthResponse(success=True, user=user, token=token)
     return AuthResponse(success=False, error="Invalid email or password") # Return 200 with error as per frontend expectation, or 401 if strict REST. Frontend expects 200 with success: false
 
@@ -26,9 +45,12 @@ async def signup(request: SignupRequest, db: AsyncSession = Depends(get_db)):
     if len(request.password) < 6:
         return AuthResponse(success=False, error="Password must be at least 6 characters")
 
-    hashed_password = get_password_hash(request.password)
+    try:
+        hashed_password = await password_hasher.hash(request.password)
+    except PasswordHasherBusy:
+        return _busy_response()
     user = await create_user(db, request.username, request.email, hashed_password)
-    token = f"mock-token-{user.id}-{user.username}"
+    token = create_access_token(user)
     return AuthResponse(success=True, user=user, token=token)
 
 @router.post("/logout", response_model=ApiResponse)
@@ -36,11 +58,8 @@ async def logout():
     return ApiResponse(success=True)
 
 @router.get("/me", response_model=ApiResponse)
-async def get_current_user():
-    # In a real app, we'd check session/token. 
-    # For mock, we'll just return the first user or null
-    # Frontend expects null if not logged in.
-    # We can't easily know who is logged in without a token.
-    # For this mock, let's assume no one is logged in by default on server side, 
-    # as state is client-side in the current frontend implementation.
-    return ApiResponse(success=True, data=None)
+async def get_current_user(claims: Optional[TokenClaims] = Depends(get_optional_user), db: AsyncSession = Depends(get_db)):
+    # Frontend expects data=null when not logged in
+    if claims is None:
+        return ApiResponse(success=True, data=None)
+    return ApiResponse(success=True, data=await get_user_by_id(db, claims.sub))
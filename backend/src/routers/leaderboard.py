@@ -1,18 +1,96 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Optional, List
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Literal
+from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..models import ApiResponse, LeaderboardEntry, SubmitScoreRequest, GameMode
-from ..database import get_leaderboard, submit_score
+from ..models import ApiResponse, PageResponse, LeaderboardEntry, SubmitScoreRequest, GameMode, LeaderboardWindow, LeaderboardView, TokenClaims
+from ..database import get_leaderboard, submit_score, encode_leaderboard_cursor, decode_leaderboard_cursor, get_leaderboard_rank, score_batcher
+from ..ranking import leaderboard_cache
+from ..security import require_user, ensure_same_user
 from ..db import get_db
+from ..config import LEADERBOARD_PAGE_SIZE, LEADERBOARD_MAX_PAGE_SIZE, FAST_JSON_RESPONSES
+from ..fastjson import api_response, dumps, leaderboard_entry_document
+from ..etag import make_etag, etag_matches, not_modified, tag_response
+from ..export import FORMATS, export_chunks
 
 router = APIRouter(prefix="/leaderboard", tags=["Leaderboard"])
 
-@router.get("", response_model=ApiResponse)
-async def get_leaderboard_route(gameMode: Optional[GameMode] = None, db: AsyncSession = Depends(get_db)):
-    entries = await get_leaderboard(db, gameMode)
-    return ApiResponse(success=True, data=entries)
+@router.get("", response_model=PageResponse)
+async def get_leaderboard_route(
+    gameMode: Optional[GameMode] = None,
+    window: LeaderboardWindow = "all",
+    view: LeaderboardView = "best",
+    limit: int = Query(LEADERBOARD_PAGE_SIZE, ge=1, le=LEADERBOARD_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
+    db: AsyncSession = Depends(get_db)
+):
+    window = None if window == "all" else window
+    # Taken before reading, so a concurrent submit can only make the tag older than the data
+    etag = make_etag("leaderboard", leaderboard_cache.version(gameMode, window))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    after = None
+    if cursor:
+        after = decode_leaderboard_cursor(cursor)
+        if after is None:
+            return PageResponse(success=False, error="Invalid cursor")
+    # Fetch one extra row to learn whether another page exists
+    entries = await get_leaderboard(db, gameMode, limit + 1, after, window, view == "best")
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_leaderboard_cursor(entries[-1])
+    if FAST_JSON_RESPONSES:
+        return tag_response(api_response(dumps([leaderboard_entry_document(e) for e in entries]), next_cursor, page=True), etag)
+    tag_response(response, etag)
+    return PageResponse(success=True, data=entries, nextCursor=next_cursor)
 
 @router.post("", response_model=ApiResponse)
-async def submit_score_route(request: SubmitScoreRequest, db: AsyncSession = Depends(get_db)):
+async def submit_score_route(request: SubmitScoreRequest, claims: TokenClaims = Depends(require_user), db: AsyncSession = Depends(get_db)):
+    ensure_same_user(claims, request.username)
     entry = await submit_score(db, request.username, request.score, request.gameMode)
     return ApiResponse(success=True, data=entry)
+
+@router.get("/stats", response_model=ApiResponse)
+async def get_stats_route():
+    return ApiResponse(success=True, data={
+        "cache": leaderboard_cache.stats(),
+        "scoreBatches": score_batcher.stats()
+    })
+
+@router.get("/export")
+async def export_leaderboard_route(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gameMode: Optional[GameMode] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    claims: TokenClaims = Depends(require_user)
+):
+    """Every entry matching the filters, in rank order, streamed as it is read."""
+    return StreamingResponse(
+        export_chunks(format, gameMode, since, until),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="leaderboard.{format}"'}
+    )
+
+@router.get("/rank/{username}", response_model=ApiResponse)
+async def get_rank_route(
+    username: str,
+    gameMode: Optional[GameMode] = None,
+    window: LeaderboardWindow = "all",
+    view: LeaderboardView = "best",
+    around: int = Query(0, ge=0, le=50),
+    db: AsyncSession = Depends(get_db)
+):
+    found = await get_leaderboard_rank(db, username, gameMode, around, None if window == "all" else window, view == "best")
+    if found is None:
+        return ApiResponse(success=False, error="No scores for user")
+    rank, ranked = found
+    return ApiResponse(success=True, data={
+        "username": username,
+        "rank": rank,
+        "entries": [{"rank": r, "entry": e} for r, e in ranked],
+        "cache": leaderboard_cache.stats()
+    })
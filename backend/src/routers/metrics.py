@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from ..metrics import registry, Counter, Gauge
+from ..live import hub as live_hub
+from ..db import engine
+from ..security import password_hasher
+from ..broker import broker
+
+router = APIRouter(tags=["Metrics"])
+
+def _checked_out_connections() -> int:
+    pool = engine.sync_engine.pool
+    return pool.checkedout() if hasattr(pool, "checkedout") else 0
+
+registry.register(Gauge("live_games", "Games in the live set.", lambda: live_hub.stats()["games"]))
+registry.register(Gauge("live_spectators", "Spectator subscriptions across all live games.", lambda: live_hub.stats()["spectators"]))
+registry.register(Gauge("live_pending_writes", "Live games waiting for the next write-behind flush.", lambda: live_hub.stats()["pendingWrites"]))
+registry.register(Gauge("db_pool_checked_out", "Pooled database connections in use.", _checked_out_connections))
+registry.register(Gauge("password_hashes_pending", "bcrypt calls running or queued.", lambda: password_hasher.pending))
+registry.register(Counter("live_broker_published_total", "Events this worker has sent to other workers.", callback=lambda: broker.published))
+registry.register(Counter("live_broker_received_total", "Events this worker has applied from other workers.", callback=lambda: broker.received))
+registry.register(Counter("live_broker_dropped_total", "Events dropped because the broker queue was full or sending failed.", callback=lambda: broker.dropped))
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics_route():
+    """Prometheus text exposition format."""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
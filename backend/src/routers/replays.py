@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Header, status
+from fastapi.responses import Response
+from typing import Optional
+from ..replay import replay_recorder, replay_store, parse_range, HEADER, RECORD
+
+router = APIRouter(prefix="/replays", tags=["Replays"])
+
+@router.get("/{replay_id}")
+async def get_replay_route(replay_id: str, range: Optional[str] = Header(None)):
+    """Raw replay bytes; a `Range: bytes=` header selects part of the file."""
+    path = replay_recorder.path_for(replay_id)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Replay not found")
+    data = replay_store.open(path)
+    size = len(data)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "X-Replay-Ticks": str((size - HEADER.size) // RECORD.size),
+    }
+    if range is None:
+        return Response(data[:], media_type="application/octet-stream", headers=headers)
+
+    span = parse_range(range, size)
+    if span is None:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+    start, end = span
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    return Response(data[start:end], status_code=status.HTTP_206_PARTIAL_CONTENT, media_type="application/octet-stream", headers=headers)
@@ -1,26 +1,249 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..models import ApiResponse, ActiveGame, UpdateGameRequest
-from ..database import get_active_games, get_game_state, update_active_game
+from typing import Optional, Literal, get_args
+import asyncio
+import json
+from ..models import ApiResponse, PageResponse, GameMode, ActiveGame, UpdateGameRequest, UpdateGameDeltaRequest, TokenClaims
+from ..database import (
+    get_game_state, update_active_game,
+    apply_game_delta, get_game_seq, get_game_frames, is_game_active,
+    get_game_snapshot, get_active_game_page, summarize_active_game,
+    encode_active_games_cursor, decode_active_games_cursor
+)
+from ..security import require_user, ensure_same_user, decode_access_token
+from ..protocol import is_keyframe, parse_keyframe, parse_delta, decode_segment, decode_position
 from ..db import get_db
+from ..live import hub as live_hub
+from ..config import SPECTATOR_SEND_TIMEOUT, SPECTATOR_KEEPALIVE_INTERVAL, FAST_JSON_RESPONSES, SPECTATE_PAGE_SIZE, SPECTATE_MAX_PAGE_SIZE
+from ..fastjson import api_response, json_array, dumps, active_game_summary_document
+from ..etag import make_etag, etag_matches, not_modified, tag_response
 
 router = APIRouter(prefix="/spectate", tags=["Spectate"])
 
-@router.get("/active", response_model=ApiResponse)
-async def get_active_games_route(db: AsyncSession = Depends(get_db)):
-    games = await get_active_games(db)
-    return ApiResponse(success=True, data=games)
+@router.get("/active", response_model=PageResponse)
+async def get_active_games_route(
+    view: Literal["summary", "full"] = "summary",
+    sort: Literal["score", "viewers", "recent"] = "score",
+    gameMode: Optional[GameMode] = None,
+    limit: int = Query(SPECTATE_PAGE_SIZE, ge=1, le=SPECTATE_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Active games, highest `sort` value first.
+
+    The default summary view carries the snake length instead of the body;
+    view=full returns whole game states.
+    """
+    if live_hub.loaded:
+        etag = _active_games_etag(view, sort)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    after = None
+    if cursor:
+        after = decode_active_games_cursor(cursor)
+        if after is None:
+            return PageResponse(success=False, error="Invalid cursor")
+    games = await get_active_game_page(db, sort, limit + 1, after, gameMode)
+    next_cursor = None
+    if len(games) > limit:
+        games = games[:limit]
+        next_cursor = encode_active_games_cursor(games[-1], sort)
+    etag = _active_games_etag(view, sort)
+
+    if FAST_JSON_RESPONSES:
+        if view == "full":
+            data = json_array(g.snapshot().data for g in games)
+        else:
+            data = dumps([active_game_summary_document(g, live_hub.viewer_count(g.id)) for g in games])
+        return tag_response(api_response(data, next_cursor, page=True), etag)
+    tag_response(response, etag)
+    if view == "full":
+        return PageResponse(success=True, data=[g.to_model() for g in games], nextCursor=next_cursor)
+    return PageResponse(success=True, data=[summarize_active_game(g) for g in games], nextCursor=next_cursor)
+
+def _active_games_etag(view: str, sort: str) -> str:
+    # Summaries sorted by score or viewers only change with the summary fields
+    if view == "full" or sort == "recent":
+        return make_etag("active", live_hub.version)
+    return make_etag("active-summary", live_hub.summary_version)
 
 @router.get("/{game_id}", response_model=ApiResponse)
-async def get_game_state_route(game_id: str, db: AsyncSession = Depends(get_db)):
+async def get_game_state_route(game_id: str, if_none_match: Optional[str] = Header(None), response: Response = None, db: AsyncSession = Depends(get_db)):
+    live = live_hub.get_live(game_id)
+    if live is not None and etag_matches(if_none_match, make_etag("game", live.version)):
+        return not_modified(make_etag("game", live.version))
+    if FAST_JSON_RESPONSES:
+        snapshot = await get_game_snapshot(db, game_id)
+        if snapshot is None:
+            return ApiResponse(success=False, error="Game not found")
+        return tag_response(api_response(snapshot.data), make_etag("game", live_hub.get_live(game_id).version))
     game = await get_game_state(db, game_id)
     if not game:
         return ApiResponse(success=False, error="Game not found")
     # print(f"Returning state for {game_id}: Score={game.score}, Head={game.snake[0] if game.snake else 'None'}")
+    tag_response(response, make_etag("game", live_hub.get_live(game_id).version))
     return ApiResponse(success=True, data=game)
 
 @router.post("/update", response_model=ApiResponse)
-async def update_game_state_route(request: UpdateGameRequest, db: AsyncSession = Depends(get_db)):
+async def update_game_state_route(request: UpdateGameRequest, claims: TokenClaims = Depends(require_user), db: AsyncSession = Depends(get_db)):
+    ensure_same_user(claims, request.username)
     # print(f"Received update for {request.username}: Score={request.score}, Head={request.snake[0] if request.snake else 'None'}")
     await update_active_game(db, request.username, request.score, request.gameMode, request.snake, request.food)
     return ApiResponse(success=True)
+
+
+@router.post("/delta", response_model=ApiResponse)
+async def update_game_delta_route(request: UpdateGameDeltaRequest, claims: TokenClaims = Depends(require_user), db: AsyncSession = Depends(get_db)):
+    ensure_same_user(claims, request.username)
+    heads = [decode_segment(h) for h in request.h]
+    food = decode_position(request.f) if request.f is not None else None
+    if not await apply_game_delta(db, request.username, request.q, heads, request.p, food, request.s):
+        return ApiResponse(success=False, error="Resync required", data={"q": await get_game_seq(db, request.username)})
+    return ApiResponse(success=True)
+
+@router.get("/{game_id}/delta")
+async def get_game_delta_route(game_id: str, since: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    """Frames that bring a spectator at sequence `since` up to date.
+
+    Returns the retained deltas after `since`, or a single keyframe when the
+    spectator is too far behind (or sent no `since`).
+    """
+    frames = await get_game_frames(db, game_id, since)
+    if frames is None:
+        return ApiResponse(success=False, error="Game not found")
+    # Frames are already encoded JSON, so splice them in instead of re-serializing
+    body = '{"success":true,"data":[' + ",".join(f.text for f in frames) + '],"error":null}'
+    return Response(content=body, media_type="application/json")
+
+@router.websocket("/ws/play")
+async def play_websocket(websocket: WebSocket, db: AsyncSession = Depends(get_db)):
+    """Persistent ingest channel for a player's game.
+
+    The first message authenticates: {"token", "gameMode", "ack"?}.
+    Every following message is a keyframe or a delta in the compact format
+    described in protocol.py. Deltas that do not follow the last sequence
+    number are answered with {"resync": true, "q": last_seq} and ignored until
+    the player sends a keyframe. When "ack" is set, frames carrying a "q"
+    sequence number are acknowledged.
+    """
+    await websocket.accept()
+    try:
+        try:
+            hello = json.loads(await websocket.receive_text())
+        except ValueError:
+            hello = None
+        token = hello.get("token") if isinstance(hello, dict) else None
+        user = decode_access_token(token) if isinstance(token, str) else None
+        if user is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid credentials")
+            return
+        game_mode = hello.get("gameMode", "walls")
+        if game_mode not in get_args(GameMode):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid game mode")
+            return
+        send_acks = bool(hello.get("ack"))
+        await get_game_seq(db, user.username)
+        # Loading the live hub is the only database work; release the connection for the rest of the session
+        await db.close()
+        await websocket.send_text(json.dumps({"success": True}))
+
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                frame = json.loads(raw)
+                if is_keyframe(frame):
+                    score, game_mode, snake, food = parse_keyframe(frame, game_mode)
+                    seq = frame.get("q")
+                    live_hub.upsert(user.username, score, game_mode, snake, food, seq if isinstance(seq, int) else None)
+                else:
+                    seq, heads, pops, food, score = parse_delta(frame)
+                    if live_hub.apply_delta(user.username, seq, heads, pops, food, score) is None:
+                        game = live_hub.get_live_by_username(user.username)
+                        await websocket.send_text(json.dumps({"resync": True, "q": game.seq if game else None}))
+                        continue
+            except (ValueError, KeyError, TypeError, IndexError, AttributeError):
+                await websocket.send_text(json.dumps({"success": False, "error": "Invalid frame"}))
+                continue
+            if send_acks and "q" in frame:
+                await websocket.send_text(json.dumps({"ack": frame["q"]}))
+    except WebSocketDisconnect:
+        pass
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+@router.websocket("/{game_id}/ws")
+async def watch_websocket(websocket: WebSocket, game_id: str, format: str = "full", db: AsyncSession = Depends(get_db)):
+    """Pushes every new state of a game.
+
+    With format=full viewers that fall behind only ever get the newest state.
+    With format=delta they get a keyframe followed by deltas, and a fresh
+    keyframe whenever they fall too far behind.
+    """
+    await websocket.accept()
+    found = await is_game_active(db, game_id)
+    await db.close()
+    if not found:
+        await websocket.send_text(json.dumps({"success": False, "error": "Game not found"}))
+        await websocket.close()
+        return
+
+    subscription = live_hub.subscribe(game_id, delta=format == "delta")
+    disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        while True:
+            next_frame = asyncio.create_task(subscription.next())
+            done, _ = await asyncio.wait({disconnected, next_frame}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                next_frame.cancel()
+                return
+            frame = next_frame.result()
+            if frame is None:
+                await websocket.send_text(json.dumps({"success": False, "error": "Game ended"}))
+                await websocket.close()
+                return
+            try:
+                await asyncio.wait_for(websocket.send_text(frame.text), SPECTATOR_SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                # Drop consumers that cannot keep up rather than stalling on them
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Too slow")
+                return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        live_hub.unsubscribe(subscription)
+
+@router.get("/{game_id}/events")
+async def watch_events(game_id: str, format: str = "full", db: AsyncSession = Depends(get_db)):
+    """Server-Sent Events fallback for clients that cannot open a WebSocket."""
+    if not await is_game_active(db, game_id):
+        return ApiResponse(success=False, error="Game not found")
+
+    async def stream():
+        subscription = live_hub.subscribe(game_id, delta=format == "delta")
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscription.next(), SPECTATOR_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if frame is None:
+                    yield b"event: end\ndata: {}\n\n"
+                    return
+                yield frame.sse
+        finally:
+            live_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,9 +1,180 @@
-from passlib.context import CryptContext
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+from fastapi import Header, HTTPException, status
+from .models import User, TokenClaims
+from .config import (
+    BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT,
+    AUTH_SECRET_KEYS, AUTH_TOKEN_TTL, AUTH_CLAIMS_CACHE_SIZE
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def pwd_context():
+    """passlib and its bcrypt backend, imported on first use: only login and signup need them,
+    and most requests after a cold start are neither."""
+    from passlib.context import CryptContext
+    # Pinning min and max to the configured cost makes needs_update flag hashes made with any other cost
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
+
+def password_needs_rehash(hashed_password):
+    return pwd_context().needs_update(hashed_password)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool so it never blocks the event loop.
+
+    bcrypt releases the GIL, so threads hash in parallel. Once `workers` calls
+    are running and `queue_limit` more are waiting, further calls are rejected
+    immediately with PasswordHasherBusy instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self._workers = workers
+        self._queue_limit = queue_limit
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, fn, *args):
+        if self._pending >= self._workers + self._queue_limit:
+            raise PasswordHasherBusy()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="bcrypt")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
+
+# Session tokens: base64url(JSON claims) "." base64url(HMAC-SHA256 of the claims part).
+# They are verified purely in CPU, so authenticated requests never query the users table.
+_SIGNING_KEY_ID = AUTH_SECRET_KEYS[0][0]
+_KEYS = {kid: secret.encode() for kid, secret, _ in AUTH_SECRET_KEYS}
+# When each rotated-out key stops verifying tokens
+_KEYS_NOT_AFTER = {kid: not_after for kid, _, not_after in AUTH_SECRET_KEYS if not_after is not None}
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(kid: str, body: str) -> str:
+    return _b64encode(hmac.new(_KEYS[kid], body.encode(), hashlib.sha256).digest())
+
+def create_access_token(user: User, now: Optional[float] = None) -> str:
+    issued_at = int(now if now is not None else time.time())
+    claims = {
+        "sub": user.id,
+        "username": user.username,
+        "iat": issued_at,
+        "exp": issued_at + AUTH_TOKEN_TTL,
+        "kid": _SIGNING_KEY_ID,
+    }
+    body = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{body}.{_sign(_SIGNING_KEY_ID, body)}"
+
+def _check_signature(token: str) -> Optional[TokenClaims]:
+    body, _, signature = token.partition(".")
+    try:
+        claims = TokenClaims.model_validate_json(_b64decode(body))
+        # Bytes, since compare_digest raises TypeError on non-ASCII str
+        signature = signature.encode()
+    except ValueError:
+        return None
+    if claims.kid not in _KEYS or not hmac.compare_digest(signature, _sign(claims.kid, body).encode()):
+        return None
+    return claims
+
+# Tokens that verified, most recently used last. Failures are never stored,
+# so a stream of forged tokens cannot push real sessions out.
+_verified: "OrderedDict[str, TokenClaims]" = OrderedDict()
+
+def _verify_signature(token: str) -> Optional[TokenClaims]:
+    claims = _verified.get(token)
+    if claims is not None:
+        _verified.move_to_end(token)
+        return claims
+    claims = _check_signature(token)
+    if claims is not None and AUTH_CLAIMS_CACHE_SIZE > 0:
+        _verified[token] = claims
+        if len(_verified) > AUTH_CLAIMS_CACHE_SIZE:
+            _verified.popitem(last=False)
+    return claims
+
+def decode_access_token(token: str, now: Optional[float] = None) -> Optional[TokenClaims]:
+    """Claims of a valid, unexpired token signed with an accepted key, else None."""
+    claims = _verify_signature(token)
+    if claims is None:
+        return None
+    now = now if now is not None else time.time()
+    if claims.exp <= now:
+        return None
+    if claims.kid != _SIGNING_KEY_ID and now >= _KEYS_NOT_AFTER.get(claims.kid, 0):
+        # Rotated-out keys are only honoured until their configured expiry
+        return None
+    return claims
+
+def _bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization[:7].lower() == "bearer ":
+        return authorization[7:].strip()
+    return None
+
+async def get_optional_user(authorization: Optional[str] = Header(None)) -> Optional[TokenClaims]:
+    token = _bearer_token(authorization)
+    return decode_access_token(token) if token else None
+
+async def require_user(authorization: Optional[str] = Header(None)) -> TokenClaims:
+    claims = await get_optional_user(authorization)
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return claims
+
+def ensure_same_user(claims: TokenClaims, username: str):
+    if claims.username != username:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token does not belong to this user")
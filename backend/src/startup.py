@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, List, Tuple
+
+# src.main imports this module before anything else, so the first phase
+# covers importing the application: FastAPI, SQLAlchemy and our modules.
+IMPORT_STARTED = time.perf_counter()
+
+# uvicorn only configures its own loggers, so report through the one that
+# prints "Application startup complete"
+logger = logging.getLogger("uvicorn.error")
+
+
+class StartupTimer:
+    """Durations of the startup phases, logged once the app is ready to serve.
+
+    Work started in the background (see `background`) keeps running after
+    that; each task logs its own duration when it finishes.
+    """
+
+    def __init__(self, started: float):
+        self.started = started
+        self._last = started
+        self.phases: List[Tuple[str, float]] = []
+        self.background_phases: List[Tuple[str, float]] = []
+        self.tasks: List[asyncio.Task] = []
+
+    def mark(self, phase: str):
+        """Record the time since the previous mark as `phase`."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def background(self, phase: str, work: Awaitable) -> asyncio.Task:
+        async def run():
+            start = time.perf_counter()
+            try:
+                await work
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Startup task %r failed", phase)
+                return
+            elapsed = time.perf_counter() - start
+            self.background_phases.append((phase, elapsed))
+            logger.info("Startup: %s done in the background in %.0f ms", phase, elapsed * 1000)
+
+        task = asyncio.create_task(run())
+        self.tasks.append(task)
+        return task
+
+    async def cancel_background(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def ready(self):
+        logger.info("Startup: %s", self.summary())
+
+    def summary(self) -> str:
+        total = sum(seconds for _, seconds in self.phases)
+        parts = ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self.phases)
+        return f"ready in {total * 1000:.0f} ms ({parts})"
+
+    def report(self) -> str:
+        lines = [f"{'phase':<32} {'ms':>8}"]
+        lines += [f"{phase:<32} {seconds * 1000:>8.1f}" for phase, seconds in self.phases]
+        lines.append(f"{'ready':<32} {sum(s for _, s in self.phases) * 1000:>8.1f}")
+        lines += [f"{phase + ' (background)':<32} {seconds * 1000:>8.1f}" for phase, seconds in self.background_phases]
+        return "\n".join(lines)
+
+
+startup_timer = StartupTimer(IMPORT_STARTED)
+
+
+async def _measure() -> str:
+    # Run as __main__, this file is a second copy of the module; the app reports to src.startup
+    from . import startup
+    from .main import app
+    async with app.router.lifespan_context(app):
+        await asyncio.gather(*startup.startup_timer.tasks)
+        return startup.startup_timer.report()
+
+
+if __name__ == "__main__":
+    # A cold start in this process: import the app, run its startup and wait for the background work
+    print(asyncio.run(_measure()))
@@ -0,0 +1,197 @@
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+from typing import Dict, Optional
+from fastapi.responses import FileResponse, Response
+from .config import STATIC_DIR, STATIC_MEMORY_LIMIT
+from .etag import etag_matches
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install backend[fast]
+    brotli = None
+
+# Vite writes content-hashed file names under assets/, so those never change in place
+IMMUTABLE_PREFIX = "assets/"
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Encodings in order of preference, with the suffix of their precompressed siblings
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_TYPES = {
+    "application/javascript", "application/json", "application/manifest+json",
+    "application/wasm", "application/xml", "image/svg+xml", "image/x-icon",
+}
+MIN_COMPRESS_SIZE = 256
+
+
+def is_compressible(media_type: str) -> bool:
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+def compress(encoding: str, data: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def available_encodings():
+    return [(encoding, suffix) for encoding, suffix in ENCODINGS if encoding != "br" or brotli is not None]
+
+def accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """Content codings an Accept-Encoding header allows (q > 0)."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class StaticFile:
+    __slots__ = ("media_type", "etag", "cache_control", "path", "body", "variants")
+
+    def __init__(self, media_type: str, etag: str, cache_control: str, path: str, body: Optional[bytes]):
+        self.media_type = media_type
+        self.etag = etag
+        self.cache_control = cache_control
+        # Files over the memory limit keep body None and are streamed from `path`
+        self.path = path
+        self.body = body
+        # encoding -> compressed bytes, or the path of a precompressed sibling on disk
+        self.variants: Dict[str, object] = {}
+
+
+class StaticSite:
+    """The built frontend, indexed once instead of probing the disk per request.
+
+    Files up to `memory_limit` bytes are read into memory together with
+    gzip and brotli variants; `.gz`/`.br` siblings written at build time
+    (`python -m src.static`) are used as they are, anything else is
+    compressed once while indexing. Larger files are streamed from disk.
+    Hashed files under assets/ are served as immutable, the rest (notably
+    index.html) with no-cache and an ETag to revalidate against. Indexing
+    reads, hashes and compresses every file, so it runs on a worker thread.
+    """
+
+    def __init__(self, directory: str, memory_limit: int):
+        self.directory = directory
+        self.memory_limit = memory_limit
+        self._files: Optional[Dict[str, StaticFile]] = None
+        self._loading = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._files is not None
+
+    async def ensure_loaded(self):
+        if self._files is not None:
+            return
+        # Requests arriving during the load wait for it rather than starting their own
+        async with self._loading:
+            if self._files is None:
+                # Assigned here rather than in the thread, so a load cancelled at shutdown stores nothing
+                self._files = await asyncio.to_thread(self._scan)
+
+    def _scan(self) -> Dict[str, StaticFile]:
+        files: Dict[str, StaticFile] = {}
+        if os.path.isdir(self.directory):
+            for root, _, names in os.walk(self.directory):
+                present = set(names)
+                for name in names:
+                    if any(name.endswith(suffix) and name[:-len(suffix)] in present for _, suffix in ENCODINGS):
+                        continue
+                    path = os.path.join(root, name)
+                    key = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                    files[key] = self._index(key, path)
+        return files
+
+    def _index(self, key: str, path: str) -> StaticFile:
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        cache_control = IMMUTABLE_CACHE if key.startswith(IMMUTABLE_PREFIX) else REVALIDATE_CACHE
+        size = os.path.getsize(path)
+        if size > self.memory_limit:
+            stat = os.stat(path)
+            entry = StaticFile(media_type, f'"{stat.st_mtime_ns:x}-{size:x}"', cache_control, path, None)
+            for encoding, suffix in ENCODINGS:
+                if os.path.isfile(path + suffix):
+                    entry.variants[encoding] = path + suffix
+            return entry
+
+        with open(path, "rb") as f:
+            body = f.read()
+        entry = StaticFile(media_type, f'"{hashlib.sha1(body).hexdigest()[:20]}"', cache_control, path, body)
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                with open(path + suffix, "rb") as f:
+                    entry.variants[encoding] = f.read()
+            elif is_compressible(media_type) and size >= MIN_COMPRESS_SIZE and (encoding, suffix) in available_encodings():
+                compressed = compress(encoding, body)
+                if len(compressed) < size:
+                    entry.variants[encoding] = compressed
+        return entry
+
+    async def get(self, path: str) -> Optional[StaticFile]:
+        await self.ensure_loaded()
+        return self._files.get(path)
+
+    def clear(self):
+        self._files = None
+
+    def response(self, entry: StaticFile, accept_encoding: Optional[str], if_none_match: Optional[str]) -> Response:
+        accepted = accepted_encodings(accept_encoding) if entry.variants else set()
+        encoding = next((encoding for encoding, _ in ENCODINGS if encoding in accepted and encoding in entry.variants), None)
+        # Each encoded representation needs its own strong tag
+        etag = entry.etag if encoding is None else f'{entry.etag[:-1]}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": entry.cache_control}
+        if entry.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+
+        content = entry.body if encoding is None else entry.variants[encoding]
+        if isinstance(content, bytes):
+            return Response(content, media_type=entry.media_type, headers=headers)
+        return FileResponse(entry.path if content is None else content, media_type=entry.media_type, headers=headers)
+
+
+def precompress(directory: str) -> int:
+    """Write .gz and .br siblings next to every compressible file; returns the number written."""
+    written = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            if any(name.endswith(suffix) for _, suffix in ENCODINGS):
+                continue
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if not is_compressible(media_type) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            with open(path, "rb") as f:
+                body = f.read()
+            for encoding, suffix in available_encodings():
+                compressed = compress(encoding, body)
+                if len(compressed) < len(body):
+                    with open(path + suffix, "wb") as f:
+                        f.write(compressed)
+                    written += 1
+    return written
+
+
+static_site = StaticSite(STATIC_DIR, STATIC_MEMORY_LIMIT)
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else STATIC_DIR
+    print(f"Wrote {precompress(target)} precompressed files in {target}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy import Column, Integer, String, DateTime, JSON, LargeBinary, Index
 from sqlalchemy.orm import DeclarativeBase
 from datetime import datetime
 
@@ -22,6 +22,36 @@ class LeaderboardEntry(Base):
     gameMode = Column(String)
     date = Column(DateTime, default=datetime.now)
 
+    # Match the leaderboard ordering so keyset pages are index range scans
+    __table_args__ = (
+        Index("ix_leaderboard_mode_rank", gameMode, score.desc(), date, id),
+        Index("ix_leaderboard_rank", score.desc(), date, id),
+        # Each user's entries per mode in rank order, for personal bests and compaction
+        Index("ix_leaderboard_user_rank", username, gameMode, score.desc(), date, id),
+    )
+
+class PersonalBest(Base):
+    """Each user's best leaderboard entry per game mode, which the default leaderboard view ranks."""
+    __tablename__ = "personal_bests"
+
+    username = Column(String, primary_key=True)
+    gameMode = Column(String, primary_key=True)
+    entryId = Column(String)  # The leaderboard entry holding the best score, and its replay
+    score = Column(Integer)
+    date = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_personal_bests_mode_rank", gameMode, score.desc(), date, entryId),
+        Index("ix_personal_bests_rank", score.desc(), date, entryId),
+    )
+
+class SchemaVersion(Base):
+    """Fingerprint of the tables below that the database was last brought up to date with (see db.init_db)."""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(String)
+
 class ActiveGame(Base):
     __tablename__ = "active_games"
 
@@ -29,5 +59,8 @@ class ActiveGame(Base):
     username = Column(String, index=True)
     score = Column(Integer)
     gameMode = Column(String)
-    snake = Column(JSON)  # Storing list of snake segments as JSON
-    food = Column(JSON)   # Storing food position as JSON
+    state = Column(LargeBinary)  # Snake and food packed by protocol.encode_game_state
+    # Legacy JSON storage; init_db migrates these into `state` and clears them
+    snake = Column(JSON(none_as_null=True))
+    food = Column(JSON(none_as_null=True))
+    updatedAt = Column(DateTime)  # Last player update, used to expire abandoned games
@@ -1,15 +1,25 @@
 import pytest
 import asyncio
 from src.db import reset_db, AsyncSessionLocal
-from src.tables import User, LeaderboardEntry, ActiveGame
-from src.security import get_password_hash
+from src.tables import User, LeaderboardEntry, PersonalBest, ActiveGame
+from src.security import get_password_hash, create_access_token
+from src.models import User as PydanticUser, SnakeSegment, Position
+from src.protocol import encode_game_state
+from src.live import hub as live_hub
+from src.ranking import leaderboard_cache
+from src.replay import replay_recorder, replay_store
 from datetime import datetime
 import uuid
 
 @pytest.fixture(autouse=True)
-def setup_db():
-    """Reset database before each test."""
+def setup_db(tmp_path):
+    """Reset database and in-memory live state before each test."""
     asyncio.run(reset_db())
+    live_hub.clear()
+    leaderboard_cache.invalidate()
+    replay_recorder.clear()
+    replay_store.clear()
+    replay_recorder.directory = str(tmp_path / "replays")
     yield
 
 @pytest.fixture(scope="session", autouse=True)
@@ -18,6 +28,14 @@ def cleanup_db_connection():
     from src.db import close_db_connection
     asyncio.run(close_db_connection())
 
+@pytest.fixture
+def auth_headers():
+    """Build a bearer token header for any username; tokens are stateless, so no user row is needed."""
+    def build(username, user_id=None):
+        user = PydanticUser.model_construct(id=user_id or username, username=username, email=f"{username}@game.com")
+        return {"Authorization": f"Bearer {create_access_token(user)}"}
+    return build
+
 @pytest.fixture
 def seed_db_sync():
     """Synchronous wrapper for seeding data."""
@@ -39,6 +57,9 @@ async def seed_data_async():
             LeaderboardEntry(id="2", username="PyPlayer", score=180, gameMode="pass-through", date=datetime.now()),
         ]
         session.add_all(entries)
+        session.add_all([
+            PersonalBest(username=e.username, gameMode=e.gameMode, entryId=e.id, score=e.score, date=e.date) for e in entries
+        ])
         
         # Seed Active Game
         game = ActiveGame(
@@ -46,8 +67,7 @@ async def seed_data_async():
             username="SnakeMaster",
             score=45,
             gameMode="walls",
-            snake=[{"x": 10, "y": 10, "dotSide": "left"}],
-            food={"x": 5, "y": 5}
+            state=encode_game_state([SnakeSegment(x=10, y=10, dotSide="left")], Position(x=5, y=5))
         )
         session.add(game)
         
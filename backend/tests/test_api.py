@@ -53,8 +53,8 @@ def test_get_leaderboard_filter(seed_db_sync):
     assert data["success"] == True
     assert all(entry["gameMode"] == "walls" for entry in data["data"])
 
-def test_submit_score(seed_db_sync):
-    response = client.post("/api/leaderboard", json={"username": "TestUser", "score": 999, "gameMode": "walls"})
+def test_submit_score(seed_db_sync, auth_headers):
+    response = client.post("/api/leaderboard", json={"username": "TestUser", "score": 999, "gameMode": "walls"}, headers=auth_headers("TestUser"))
     assert response.status_code == 200
     data = response.json()
     assert data["success"] == True
@@ -68,6 +68,34 @@ def test_get_active_games(seed_db_sync):
     assert data["success"] == True
     assert len(data["data"]) > 0
 
+def test_active_games_summary_pages(seed_db_sync):
+    from src.live import hub as live_hub
+    from src.models import SnakeSegment, Position
+    client.get("/api/spectate/active")  # Hydrate the seeded game first
+    for name, score in (("Alpha", 10), ("Beta", 90), ("Gamma", 50)):
+        live_hub.upsert(name, score, "walls", [SnakeSegment(x=1, y=1, dotSide="left")] * 2, Position(x=0, y=0))
+
+    data = client.get("/api/spectate/active").json()
+    assert [g["username"] for g in data["data"]] == ["Beta", "Gamma", "SnakeMaster", "Alpha"]
+    assert data["data"][0] == {"id": data["data"][0]["id"], "username": "Beta", "score": 90, "gameMode": "walls", "snakeLength": 2, "viewers": 0}
+    assert data["nextCursor"] is None
+
+    seen = []
+    cursor = None
+    while True:
+        url = "/api/spectate/active?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url).json()
+        seen += [g["username"] for g in page["data"]]
+        cursor = page["nextCursor"]
+        if cursor is None:
+            break
+    assert seen == ["Beta", "Gamma", "SnakeMaster", "Alpha"]
+
+    full = client.get("/api/spectate/active?view=full&limit=1").json()["data"]
+    assert full[0]["snake"] == [{"x": 1, "y": 1, "dotSide": "left"}] * 2
+
+    assert client.get("/api/spectate/active?cursor=garbage").json()["error"] == "Invalid cursor"
+
 def test_get_game_state(seed_db_sync):
     response = client.get("/api/spectate/game1")
     assert response.status_code == 200
@@ -81,3 +109,33 @@ def test_get_game_state_invalid(seed_db_sync):
     data = response.json()
     assert data["success"] == False
     assert data["error"] == "Game not found"
+
+def test_submitting_score_ends_live_game(seed_db_sync, auth_headers):
+    assert client.get("/api/spectate/game1").json()["success"] == True
+    client.post("/api/leaderboard", json={"username": "SnakeMaster", "score": 45, "gameMode": "walls"}, headers=auth_headers("SnakeMaster", "1"))
+    assert client.get("/api/spectate/game1").json()["success"] == False
+    assert all(g["id"] != "game1" for g in client.get("/api/spectate/active").json()["data"])
+
+def test_submit_score_requires_token(seed_db_sync, auth_headers):
+    response = client.post("/api/leaderboard", json={"username": "TestUser", "score": 999, "gameMode": "walls"})
+    assert response.status_code == 401
+
+    response = client.post("/api/leaderboard", json={"username": "TestUser", "score": 999, "gameMode": "walls"}, headers=auth_headers("SomeoneElse"))
+    assert response.status_code == 403
+
+def test_update_game_requires_token(seed_db_sync):
+    response = client.post("/api/spectate/update", json={
+        "username": "SnakeMaster",
+        "score": 10,
+        "gameMode": "walls",
+        "snake": [{"x": 10, "y": 10, "dotSide": "left"}],
+        "food": {"x": 5, "y": 5}
+    }, headers={"Authorization": "Bearer forged.token"})
+    assert response.status_code == 401
+
+def test_leaderboard_stats(seed_db_sync, auth_headers):
+    client.post("/api/leaderboard", json={"username": "TestUser", "score": 5, "gameMode": "walls"}, headers=auth_headers("TestUser"))
+    data = client.get("/api/leaderboard/stats").json()["data"]
+    assert data["scoreBatches"]["entries"] >= 1
+    assert data["scoreBatches"]["largestBatch"] >= 1
+    assert "hitRate" in data["cache"]
@@ -0,0 +1,109 @@
+import asyncio
+import uuid
+from datetime import datetime
+from sqlalchemy import select, func
+from src.db import AsyncSessionLocal
+from src.tables import LeaderboardEntry, PersonalBest, User
+from src.batching import ScoreBatcher
+
+def _values(username, score):
+    return {"id": str(uuid.uuid4()), "username": username, "score": score, "gameMode": "walls", "date": datetime.now()}
+
+async def _submit(batcher, username, score):
+    async with AsyncSessionLocal() as session:
+        return await batcher.submit(session, _values(username, score))
+
+def test_concurrent_submissions_share_one_insert():
+    batcher = ScoreBatcher(max_delay=0.05, max_size=100)
+
+    async def run():
+        entries = await asyncio.gather(*(_submit(batcher, f"player{i}", i * 10) for i in range(5)))
+        assert [(e.username, e.score) for e in entries] == [(f"player{i}", i * 10) for i in range(5)]
+        assert batcher.stats() == {"batches": 1, "entries": 5, "averageBatchSize": 5.0, "largestBatch": 5}
+
+        async with AsyncSessionLocal() as session:
+            assert (await session.execute(select(func.count(LeaderboardEntry.id)))).scalar() == 5
+
+    asyncio.run(run())
+
+def test_full_batch_is_written_without_waiting():
+    batcher = ScoreBatcher(max_delay=60, max_size=3)
+
+    async def run():
+        entries = await asyncio.wait_for(
+            asyncio.gather(*(_submit(batcher, f"p{i}", i) for i in range(3))), timeout=5
+        )
+        assert len({e.id for e in entries}) == 3
+        assert batcher.batches == 1
+
+    asyncio.run(run())
+
+def test_failed_batch_fails_every_caller():
+    batcher = ScoreBatcher(max_delay=0.01, max_size=10)
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            duplicate = _values("dup", 1)
+            await batcher.submit(session, duplicate)
+        results = await asyncio.gather(
+            _submit_values(batcher, duplicate),
+            _submit(batcher, "other", 2),
+            return_exceptions=True
+        )
+        assert all(isinstance(r, Exception) for r in results)
+
+    async def _submit_values(batcher, values):
+        async with AsyncSessionLocal() as session:
+            return await batcher.submit(session, values)
+
+    asyncio.run(run())
+
+def test_batches_record_personal_bests_only_on_improvement():
+    batcher = ScoreBatcher(max_delay=0.05, max_size=100)
+
+    async def bests():
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(select(PersonalBest).order_by(PersonalBest.username))).scalars().all()
+            return [(row.username, row.score, row.entryId) for row in rows]
+
+    async def run():
+        first = await _submit(batcher, "ann", 100)
+        assert await bests() == [("ann", 100, first.id)]
+
+        # One batch holding a worse score, two equal better ones and another user
+        entries = await asyncio.gather(*(_submit(batcher, name, score) for name, score in [("ann", 50), ("ann", 200), ("ann", 200), ("bob", 10)]))
+        assert batcher.batches == 2
+        tied = sorted(entries[1:3], key=lambda e: (e.date, e.id))[0]
+        assert await bests() == [("ann", 200, tied.id), ("bob", 10, entries[3].id)]
+
+        await _submit(batcher, "ann", 150)
+        assert (await bests())[0] == ("ann", 200, tied.id)
+
+    asyncio.run(run())
+
+
+def test_cancelled_leader_still_writes_the_batch_on_its_own_session():
+    batcher = ScoreBatcher(max_delay=60, max_size=100)
+
+    async def leader():
+        async with AsyncSessionLocal() as session:
+            # Unrelated work the request has not committed
+            session.add(User(id="pending", username="pending", email="pending@game.com", hashed_password="x"))
+            await batcher.submit(session, _values("leader", 1))
+
+    async def run():
+        leading = asyncio.ensure_future(leader())
+        await asyncio.sleep(0.01)
+        following = asyncio.ensure_future(_submit(batcher, "follower", 2))
+        await asyncio.sleep(0.01)
+        leading.cancel()
+        entry = await asyncio.wait_for(following, timeout=5)
+        assert entry.username == "follower"
+        assert leading.cancelled()
+
+        async with AsyncSessionLocal() as session:
+            names = (await session.execute(select(LeaderboardEntry.username).order_by(LeaderboardEntry.username))).scalars().all()
+            assert names == ["follower", "leader"]
+            assert await session.get(User, "pending") is None
+
+    asyncio.run(run())
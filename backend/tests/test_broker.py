@@ -0,0 +1,241 @@
+import asyncio
+import pytest
+from datetime import datetime
+from src.broker import Broker, LocalBus, LocalBroker, UnixSocketBroker, PostgresBroker
+from src.live import LiveGameHub
+from src.ranking import LeaderboardCache
+from src.models import SnakeSegment, Position, LeaderboardEntry
+
+def _snake(x, length=3):
+    return [SnakeSegment(x=x - i, y=10, dotSide="left" if i % 2 == 0 else "right") for i in range(length)]
+
+async def _settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+async def _connected_hubs():
+    bus = LocalBus()
+    hubs = [LiveGameHub(LocalBroker(bus)), LiveGameHub(LocalBroker(bus))]
+    for hub in hubs:
+        await hub.broker.start({"game": hub.apply_event})
+    return hubs
+
+def test_games_replicate_between_workers():
+    async def run():
+        worker_a, worker_b = await _connected_hubs()
+        game = worker_a.upsert("Player", 0, "walls", _snake(5), Position(x=1, y=1))
+        await _settle()
+        replica = worker_b.get_live(game.id)
+        assert replica is not None and replica.seq == game.seq
+        assert [(s.x, s.y) for s in replica.snake] == [(5, 10), (4, 10), (3, 10)]
+
+        # A spectator on worker B follows a player connected to worker A
+        subscription = worker_b.subscribe(game.id)
+        await subscription.next()
+        worker_a.apply_delta("Player", game.seq + 1, [SnakeSegment(x=6, y=10, dotSide="right")], 1, Position(x=2, y=2), 10)
+        await _settle()
+        frame = await asyncio.wait_for(subscription.next(), 1)
+        assert b'"score":10' in frame.data
+        assert replica.seq == game.seq and replica.food.x == 2
+
+        # Only the worker that received the update writes it back
+        assert worker_a.stats()["pendingWrites"] == 1
+        assert worker_b.stats()["pendingWrites"] == 0
+
+        worker_a.remove(game.id)
+        await _settle()
+        assert worker_b.get_live(game.id) is None
+        assert await subscription.next() is None
+        assert worker_b.stats()["pendingWrites"] == 0
+
+    asyncio.run(run())
+
+def test_replica_skips_gaps_until_the_next_keyframe():
+    async def run():
+        worker_a, worker_b = await _connected_hubs()
+        game = worker_a.upsert("Player", 0, "walls", _snake(5), Position(x=1, y=1))
+        await _settle()
+        worker_b.get_live(game.id).seq += 5  # as if a delta had been lost
+        worker_a.apply_delta("Player", game.seq + 1, [SnakeSegment(x=6, y=10, dotSide="right")], 1, None, None)
+        await _settle()
+        assert worker_b.get_live(game.id).snake[0].x == 5
+
+        worker_a.upsert("Player", 0, "walls", _snake(7), Position(x=1, y=1))
+        await _settle()
+        assert worker_b.get_live(game.id).snake[0].x == 7
+        assert worker_b.get_live(game.id).seq == game.seq
+
+    asyncio.run(run())
+
+def test_leaderboard_changes_replicate():
+    async def run():
+        bus = LocalBus()
+        caches = [LeaderboardCache(LocalBroker(bus)), LeaderboardCache(LocalBroker(bus))]
+        for cache in caches:
+            await cache.broker.start({"leaderboard": cache.apply_event})
+        before = caches[1].version("walls")
+        caches[0].add(LeaderboardEntry(id="e1", username="Player", score=50, gameMode="walls", date=datetime(2026, 1, 1)))
+        await _settle()
+        assert caches[1].version("walls") != before
+
+        before = caches[1].version("walls")
+        caches[0].remove("e1")
+        await _settle()
+        assert caches[1].version("walls") != before
+
+    asyncio.run(run())
+
+def test_single_worker_publishes_nothing():
+    async def run():
+        hub = LiveGameHub(LocalBroker())
+        await hub.broker.start({"game": hub.apply_event})
+        hub.upsert("Player", 0, "walls", _snake(5), Position(x=1, y=1))
+        assert hub.broker.published == 0
+
+    asyncio.run(run())
+
+def test_unix_socket_broker_relays_and_fails_over(tmp_path):
+    path = str(tmp_path / "live.sock")
+
+    async def run():
+        received = {i: [] for i in range(3)}
+        brokers = [UnixSocketBroker(path) for _ in range(3)]
+        for i, broker in enumerate(brokers):
+            await broker.start({"game": received[i].append})
+        assert [b.leader for b in brokers] == [True, False, False]
+
+        async def wait_for(condition):
+            for _ in range(200):
+                if condition():
+                    return
+                await asyncio.sleep(0.01)
+            raise AssertionError("event not delivered")
+
+        # From a client through the relay to the other client and the leader
+        brokers[1].publish("game", {"t": "remove", "id": "g1"})
+        await brokers[1].drain()
+        await wait_for(lambda: received[0] and received[2])
+        assert received[1] == []
+        assert received[2][0]["id"] == "g1"
+
+        # The leader exits; a client takes over and events flow again
+        await brokers[0].stop()
+        await wait_for(lambda: brokers[1].leader or brokers[2].leader)
+        await wait_for(lambda: brokers[1]._connected.is_set() and brokers[2]._connected.is_set())
+        brokers[2].publish("game", {"t": "remove", "id": "g2"})
+        await wait_for(lambda: any(m["id"] == "g2" for m in received[1]))
+
+        for broker in brokers[1:]:
+            await broker.stop()
+
+    asyncio.run(run())
+
+
+class FakePostgres:
+    """Just enough of a PostgreSQL server and asyncpg connections for PostgresBroker."""
+
+    def __init__(self):
+        self.up = True
+        self.connections = []
+
+    async def connect(self):
+        if not self.up:
+            raise OSError("connection refused")
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+    def notify(self, channel, payload):
+        for connection in self.connections:
+            callback = connection.listeners.get(channel)
+            if callback is not None and not connection.closed:
+                asyncio.get_running_loop().call_soon(callback, connection, 1, channel, payload)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.listeners = {}
+        self.on_terminate = []
+        self.closed = False
+        self.hung = False
+
+    def add_termination_listener(self, callback):
+        self.on_terminate.append(callback)
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    async def execute(self, query, *args):
+        if self.closed:
+            raise ConnectionError("connection is closed")
+        if self.hung:
+            await asyncio.Event().wait()
+        if query.startswith("SELECT pg_notify"):
+            self.server.notify(*args)
+
+    def is_closed(self):
+        return self.closed
+
+    def terminate(self):
+        if not self.closed:
+            self.closed = True
+            for callback in self.on_terminate:
+                asyncio.get_running_loop().call_soon(callback, self)
+
+
+def test_postgres_broker_reconnects_and_listens_again(monkeypatch):
+    monkeypatch.setattr(PostgresBroker, "RETRY_DELAY", 0.01)
+    monkeypatch.setattr(PostgresBroker, "HEALTH_CHECK_INTERVAL", 0.05)
+    monkeypatch.setattr(PostgresBroker, "HEALTH_CHECK_TIMEOUT", 0.05)
+
+    async def run():
+        server = FakePostgres()
+        received = {"a": [], "b": []}
+        resyncs = []
+        broker_a, broker_b = PostgresBroker(server.connect, "live"), PostgresBroker(server.connect, "live")
+        await broker_a.start({"game": received["a"].append, "leaderboard": resyncs.append})
+        await broker_b.start({"game": received["b"].append})
+
+        async def wait_for(condition):
+            for _ in range(300):
+                if condition():
+                    return
+                await asyncio.sleep(0.01)
+            raise AssertionError("condition not reached")
+
+        broker_a.publish("game", {"t": "remove", "id": "g1"})
+        await wait_for(lambda: received["b"])
+
+        # The database restarts: A's connection drops and the first attempts to reconnect fail
+        server.up = False
+        broker_a._driver.terminate()
+        await asyncio.sleep(0.05)
+        assert not broker_a._connected.is_set()
+        broker_a.publish("game", {"t": "remove", "id": "g2"})
+        server.up = True
+        await wait_for(lambda: broker_a.reconnects == 1)
+        # Queued while disconnected, sent once listening again
+        await wait_for(lambda: [m["id"] for m in received["b"]] == ["g1", "g2"])
+        assert resyncs == [{"t": "resync"}]
+        broker_b.publish("game", {"t": "remove", "id": "g3"})
+        await wait_for(lambda: [m["id"] for m in received["a"]] == ["g3"])
+
+        # A connection that stops answering without closing is caught by the health check
+        broker_b._driver.hung = True
+        await wait_for(lambda: broker_b.reconnects == 1)
+        broker_a.publish("game", {"t": "remove", "id": "g4"})
+        await wait_for(lambda: received["b"][-1]["id"] == "g4")
+
+        await broker_a.stop()
+        await broker_b.stop()
+        assert all(c.closed for c in server.connections)
+
+    asyncio.run(run())
+
+def test_broker_without_publish_cannot_be_created():
+    class Silent(Broker):
+        pass
+
+    with pytest.raises(TypeError):
+        Silent()
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, text
+from src.db import AsyncSessionLocal, engine, init_db
+from src.tables import LeaderboardEntry, PersonalBest
+from src.compaction import compact
+from src.replay import replay_recorder
+from src.broker import LocalBus, LocalBroker
+from src.ranking import LeaderboardCache
+
+NOW = datetime(2024, 6, 1, 12)
+
+def _seed(rows):
+    async def run():
+        async with AsyncSessionLocal() as session:
+            session.add_all([
+                LeaderboardEntry(id=id, username=username, score=score, gameMode=mode, date=NOW - timedelta(days=age))
+                for id, username, score, mode, age in rows
+            ])
+            await session.commit()
+    asyncio.run(run())
+
+def _remaining():
+    async def run():
+        async with AsyncSessionLocal() as session:
+            return sorted((await session.execute(select(LeaderboardEntry.id))).scalars())
+    return asyncio.run(run())
+
+def test_compaction_keeps_top_scores_and_recent_entries(tmp_path):
+    _seed(
+        # ann's walls scores: a1 and a2 are her top two, a5 is too recent to touch
+        [("a1", "ann", 500, "walls", 90), ("a2", "ann", 400, "walls", 80), ("a3", "ann", 300, "walls", 70),
+         ("a4", "ann", 200, "walls", 60), ("a5", "ann", 100, "walls", 1),
+         ("a6", "ann", 50, "pass-through", 60), ("b1", "bob", 10, "walls", 60)]
+    )
+    os.makedirs(replay_recorder.directory, exist_ok=True)
+    for replay_id in ("a3", "a1"):
+        open(os.path.join(replay_recorder.directory, f"{replay_id}.nnr"), "wb").close()
+    archive = tmp_path / "archive.jsonl"
+
+    stats = asyncio.run(compact(keep=2, min_age=timedelta(days=30), batch_size=1, archive=str(archive), pause=0, now=NOW))
+
+    assert stats == {"users": 2, "deleted": 2, "batches": 2}
+    assert _remaining() == ["a1", "a2", "a5", "a6", "b1"]
+    assert sorted(json.loads(line)["id"] for line in archive.read_text().splitlines()) == ["a3", "a4"]
+    assert replay_recorder.path_for("a3") is None
+    assert replay_recorder.path_for("a1") is not None
+
+    with_nothing_left = asyncio.run(compact(keep=2, min_age=timedelta(days=30), pause=0, now=NOW))
+    assert with_nothing_left["deleted"] == 0
+
+def test_personal_bests_are_backfilled_when_the_table_is_created():
+    _seed([("a1", "ann", 100, "walls", 3), ("a2", "ann", 300, "walls", 2), ("a3", "ann", 300, "walls", 1), ("b1", "bob", 10, "pass-through", 1)])
+
+    async def run():
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP TABLE personal_bests"))
+        await init_db()
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(select(PersonalBest).order_by(PersonalBest.username))).scalars().all()
+            return [(row.username, row.gameMode, row.entryId, row.score) for row in rows]
+
+    # The earlier of two equal scores ranks first
+    assert asyncio.run(run()) == [("ann", "walls", "a2", 300), ("bob", "pass-through", "b1", 10)]
+
+def test_running_servers_hear_about_deleted_entries():
+    _seed([("a1", "ann", 500, "walls", 90), ("a2", "ann", 400, "walls", 80), ("a3", "ann", 300, "walls", 70)])
+
+    async def run():
+        bus = LocalBus()
+        # A server's cache, loaded before the job runs
+        cache = LeaderboardCache(LocalBroker(bus))
+        await cache.broker.start({"leaderboard": cache.apply_event})
+        async with AsyncSessionLocal() as session:
+            await cache.ensure_loaded(session)
+        job_broker = LocalBroker(bus)
+        await job_broker.start({})
+        stats = await compact(keep=1, min_age=timedelta(days=30), batch_size=1, pause=0, now=NOW, broker=job_broker)
+        await asyncio.sleep(0)
+        return stats, [e.id for e in cache.board("walls", best=False).page(10)]
+
+    stats, served = asyncio.run(run())
+    assert stats["deleted"] == 2
+    assert served == ["a1"]
@@ -21,11 +21,15 @@ def test_full_flow():
     data = response.json()
     assert data["success"] == True
     token = data["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("/api/auth/me", headers=headers)
+    assert response.json()["data"]["username"] == username
     
     # 3. Submit Score
     score = 500
     game_mode = "walls"
-    response = client.post("/api/leaderboard", json={"username": username, "score": score, "gameMode": game_mode})
+    response = client.post("/api/leaderboard", json={"username": username, "score": score, "gameMode": game_mode}, headers=headers)
     assert response.status_code == 200
     data = response.json()
     assert data["success"] == True
@@ -54,7 +58,7 @@ def test_full_flow():
         "gameMode": game_mode,
         "snake": snake,
         "food": food
-    })
+    }, headers=headers)
     assert response.status_code == 200
     assert response.json()["success"] == True
     
@@ -71,3 +75,51 @@ def test_full_flow():
             assert game["score"] == 10
             break
     assert found_game
+
+def test_sqlite_connections_get_the_configured_pragmas():
+    import asyncio
+    from sqlalchemy import text
+    from src.db import engine
+
+    async def pragmas():
+        async with engine.connect() as conn:
+            return [(await conn.execute(text(f"PRAGMA {name}"))).scalar() for name in ("journal_mode", "synchronous", "busy_timeout")]
+
+    # synchronous=NORMAL reads back as 1
+    assert asyncio.run(pragmas()) == ["wal", 1, 5000]
+
+def test_engine_options_per_backend():
+    from src.db import engine_options
+
+    postgres = engine_options("postgresql+asyncpg://user:password@db/nokia_nostalgia")
+    assert postgres["connect_args"] == {"prepared_statement_cache_size": 256}
+    assert postgres["pool_size"] == 5 and postgres["max_overflow"] == 10
+    assert engine_options("sqlite+aiosqlite:///./game.db")["connect_args"] == {"cached_statements": 256}
+    assert "pool_size" not in engine_options("sqlite+aiosqlite:///:memory:")
+
+def test_init_db_skips_create_all_while_the_schema_version_matches():
+    import asyncio
+    from sqlalchemy import update
+    from src.db import engine, init_db, schema_fingerprint
+    from src.tables import SchemaVersion
+
+    async def run():
+        # reset_db leaves no version row, as for a database created before versioning
+        first, second = await init_db(), await init_db()
+        async with engine.begin() as conn:
+            await conn.execute(update(SchemaVersion).values(version="outdated"))
+        return first, second, await init_db()
+
+    assert asyncio.run(run()) == (True, False, True)
+    assert len(schema_fingerprint()) == 16
+
+def test_prewarm_pool_opens_connections_and_returns_them():
+    import asyncio
+    from src.db import engine, prewarm_pool
+
+    async def run():
+        await engine.dispose()
+        opened = await prewarm_pool(3)
+        return opened, engine.pool.checkedin(), engine.pool.checkedout()
+
+    assert asyncio.run(run()) == (3, 3, 0)
@@ -0,0 +1,136 @@
+import random
+import numpy as np
+import pytest
+from src.engine import (
+    get_opposite_direction, is_valid_direction_change, calculate_new_position, check_self_collision,
+    check_food_collision, generate_food_position, create_initial_snake, create_new_head, calculate_speed,
+    get_initial_game_state, process_game_tick, is_within_bounds, calculate_snake_length,
+    GameBatch, DIRECTION_CODES, GRID_SIZE, INITIAL_SPEED, MIN_SPEED, SCORE_PER_FOOD
+)
+from src.models import Position, SnakeSegment
+
+# Mirrors frontend/src/lib/__tests__/gameLogic.test.ts
+
+def test_opposite_directions():
+    assert get_opposite_direction('UP') == 'DOWN'
+    assert get_opposite_direction('DOWN') == 'UP'
+    assert get_opposite_direction('LEFT') == 'RIGHT'
+    assert get_opposite_direction('RIGHT') == 'LEFT'
+
+def test_direction_changes():
+    for current, nxt in [('UP', 'LEFT'), ('UP', 'RIGHT'), ('DOWN', 'LEFT'), ('DOWN', 'RIGHT'),
+                         ('LEFT', 'UP'), ('LEFT', 'DOWN'), ('RIGHT', 'UP'), ('RIGHT', 'DOWN')]:
+        assert is_valid_direction_change(current, nxt)
+    for current, nxt in [('UP', 'DOWN'), ('DOWN', 'UP'), ('LEFT', 'RIGHT'), ('RIGHT', 'LEFT')]:
+        assert not is_valid_direction_change(current, nxt)
+    for d in ('UP', 'DOWN', 'LEFT', 'RIGHT'):
+        assert is_valid_direction_change(d, d)
+
+@pytest.mark.parametrize("direction,expected", [('UP', (10, 9)), ('DOWN', (10, 11)), ('LEFT', (9, 10)), ('RIGHT', (11, 10))])
+def test_moves_in_walls_mode(direction, expected):
+    position, hit_wall = calculate_new_position(Position(x=10, y=10), direction, 20, 'walls')
+    assert (position.x, position.y) == expected
+    assert not hit_wall
+
+@pytest.mark.parametrize("start,direction", [((10, 0), 'UP'), ((10, 19), 'DOWN'), ((0, 10), 'LEFT'), ((19, 10), 'RIGHT')])
+def test_wall_collisions(start, direction):
+    _, hit_wall = calculate_new_position(Position(x=start[0], y=start[1]), direction, 20, 'walls')
+    assert hit_wall
+
+@pytest.mark.parametrize("start,direction,expected", [
+    ((10, 0), 'UP', (10, 19)), ((10, 19), 'DOWN', (10, 0)), ((0, 10), 'LEFT', (19, 10)), ((19, 10), 'RIGHT', (0, 10))
+])
+def test_pass_through_wraps(start, direction, expected):
+    position, hit_wall = calculate_new_position(Position(x=start[0], y=start[1]), direction, 20, 'pass-through')
+    assert (position.x, position.y) == expected
+    assert not hit_wall
+
+def test_bounds():
+    assert all(is_within_bounds(Position(x=x, y=y), 20) for x, y in [(0, 0), (10, 10), (19, 19)])
+    assert not any(is_within_bounds(Position(x=x, y=y), 20) for x, y in [(-1, 0), (0, -1), (20, 0), (0, 20)])
+
+def test_collisions():
+    snake = [Position(x=x, y=5) for x in (5, 4, 3, 2)]
+    assert check_self_collision(Position(x=4, y=5), snake)
+    assert check_self_collision(Position(x=2, y=5), snake)
+    assert not check_self_collision(Position(x=6, y=5), snake)
+    assert check_food_collision(Position(x=10, y=10), Position(x=10, y=10))
+    assert not check_food_collision(Position(x=10, y=10), Position(x=10, y=11))
+
+def test_initial_snake_and_new_head():
+    snake = create_initial_snake(20)
+    assert len(snake) == 3
+    assert (snake[0].x, snake[0].y) == (10, 10)
+    assert snake[0].x > snake[1].x > snake[2].x
+    assert all(a.dotSide != b.dotSide for a, b in zip(snake, snake[1:]))
+    assert create_new_head(Position(x=11, y=10), SnakeSegment(x=10, y=10, dotSide='left')).dotSide == 'right'
+    assert create_new_head(Position(x=11, y=10), SnakeSegment(x=10, y=10, dotSide='right')).dotSide == 'left'
+
+def test_food_never_on_snake():
+    snake = create_initial_snake(20)
+    for _ in range(100):
+        food = generate_food_position(snake, 20)
+        assert is_within_bounds(food, 20)
+        assert not check_self_collision(food, snake)
+
+def test_speed_and_length():
+    assert calculate_speed(0) == INITIAL_SPEED
+    assert calculate_speed(100) < calculate_speed(50) < calculate_speed(0)
+    assert calculate_speed(0) - calculate_speed(50) == 5
+    assert calculate_speed(1000) == MIN_SPEED
+    assert calculate_snake_length(0) == 3
+    assert calculate_snake_length(SCORE_PER_FOOD * 5) == 8
+    assert calculate_snake_length(SCORE_PER_FOOD, 5) == 6
+
+def test_game_ticks():
+    state = get_initial_game_state('walls')
+    assert state.gridSize == GRID_SIZE and state.direction == 'RIGHT' and not state.isPlaying
+    assert process_game_tick(state, 'RIGHT') == state
+
+    playing = state.model_copy(update={"isPlaying": True, "food": Position(x=0, y=0)})
+    assert process_game_tick(playing, 'RIGHT').snake[0].x == 11
+
+    at_wall = [SnakeSegment(x=19, y=10, dotSide='left'), SnakeSegment(x=18, y=10, dotSide='right'), SnakeSegment(x=17, y=10, dotSide='left')]
+    crashed = process_game_tick(playing.model_copy(update={"snake": at_wall}), 'RIGHT')
+    assert crashed.isGameOver and not crashed.isPlaying
+
+    wrapped = process_game_tick(playing.model_copy(update={"snake": at_wall, "gameMode": "pass-through"}), 'RIGHT')
+    assert not wrapped.isGameOver and wrapped.snake[0].x == 0
+
+    fed = process_game_tick(playing.model_copy(update={"food": Position(x=11, y=10)}), 'RIGHT')
+    assert fed.score == SCORE_PER_FOOD
+    assert len(fed.snake) == 4
+    assert fed.food != Position(x=11, y=10)
+
+def test_batch_matches_scalar_engine():
+    rng = random.Random(7)
+    states = []
+    for i in range(200):
+        state = get_initial_game_state('walls' if i % 2 else 'pass-through', rng)
+        states.append(state.model_copy(update={"isPlaying": True}))
+    batch = GameBatch.from_states(states, seed=1)
+
+    for _ in range(150):
+        directions = []
+        for state in states:
+            options = [d for d in ('UP', 'DOWN', 'LEFT', 'RIGHT') if is_valid_direction_change(state.direction, d)]
+            directions.append(rng.choice(options))
+        states = [process_game_tick(s, d, rng) for s, d in zip(states, directions)]
+        ate, died = batch.step(np.array([DIRECTION_CODES[d] for d in directions]))
+
+        for i, state in enumerate(states):
+            # Food spawns are random, so adopt the scalar engine's choice before comparing
+            if ate[i]:
+                batch.food[i] = state.food.y * GRID_SIZE + state.food.x
+            assert batch.alive[i] == (not state.isGameOver)
+            assert batch.score[i] == state.score
+            if not state.isGameOver:
+                assert batch.snake(i) == state.snake
+
+def test_batch_food_respawns_off_snake():
+    states = [get_initial_game_state('walls').model_copy(update={"isPlaying": True, "food": Position(x=11, y=10)}) for _ in range(50)]
+    batch = GameBatch.from_states(states, seed=3)
+    ate, died = batch.step()
+    assert ate.all() and not died.any()
+    assert (batch.length == 4).all()
+    assert (batch.occupancy[np.arange(50), batch.food] == 0).all()
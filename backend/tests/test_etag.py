@@ -0,0 +1,70 @@
+from fastapi.testclient import TestClient
+from src.main import app
+from src.routers import leaderboard, spectate
+from src.live import hub as live_hub
+from src.models import SnakeSegment, Position
+
+client = TestClient(app)
+
+def _snake(x, length=2):
+    return [SnakeSegment(x=x - i, y=10, dotSide="left" if i % 2 == 0 else "right") for i in range(length)]
+
+def test_leaderboard_not_modified_until_its_mode_changes(auth_headers, monkeypatch):
+    first = client.get("/api/leaderboard?gameMode=walls")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    async def fail(*args, **kwargs):
+        raise AssertionError("304 must be answered without reading the leaderboard")
+    monkeypatch.setattr(leaderboard, "get_leaderboard", fail)
+    response = client.get("/api/leaderboard?gameMode=walls", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    monkeypatch.undo()
+
+    all_modes = client.get("/api/leaderboard").headers["etag"]
+    client.post("/api/leaderboard", json={"username": "Other", "score": 5, "gameMode": "pass-through"}, headers=auth_headers("Other"))
+    assert client.get("/api/leaderboard?gameMode=walls", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/leaderboard", headers={"If-None-Match": all_modes}).status_code == 200
+
+    client.post("/api/leaderboard", json={"username": "Other", "score": 7, "gameMode": "walls"}, headers=auth_headers("Other"))
+    response = client.get("/api/leaderboard?gameMode=walls", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+def test_game_state_etag_follows_game_version():
+    client.get("/api/spectate/active")
+    game = live_hub.upsert("Player", 10, "walls", _snake(5), Position(x=1, y=1))
+    etag = client.get(f"/api/spectate/{game.id}").headers["etag"]
+    assert client.get(f"/api/spectate/{game.id}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/api/spectate/{game.id}", headers={"If-None-Match": f"W/{etag}"}).status_code == 200
+
+    live_hub.upsert("Player", 10, "walls", _snake(6), Position(x=1, y=1))
+    response = client.get(f"/api/spectate/{game.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["data"]["snake"][0]["x"] == 6
+
+def test_active_summary_etag_ignores_moves(monkeypatch):
+    client.get("/api/spectate/active")
+    game = live_hub.upsert("Mover", 10, "walls", _snake(5), Position(x=1, y=1))
+    summary = client.get("/api/spectate/active").headers["etag"]
+    full = client.get("/api/spectate/active?view=full").headers["etag"]
+
+    # Moving without growing leaves every summary field as it was
+    live_hub.upsert("Mover", 10, "walls", _snake(6), Position(x=1, y=1))
+    assert client.get("/api/spectate/active", headers={"If-None-Match": summary}).status_code == 304
+    assert client.get("/api/spectate/active?view=full", headers={"If-None-Match": full}).status_code == 200
+
+    subscription = live_hub.subscribe(game.id)
+    assert client.get("/api/spectate/active", headers={"If-None-Match": summary}).status_code == 200
+    live_hub.unsubscribe(subscription)
+
+def test_fast_path_responses_are_tagged(monkeypatch):
+    monkeypatch.setattr(spectate, "FAST_JSON_RESPONSES", True)
+    monkeypatch.setattr(leaderboard, "FAST_JSON_RESPONSES", True)
+    client.get("/api/spectate/active")
+    game = live_hub.upsert("Fast", 10, "walls", _snake(5), Position(x=1, y=1))
+    for url in ("/api/leaderboard", "/api/spectate/active", f"/api/spectate/{game.id}"):
+        etag = client.get(url).headers["etag"]
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,77 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import select, insert
+from src.main import app
+from src.db import AsyncSessionLocal, reset_db
+from src.tables import LeaderboardEntry, PersonalBest
+from src.export import export_chunks, read_records, import_records
+
+client = TestClient(app)
+BASE = datetime(2024, 3, 1, 12)
+
+def _seed(count):
+    async def run():
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(LeaderboardEntry).values([
+                {"id": f"e{i:03}", "username": f"p{i % 3}", "score": i * 10, "gameMode": "walls" if i % 2 else "pass-through", "date": BASE + timedelta(days=i)}
+                for i in range(count)
+            ]))
+            await session.commit()
+    asyncio.run(run())
+
+def _collect(fmt, **filters):
+    async def run():
+        return [chunk async for chunk in export_chunks(fmt, **filters)]
+    return asyncio.run(run())
+
+def test_export_streams_one_chunk_per_batch():
+    _seed(5)
+    chunks = _collect("ndjson", batch_size=2)
+    assert len(chunks) == 3
+    rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert [row["id"] for row in rows] == ["e004", "e003", "e002", "e001", "e000"]
+    assert rows[0] == {"id": "e004", "username": "p1", "score": 40, "gameMode": "pass-through", "date": "2024-03-05T12:00:00"}
+
+def test_export_endpoint_filters_and_formats(auth_headers):
+    _seed(6)
+    assert client.get("/api/leaderboard/export").status_code == 401
+
+    response = client.get("/api/leaderboard/export?format=csv&gameMode=walls&since=2024-03-03&until=2024-03-06T12:00:00", headers=auth_headers("analyst"))
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    assert response.headers["content-disposition"] == 'attachment; filename="leaderboard.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["id"], row["score"], row["date"]) for row in rows] == [("e003", "30", "2024-03-04T12:00:00")]
+
+    response = client.get("/api/leaderboard/export?gameMode=walls", headers=auth_headers("analyst"))
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == ["e005", "e003", "e001"]
+
+def test_import_restores_an_export(tmp_path):
+    _seed(7)
+    for fmt in ("ndjson", "csv"):
+        path = tmp_path / f"leaderboard.{fmt}"
+        path.write_bytes(b"".join(_collect(fmt)))
+
+        async def restore():
+            await reset_db()
+            with open(path, newline="") as f:
+                inserted = await import_records(read_records(f, fmt), batch_size=3)
+            # Rows already present are skipped
+            with open(path, newline="") as f:
+                again = await import_records(read_records(f, fmt), batch_size=3)
+            async with AsyncSessionLocal() as session:
+                entries = (await session.execute(select(LeaderboardEntry.id, LeaderboardEntry.date).order_by(LeaderboardEntry.id))).all()
+                bests = (await session.execute(select(PersonalBest.username, PersonalBest.gameMode, PersonalBest.score).order_by(PersonalBest.username, PersonalBest.gameMode))).all()
+            return inserted, again, entries, bests
+
+        inserted, again, entries, bests = asyncio.run(restore())
+        assert (inserted, again) == (7, 0)
+        assert entries == [(f"e{i:03}", BASE + timedelta(days=i)) for i in range(7)]
+        assert [tuple(b) for b in bests] == [
+            ("p0", "pass-through", 60), ("p0", "walls", 30), ("p1", "pass-through", 40),
+            ("p1", "walls", 10), ("p2", "pass-through", 20), ("p2", "walls", 50),
+        ]
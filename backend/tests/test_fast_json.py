@@ -0,0 +1,118 @@
+import os
+from datetime import datetime
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+from src.main import app
+from src.routers import spectate, leaderboard
+from src import fastjson
+from src.live import hub as live_hub
+from src.models import SnakeSegment, Position
+
+client = TestClient(app)
+
+OPENAPI_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "openapi.yaml")
+
+with open(OPENAPI_PATH) as f:
+    OPENAPI = yaml.safe_load(f)
+
+def _resolve(schema):
+    while "$ref" in schema:
+        node = OPENAPI
+        for part in schema["$ref"].lstrip("#/").split("/"):
+            node = node[part]
+        schema = {**node, **{k: v for k, v in schema.items() if k != "$ref"}}
+    return schema
+
+def assert_matches(value, schema, path="$"):
+    """Check a decoded JSON value against the subset of OpenAPI schema keywords openapi.yaml uses."""
+    schema = _resolve(schema)
+    if value is None:
+        assert schema.get("nullable"), f"{path} is null"
+        return
+    for part in schema.get("allOf", ()):
+        assert_matches(value, part, path)
+    kind = schema.get("type")
+    if kind == "object":
+        assert isinstance(value, dict), path
+        for name in schema.get("required", ()):
+            assert name in value, f"{path}.{name} missing"
+        for name, sub in schema.get("properties", {}).items():
+            if name in value:
+                assert_matches(value[name], sub, f"{path}.{name}")
+    elif kind == "array":
+        assert isinstance(value, list), path
+        for i, item in enumerate(value):
+            assert_matches(item, schema["items"], f"{path}[{i}]")
+    elif kind == "number":
+        assert isinstance(value, (int, float)) and not isinstance(value, bool), path
+    elif kind == "string":
+        assert isinstance(value, str), path
+        if schema.get("format") == "date-time":
+            datetime.fromisoformat(value)
+    elif kind == "boolean":
+        assert isinstance(value, bool), path
+    if "enum" in schema:
+        assert value in schema["enum"], path
+
+def _response_schema(route):
+    return OPENAPI["paths"][route]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+
+def _both_paths(monkeypatch, url):
+    monkeypatch.setattr(spectate, "FAST_JSON_RESPONSES", False)
+    monkeypatch.setattr(leaderboard, "FAST_JSON_RESPONSES", False)
+    slow = client.get(url)
+    monkeypatch.setattr(spectate, "FAST_JSON_RESPONSES", True)
+    monkeypatch.setattr(leaderboard, "FAST_JSON_RESPONSES", True)
+    fast = client.get(url)
+    assert fast.status_code == slow.status_code == 200
+    assert fast.headers["content-type"] == slow.headers["content-type"]
+    return slow.content, fast.content
+
+def _seed_games():
+    live_hub.upsert("Ünïcode 🐍", 30, "walls", [SnakeSegment(x=3, y=4, dotSide="left"), SnakeSegment(x=2, y=4, dotSide="right")], Position(x=7, y=1))
+    live_hub.upsert("Plain", 0, "pass-through", [SnakeSegment(x=10, y=10, dotSide="left")], Position(x=0, y=19))
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(fastjson, "orjson", None)
+    elif fastjson.orjson is None:
+        pytest.skip("orjson not installed")
+    return request.param
+
+def test_active_games_parity(monkeypatch, encoder):
+    _seed_games()
+    for url in ("/api/spectate/active", "/api/spectate/active?limit=1", "/api/spectate/active?sort=recent"):
+        slow, fast = _both_paths(monkeypatch, url)
+        assert fast == slow
+        assert_matches(client.get(url).json(), _response_schema("/spectate/active"))
+
+    slow, fast = _both_paths(monkeypatch, "/api/spectate/active?view=full")
+    assert fast == slow
+    body = client.get("/api/spectate/active?view=full").json()
+    for game in body["data"]:
+        assert_matches(game, {"$ref": "#/components/schemas/ActiveGame"})
+
+def test_game_state_parity(monkeypatch, encoder):
+    _seed_games()
+    for game in live_hub.games():
+        slow, fast = _both_paths(monkeypatch, f"/api/spectate/{game.id}")
+        assert fast == slow
+        assert_matches(client.get(f"/api/spectate/{game.id}").json(), _response_schema("/spectate/{gameId}"))
+    slow, fast = _both_paths(monkeypatch, "/api/spectate/missing")
+    assert fast == slow
+
+def test_leaderboard_parity(monkeypatch, encoder, auth_headers):
+    for name, score in (("Ünïcode 🐍", 40), ("Plain", 40), ("Third", 10)):
+        client.post("/api/leaderboard", headers=auth_headers(name), json={"username": name, "score": score, "gameMode": "walls"})
+    for url in ("/api/leaderboard", "/api/leaderboard?limit=2", "/api/leaderboard?gameMode=pass-through"):
+        slow, fast = _both_paths(monkeypatch, url)
+        assert fast == slow
+        assert_matches(client.get(url).json(), _response_schema("/leaderboard"))
+
+def test_fallback_encoder_matches_orjson():
+    if fastjson.orjson is None:
+        pytest.skip("orjson not installed")
+    document = {"date": datetime(2024, 5, 1, 12, 30, 5, 120), "name": "Ünïcode 🐍", "none": None, "n": [1, 2]}
+    assert fastjson.orjson.dumps(document) == fastjson.json.dumps(document, ensure_ascii=False, separators=(",", ":"), default=fastjson._default).encode()
@@ -0,0 +1,245 @@
+import asyncio
+from sqlalchemy import select
+from src.db import AsyncSessionLocal, init_db
+from src.tables import ActiveGame
+from src.live import LiveGameHub
+from src.models import SnakeSegment, Position
+from src.protocol import decode_game_state, encode_game_state, PACKED_COMPACT, PACKED_WIDE
+
+def _snake(x):
+    return [SnakeSegment(x=x, y=10, dotSide="left"), SnakeSegment(x=x - 1, y=10, dotSide="right")]
+
+def test_updates_stay_in_memory_until_flush():
+    hub = LiveGameHub()
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            await hub.ensure_loaded(session)
+            hub.upsert("Ticker", 10, "walls", _snake(5), Position(x=1, y=1))
+            game = hub.upsert("Ticker", 20, "walls", _snake(6), Position(x=2, y=2))
+
+            rows = (await session.execute(select(ActiveGame))).scalars().all()
+            assert rows == []
+
+            assert await hub.flush(session) == 1
+            assert await hub.flush(session) == 0
+
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(select(ActiveGame))).scalar_one()
+            assert row.id == game.id
+            assert row.score == 20
+            snake, food = decode_game_state(row.state)
+            assert snake == _snake(6)
+            assert food == Position(x=2, y=2)
+            assert row.snake is None and row.food is None
+
+    asyncio.run(run())
+
+def test_packed_game_state_round_trip():
+    snake = [SnakeSegment(x=x, y=19, dotSide="left" if x % 2 else "right") for x in range(20)]
+    packed = encode_game_state(snake, Position(x=0, y=19))
+    assert packed[0] == PACKED_COMPACT
+    assert len(packed) == 1 + 2 * 21
+    assert decode_game_state(packed) == (snake, Position(x=0, y=19))
+
+    # Off-grid coordinates still round-trip through the wide layout
+    odd = [SnakeSegment(x=-1, y=40, dotSide="right")]
+    packed = encode_game_state(odd, Position(x=300, y=-2))
+    assert packed[0] == PACKED_WIDE
+    assert decode_game_state(packed) == (odd, Position(x=300, y=-2))
+
+def test_init_db_migrates_json_game_rows():
+    async def run():
+        async with AsyncSessionLocal() as session:
+            session.add(ActiveGame(
+                id="legacy", username="Old", score=30, gameMode="walls",
+                snake=[{"x": 4, "y": 4, "dotSide": "left"}, {"x": 3, "y": 4, "dotSide": "right"}],
+                food={"x": 1, "y": 2}
+            ))
+            await session.commit()
+
+        await init_db()
+
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(select(ActiveGame))).scalar_one()
+            assert row.snake is None and row.food is None
+            snake, food = decode_game_state(row.state)
+            assert snake == [SnakeSegment(x=4, y=4, dotSide="left"), SnakeSegment(x=3, y=4, dotSide="right")]
+            assert food == Position(x=1, y=2)
+
+            hub = LiveGameHub()
+            await hub.ensure_loaded(session)
+            assert hub.get("legacy").snake == snake
+
+    asyncio.run(run())
+
+def test_hydrated_game_keeps_its_id(seed_db_sync):
+    hub = LiveGameHub()
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            await hub.ensure_loaded(session)
+            assert hub.get("game1").score == 45
+            game = hub.upsert("SnakeMaster", 50, "walls", _snake(11), Position(x=3, y=3))
+            assert game.id == "game1"
+            await hub.flush(session)
+
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(select(ActiveGame))).scalars().all()
+            assert [(r.id, r.score) for r in rows] == [("game1", 50)]
+
+    asyncio.run(run())
+
+def test_subscribers_share_one_frame_and_skip_ahead():
+    hub = LiveGameHub()
+
+    async def run():
+        game = hub.upsert("Viewer", 0, "walls", _snake(5), Position(x=1, y=1))
+        fast = hub.subscribe(game.id)
+        slow = hub.subscribe(game.id)
+        assert hub.viewer_count(game.id) == 2
+        assert (await fast.next()).text == (await slow.next()).text
+
+        for score in (10, 20, 30):
+            hub.upsert("Viewer", score, "walls", _snake(5), Position(x=1, y=1))
+            fast_frame = await fast.next()
+
+        # The slow subscriber never read the intermediate states and only sees the newest one
+        slow_frame = await slow.next()
+        assert slow_frame is fast_frame
+        assert '"score":30' in slow_frame.text
+        assert slow_frame.sse == b"data: " + slow_frame.text.encode() + b"\n\n"
+
+        hub.unsubscribe(fast)
+        hub.unsubscribe(slow)
+        assert hub.viewer_count(game.id) == 0
+
+    asyncio.run(run())
+
+def test_apply_delta_moves_snake_and_rejects_gaps():
+    hub = LiveGameHub()
+    game = hub.upsert("Delta", 0, "walls", _snake(5), Position(x=1, y=1), seq=10)
+
+    head = SnakeSegment(x=6, y=10, dotSide="right")
+    assert hub.apply_delta("Delta", 11, [head], 1, None, None) is game
+    assert [s.x for s in game.snake] == [6, 5]
+
+    # Eating: the head grows without popping the tail
+    hub.apply_delta("Delta", 12, [SnakeSegment(x=7, y=10, dotSide="left")], 0, Position(x=9, y=9), 10)
+    assert [s.x for s in game.snake] == [7, 6, 5]
+    assert game.score == 10 and game.food.x == 9
+
+    assert hub.apply_delta("Delta", 14, [], 0, None, None) is None
+    assert hub.apply_delta("Nobody", 1, [], 0, None, None) is None
+    assert game.seq == 12
+
+    assert [f.text for f in hub.frames_since(game.id, 11)] == [
+        '{"q":12,"h":[[7,10,0]],"p":0,"f":[9,9],"s":10}'
+    ]
+    assert hub.frames_since(game.id, 12) == []
+    # Deltas from before the last keyframe are not retained
+    assert hub.frames_since(game.id, 9) is None
+    assert game.keyframe().text == '{"q":12,"s":10,"m":"walls","k":[[7,10,0],[6,10,1],[5,10,0]],"f":[9,9]}'
+
+def test_delta_subscriber_resyncs_after_falling_behind(monkeypatch):
+    monkeypatch.setattr("src.live.SPECTATOR_DELTA_BUFFER", 2)
+    hub = LiveGameHub()
+
+    async def run():
+        game = hub.upsert("Lagger", 0, "walls", _snake(5), Position(x=1, y=1))
+        subscription = hub.subscribe(game.id, delta=True)
+        assert (await subscription.next()).text == game.keyframe().text
+
+        hub.apply_delta("Lagger", 2, [SnakeSegment(x=6, y=10, dotSide="right")], 1, None, None)
+        assert '"q":2' in (await subscription.next()).text
+
+        for seq in range(3, 7):
+            hub.apply_delta("Lagger", seq, [SnakeSegment(x=seq + 4, y=10, dotSide="left")], 1, None, None)
+        frame = await subscription.next()
+        assert frame.text == game.keyframe().text
+        assert '"q":6' in frame.text
+
+    asyncio.run(run())
+
+def test_sweeper_expires_idle_games():
+    hub = LiveGameHub()
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            await hub.ensure_loaded(session)
+            idle = hub.upsert("Idle", 10, "walls", _snake(5), Position(x=1, y=1))
+            busy = hub.upsert("Busy", 10, "walls", _snake(5), Position(x=1, y=1))
+            await hub.flush(session)
+            watcher = hub.subscribe(idle.id)
+            delta_watcher = hub.subscribe(idle.id, delta=True)
+            await watcher.next()
+
+            idle.updated_at -= 60
+            assert hub.sweep(30) == [idle.id]
+            assert hub.get(idle.id) is None and hub.get(busy.id) is not None
+            assert hub.get_live_by_username("Idle") is None
+            assert await watcher.next() is None
+            assert await delta_watcher.next() is None
+            assert hub.viewer_count(idle.id) == 0
+
+            assert await hub.flush(session) == 1
+            rows = (await session.execute(select(ActiveGame))).scalars().all()
+            assert [r.id for r in rows] == [busy.id]
+
+        # The persisted timestamp survives a restart
+        restarted = LiveGameHub()
+        async with AsyncSessionLocal() as session:
+            await restarted.ensure_loaded(session)
+        assert abs(restarted.get_live(busy.id).updated_at - busy.updated_at) < 1
+
+    asyncio.run(run())
+
+def test_page_orders_and_filters_games():
+    hub = LiveGameHub()
+
+    async def run():
+        quiet = hub.upsert("Quiet", 100, "walls", _snake(5), Position(x=1, y=1))
+        watched = hub.upsert("Watched", 10, "pass-through", _snake(5), Position(x=1, y=1))
+        hub.subscribe(watched.id)
+        assert [g.id for g in hub.page("score")] == [quiet.id, watched.id]
+        assert [g.id for g in hub.page("viewers")] == [watched.id, quiet.id]
+        assert [g.id for g in hub.page("score", game_mode="pass-through")] == [watched.id]
+        assert [g.id for g in hub.page("score", limit=5, after=(100, quiet.id))] == [watched.id]
+
+    asyncio.run(run())
+
+def test_flush_skips_a_game_that_cannot_be_stored():
+    hub = LiveGameHub()
+    # Bypasses validation, as a game decoded before coordinates were bounded would
+    far = [SnakeSegment.model_construct(x=40000, y=10, dotSide="left")]
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            await hub.ensure_loaded(session)
+            good = hub.upsert("Good", 10, "walls", _snake(5), Position(x=1, y=1))
+            hub.upsert("Far", 10, "walls", far, Position(x=1, y=1))
+            assert await hub.flush(session) == 1
+            assert hub.stats()["pendingWrites"] == 0
+            rows = (await session.execute(select(ActiveGame))).scalars().all()
+            assert [r.id for r in rows] == [good.id]
+
+    asyncio.run(run())
+
+def test_out_of_range_coordinates_are_rejected(auth_headers):
+    from fastapi.testclient import TestClient
+    from src.main import app
+
+    client = TestClient(app)
+    headers = auth_headers("Far")
+    snake = [{"x": 40000, "y": 10, "dotSide": "left"}]
+    response = client.post("/api/spectate/update", headers=headers, json={
+        "username": "Far", "score": 0, "gameMode": "walls", "snake": snake, "food": {"x": 1, "y": 1}
+    })
+    assert response.status_code == 422
+    response = client.post("/api/spectate/delta", headers=headers, json={"username": "Far", "q": 1, "h": [[40000, 10, 0]]})
+    assert response.status_code == 422
+    # Positions just outside the grid, like a head that hit the wall, are still accepted
+    response = client.post("/api/spectate/update", headers=headers, json={
+        "username": "Far", "score": 0, "gameMode": "walls", "snake": [{"x": -1, "y": 10, "dotSide": "left"}], "food": {"x": 1, "y": 1}
+    })
+    assert response.status_code == 200
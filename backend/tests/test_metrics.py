@@ -0,0 +1,68 @@
+import re
+from fastapi.testclient import TestClient
+from src.main import app
+from src.metrics import Histogram, http_request_duration, db_queries_per_request
+from src.live import hub as live_hub
+from src.models import SnakeSegment, Position
+
+client = TestClient(app)
+
+def _sample(text, line_start):
+    for line in text.splitlines():
+        if line.startswith(line_start + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+def test_histogram_exposition():
+    histogram = Histogram("demo_seconds", "Demo.", (0.1, 1.0), ("route",))
+    for value in (0.05, 0.5, 3):
+        histogram.observe(value, '/a"b')
+    assert histogram.render().splitlines() == [
+        "# HELP demo_seconds Demo.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'demo_seconds_bucket{route="/a\\"b",le="1"} 2',
+        'demo_seconds_bucket{route="/a\\"b",le="+Inf"} 3',
+        'demo_seconds_sum{route="/a\\"b"} 3.55',
+        'demo_seconds_count{route="/a\\"b"} 3',
+    ]
+
+def test_requests_are_timed_by_route_template(seed_db_sync):
+    before = http_request_duration.count("GET", "/api/spectate/{game_id}", "200")
+    queries_before = db_queries_per_request.count("/api/auth/me")
+    client.get("/api/spectate/active")
+    game_id = live_hub.games()[0].id
+    client.get(f"/api/spectate/{game_id}")
+    assert http_request_duration.count("GET", "/api/spectate/{game_id}", "200") == before + 1
+
+    client.post("/api/auth/login", json={"email": "snake@game.com", "password": "password123"})
+    text = client.get("/api/metrics").text
+    assert re.search(r'^http_request_duration_seconds_count\{method="POST",route="/api/auth/login",status="200"\} \d+$', text, re.M)
+    assert _sample(text, 'db_query_duration_seconds_count{statement="SELECT"}') >= 1
+    assert "db_pool_checkout_wait_seconds_count" in text
+    # The scrape itself is still in flight
+    assert _sample(text, "http_requests_in_flight") == 1
+
+def test_queries_are_counted_per_request(seed_db_sync, auth_headers):
+    zero_bucket = 'db_queries_per_request_bucket{route="/api/leaderboard",le="0"}'
+    count = 'db_queries_per_request_count{route="/api/leaderboard"}'
+    before = client.get("/api/metrics").text
+    client.post("/api/leaderboard", json={"username": "PyPlayer", "score": 40, "gameMode": "walls"}, headers=auth_headers("PyPlayer"))
+    after = client.get("/api/metrics").text
+    # The score insert ran inside the request, so it was not counted as a request without statements
+    assert (_sample(after, count) or 0) == (_sample(before, count) or 0) + 1
+    assert (_sample(after, zero_bucket) or 0) == (_sample(before, zero_bucket) or 0)
+
+def test_live_gauges():
+    client.get("/api/spectate/active")
+    game = live_hub.upsert("Gauge", 10, "walls", [SnakeSegment(x=5, y=5, dotSide="left")], Position(x=1, y=1))
+    live_hub.subscribe(game.id)
+    text = client.get("/api/metrics").text
+    assert _sample(text, "live_games") == len(live_hub.games())
+    assert _sample(text, "live_spectators") == 1
+
+def test_broker_totals_are_counters():
+    text = client.get("/api/metrics").text
+    for name in ("live_broker_published_total", "live_broker_received_total", "live_broker_dropped_total"):
+        assert f"# TYPE {name} counter" in text
+        assert _sample(text, name) == 0
@@ -0,0 +1,176 @@
+import asyncio
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from src.main import app
+from src.db import AsyncSessionLocal
+import src.database
+from src.database import delete_leaderboard_entry, get_leaderboard
+from src.models import LeaderboardEntry
+from src.tables import LeaderboardEntry as LeaderboardEntryRow
+from src.ranking import RankedBoard, LeaderboardCache, leaderboard_cache, window_start
+
+client = TestClient(app)
+BASE = datetime(2024, 1, 1)
+
+def _entry(id, username, score, minutes=0, mode="walls"):
+    return LeaderboardEntry(id=id, username=username, score=score, gameMode=mode, date=BASE + timedelta(minutes=minutes))
+
+def test_ranked_board_orders_and_ranks():
+    board = RankedBoard()
+    board.add(_entry("a", "ann", 100))
+    board.add(_entry("b", "bob", 300))
+    board.add(_entry("c", "cat", 100, minutes=-1))
+    board.add(_entry("d", "ann", 200))
+
+    assert [e.id for e in board.page(10)] == ["b", "d", "c", "a"]
+    assert [e.id for e in board.page(2, after=(200, BASE, "d"))] == ["c", "a"]
+
+    rank, best = board.rank_of("ann")
+    assert (rank, best.id) == (2, "d")
+    assert [(r, e.id) for r, e in board.around(rank, 1)] == [(1, "b"), (2, "d"), (3, "c")]
+    assert board.rank_of("nobody") is None
+
+    assert board.remove("d")
+    assert not board.remove("d")
+    assert board.rank_of("ann")[0] == 3
+    assert len(board) == 3
+
+def test_rank_endpoint(seed_db_sync, auth_headers):
+    before = leaderboard_cache.stats()
+    client.get("/api/leaderboard")
+    client.post("/api/leaderboard", json={"username": "PyPlayer", "score": 300, "gameMode": "walls"}, headers=auth_headers("PyPlayer"))
+
+    data = client.get("/api/leaderboard/rank/SnakeMaster?gameMode=walls&around=1").json()["data"]
+    assert data["rank"] == 2
+    assert [(e["rank"], e["entry"]["username"]) for e in data["entries"]] == [(1, "PyPlayer"), (2, "SnakeMaster")]
+    # The first read loaded the table, the rank read was answered from memory
+    assert [data["cache"][k] - before[k] for k in ("misses", "hits", "databaseReads")] == [1, 1, 0]
+
+    response = client.get("/api/leaderboard/rank/Nobody").json()
+    assert response == {"success": False, "data": None, "error": "No scores for user"}
+
+def test_delete_keeps_cache_consistent(seed_db_sync):
+    async def run():
+        async with AsyncSessionLocal() as session:
+            assert [e.id for e in await get_leaderboard(session, "walls")] == ["1"]
+            assert leaderboard_cache.loaded
+            assert await delete_leaderboard_entry(session, "1")
+            assert await get_leaderboard(session, "walls") == []
+            assert leaderboard_cache.board(None).rank_of("SnakeMaster") is None
+
+            # A reload from the table agrees with the incrementally maintained cache
+            leaderboard_cache.invalidate()
+            assert await get_leaderboard(session, "walls") == []
+
+    asyncio.run(run())
+
+def test_window_starts():
+    now = datetime(2024, 5, 16, 13, 45)  # a Thursday
+    assert window_start("daily", now) == datetime(2024, 5, 16)
+    assert window_start("weekly", now) == datetime(2024, 5, 13)
+    assert window_start("monthly", now) == datetime(2024, 5, 1)
+
+def test_windowed_boards_roll_over():
+    now = [datetime(2024, 5, 16, 23, 59)]
+    cache = LeaderboardCache(clock=lambda: now[0])
+
+    async def load():
+        async with AsyncSessionLocal() as session:
+            await cache.ensure_loaded(session)
+    asyncio.run(load())
+
+    cache.add(LeaderboardEntry(id="old", username="ann", score=500, gameMode="walls", date=datetime(2024, 5, 1, 8)))
+    cache.add(LeaderboardEntry(id="d1", username="bob", score=100, gameMode="walls", date=datetime(2024, 5, 16, 10)))
+    version = cache.version("walls", "daily")
+    assert [e.id for e in cache.board(None, "daily").page(10)] == ["d1"]
+    assert [e.id for e in cache.board("walls", "monthly").page(10)] == ["old", "d1"]
+
+    now[0] = datetime(2024, 5, 17, 0, 1)
+    assert cache.version("walls", "daily") != version
+    assert cache.board(None, "daily").page(10) == []
+    cache.add(LeaderboardEntry(id="d2", username="cat", score=50, gameMode="pass-through", date=now[0]))
+    assert [e.id for e in cache.board(None, "daily").page(10)] == ["d2"]
+    assert [e.id for e in cache.board(None, "weekly").page(10)] == ["d1", "d2"]
+    assert [e.id for e in cache.board(None).page(10)] == ["old", "d1", "d2"]
+
+    cache.remove("d1")
+    assert [e.id for e in cache.board(None, "weekly").page(10)] == ["d2"]
+
+def test_windowed_leaderboard_endpoint(seed_db_sync, auth_headers):
+    async def add_old_entry():
+        async with AsyncSessionLocal() as session:
+            session.add(LeaderboardEntryRow(id="old", username="Veteran", score=999, gameMode="walls", date=datetime(2000, 1, 1)))
+            await session.commit()
+    asyncio.run(add_old_entry())
+    client.post("/api/leaderboard", json={"username": "PyPlayer", "score": 300, "gameMode": "walls"}, headers=auth_headers("PyPlayer"))
+
+    for window in ("daily", "weekly", "monthly"):
+        data = client.get(f"/api/leaderboard?window={window}&gameMode=walls").json()["data"]
+        assert [(e["username"], e["score"]) for e in data] == [("PyPlayer", 300), ("SnakeMaster", 250)]
+    assert client.get("/api/leaderboard?window=all&gameMode=walls").json()["data"][0]["username"] == "Veteran"
+
+    rank = client.get("/api/leaderboard/rank/SnakeMaster?window=daily").json()["data"]["rank"]
+    assert rank == 2
+    assert client.get("/api/leaderboard?window=yearly").status_code == 422
+
+def test_default_view_ranks_each_users_best(seed_db_sync, auth_headers, monkeypatch):
+    for score in (300, 100):
+        client.post("/api/leaderboard", json={"username": "PyPlayer", "score": score, "gameMode": "walls"}, headers=auth_headers("PyPlayer"))
+
+    def board(url):
+        return [(e["username"], e["score"]) for e in client.get(url).json()["data"]]
+
+    assert board("/api/leaderboard?gameMode=walls") == [("PyPlayer", 300), ("SnakeMaster", 250)]
+    assert board("/api/leaderboard?gameMode=walls&view=all") == [("PyPlayer", 300), ("SnakeMaster", 250), ("PyPlayer", 100)]
+    assert board("/api/leaderboard?gameMode=walls&window=daily") == [("PyPlayer", 300), ("SnakeMaster", 250)]
+    assert client.get("/api/leaderboard/rank/PyPlayer?gameMode=walls&view=all&around=2").json()["data"]["entries"][-1]["entry"]["score"] == 100
+
+    # Deleting a best entry promotes the user's next best, in the cache and in personal_bests
+    best_id = client.get("/api/leaderboard?gameMode=walls").json()["data"][0]["id"]
+    async def delete_best():
+        async with AsyncSessionLocal() as session:
+            assert await delete_leaderboard_entry(session, best_id)
+    asyncio.run(delete_best())
+    assert board("/api/leaderboard?gameMode=walls") == [("SnakeMaster", 250), ("PyPlayer", 100)]
+
+    # Without the cache, the same views come from personal_bests and window queries
+    monkeypatch.setattr(src.database, "LEADERBOARD_CACHE_ENABLED", False)
+    client.post("/api/leaderboard", json={"username": "PyPlayer", "score": 400, "gameMode": "walls"}, headers=auth_headers("PyPlayer"))
+    client.post("/api/leaderboard", json={"username": "PyPlayer", "score": 350, "gameMode": "walls"}, headers=auth_headers("PyPlayer"))
+    assert board("/api/leaderboard?gameMode=walls&view=all") == [("PyPlayer", 400), ("PyPlayer", 350), ("SnakeMaster", 250), ("PyPlayer", 100)]
+    assert board("/api/leaderboard?gameMode=walls&window=weekly") == [("PyPlayer", 400), ("SnakeMaster", 250)]
+    assert board("/api/leaderboard?gameMode=walls&limit=1") == [("PyPlayer", 400)]
+    cursor = client.get("/api/leaderboard?gameMode=walls&limit=1").json()["nextCursor"]
+    assert board(f"/api/leaderboard?gameMode=walls&limit=1&cursor={cursor}") == [("SnakeMaster", 250)]
+
+def test_rank_without_the_cache(seed_db_sync, auth_headers, monkeypatch):
+    for score in (300, 50):
+        client.post("/api/leaderboard", json={"username": "PyPlayer", "score": score, "gameMode": "walls"}, headers=auth_headers("PyPlayer"))
+    urls = ["/api/leaderboard/rank/SnakeMaster?gameMode=walls&around=1", "/api/leaderboard/rank/PyPlayer?view=all&around=2",
+            "/api/leaderboard/rank/SnakeMaster?window=weekly", "/api/leaderboard/rank/Nobody"]
+    cached = [client.get(url).json()["data"] for url in urls]
+
+    monkeypatch.setattr(src.database, "LEADERBOARD_CACHE_ENABLED", False)
+    leaderboard_cache.invalidate()
+    database_reads = leaderboard_cache.stats()["databaseReads"]
+    uncached = [client.get(url).json()["data"] for url in urls]
+    assert [{k: v for k, v in (d or {}).items() if k != "cache"} for d in uncached] == [{k: v for k, v in (d or {}).items() if k != "cache"} for d in cached]
+    assert not leaderboard_cache.loaded
+    assert leaderboard_cache.stats()["databaseReads"] - database_reads == 4
+
+def test_changes_during_a_load_are_not_lost(seed_db_sync):
+    cache = LeaderboardCache()
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            load = asyncio.create_task(cache.ensure_loaded(session))
+            await asyncio.sleep(0)
+            assert not cache.loaded
+            # Made after the load started reading; the table snapshot may or may not include them
+            cache.add(_entry("late", "Late", 999))
+            cache.remove("2")
+            await load
+        assert [e.id for e in cache.board(None).page(10)] == ["late", "1"]
+
+    asyncio.run(run())
+
@@ -0,0 +1,141 @@
+import random
+from fastapi.testclient import TestClient
+from src.main import app
+from src.engine import get_initial_game_state, process_game_tick, is_valid_direction_change, DIRECTION_NAMES
+from src.models import Position
+from src.replay import HEADER, RECORD, MAGIC, FLAG_ATE, parse_range
+
+client = TestClient(app)
+
+def _play(auth_headers, ticks=60, seed=5):
+    """Play a random pass-through game through POST /api/spectate/update and submit its score."""
+    rng = random.Random(seed)
+    headers = auth_headers("Replayer")
+    state = get_initial_game_state('pass-through', rng).model_copy(update={"isPlaying": True})
+    states = [state]
+    for _ in range(ticks):
+        client.post("/api/spectate/update", headers=headers, json={
+            "username": "Replayer", "score": state.score, "gameMode": state.gameMode,
+            "snake": [s.model_dump() for s in state.snake], "food": state.food.model_dump()
+        })
+        options = [d for d in DIRECTION_NAMES if is_valid_direction_change(state.direction, d)]
+        state = process_game_tick(state, rng.choice(options), rng)
+        if state.isGameOver:
+            break
+        states.append(state)
+    client.post("/api/spectate/update", headers=headers, json={
+        "username": "Replayer", "score": state.score, "gameMode": state.gameMode,
+        "snake": [s.model_dump() for s in state.snake], "food": state.food.model_dump()
+    })
+    response = client.post("/api/leaderboard", headers=headers, json={"username": "Replayer", "score": state.score, "gameMode": state.gameMode})
+    return states, response.json()["data"]["id"]
+
+def test_replay_resimulates_game(auth_headers):
+    states, entry_id = _play(auth_headers)
+    response = client.get(f"/api/replays/{entry_id}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/octet-stream"
+    data = response.content
+
+    magic, version, mode, grid, food_x, food_y, started = HEADER.unpack_from(data)
+    assert magic == MAGIC and mode == 1 and grid == 20
+    ticks = (len(data) - HEADER.size) // RECORD.size
+    assert ticks == len(states) - 1
+    assert int(response.headers["x-replay-ticks"]) == ticks
+
+    # Re-run the game from the recorded inputs and food spawns
+    state = states[0].model_copy(update={"food": Position(x=food_x, y=food_y)})
+    for i in range(ticks):
+        code, fx, fy, score = RECORD.unpack_from(data, HEADER.size + i * RECORD.size)
+        state = process_game_tick(state, DIRECTION_NAMES[code & 0x03])
+        if code & FLAG_ATE:
+            state = state.model_copy(update={"food": Position(x=fx, y=fy)})
+        assert state.score == score
+        assert state.snake == states[i + 1].snake
+
+def test_replay_ranges(auth_headers):
+    _, entry_id = _play(auth_headers, ticks=10)
+    full = client.get(f"/api/replays/{entry_id}").content
+
+    response = client.get(f"/api/replays/{entry_id}", headers={"Range": f"bytes={HEADER.size}-{HEADER.size + 2 * RECORD.size - 1}"})
+    assert response.status_code == 206
+    assert response.content == full[HEADER.size:HEADER.size + 2 * RECORD.size]
+    assert response.headers["content-range"] == f"bytes {HEADER.size}-{HEADER.size + 2 * RECORD.size - 1}/{len(full)}"
+
+    assert client.get(f"/api/replays/{entry_id}", headers={"Range": "bytes=-5"}).content == full[-5:]
+    assert client.get(f"/api/replays/{entry_id}", headers={"Range": f"bytes={len(full)}-"}).status_code == 416
+
+def test_unknown_replay():
+    assert client.get("/api/replays/missing").status_code == 404
+    assert client.get("/api/replays/not.a.replay").status_code == 404
+
+def test_broken_recording_is_not_kept(auth_headers):
+    headers = auth_headers("Gappy")
+    state = get_initial_game_state('walls').model_copy(update={"isPlaying": True})
+    client.post("/api/spectate/update", headers=headers, json={
+        "username": "Gappy", "score": 0, "gameMode": "walls",
+        "snake": [s.model_dump() for s in state.snake], "food": state.food.model_dump()
+    })
+    # The head jumps three cells: an update was lost
+    jumped = [{"x": 13, "y": 10, "dotSide": "left"}, {"x": 12, "y": 10, "dotSide": "right"}, {"x": 11, "y": 10, "dotSide": "left"}]
+    client.post("/api/spectate/update", headers=headers, json={
+        "username": "Gappy", "score": 0, "gameMode": "walls", "snake": jumped, "food": state.food.model_dump()
+    })
+    entry = client.post("/api/leaderboard", headers=headers, json={"username": "Gappy", "score": 0, "gameMode": "walls"}).json()["data"]
+    assert client.get(f"/api/replays/{entry['id']}").status_code == 404
+
+def test_parse_range():
+    assert parse_range("bytes=0-9", 100) == (0, 10)
+    assert parse_range("bytes=90-", 100) == (90, 100)
+    assert parse_range("bytes=-10", 100) == (90, 100)
+    assert parse_range("bytes=95-200", 100) == (95, 100)
+    assert parse_range("bytes=100-", 100) is None
+    assert parse_range("bytes=0-1,4-5", 100) is None
+    assert parse_range("items=0-1", 100) is None
+
+def test_values_the_format_cannot_hold_discard_the_recording(auth_headers):
+    headers = auth_headers("Huge")
+    state = get_initial_game_state('walls').model_copy(update={"isPlaying": True})
+    snake = [s.model_dump() for s in state.snake]
+    # Food past the header's byte at the start of a game: nothing is recorded
+    response = client.post("/api/spectate/update", headers=headers, json={
+        "username": "Huge", "score": 0, "gameMode": "walls", "snake": snake, "food": {"x": 300, "y": 1}
+    })
+    assert response.status_code == 200
+
+    # A score past the record's uint16 mid-game: the recording is dropped, the update still applies
+    client.post("/api/spectate/update", headers=headers, json={
+        "username": "Huge", "score": 0, "gameMode": "walls", "snake": snake, "food": state.food.model_dump()
+    })
+    moved = [{"x": snake[0]["x"] + 1, "y": snake[0]["y"], "dotSide": "right"}] + snake[:2]
+    response = client.post("/api/spectate/update", headers=headers, json={
+        "username": "Huge", "score": 70000, "gameMode": "walls", "snake": moved, "food": state.food.model_dump()
+    })
+    assert response.status_code == 200
+    games = client.get("/api/spectate/active").json()["data"]
+    assert [g["score"] for g in games if g["username"] == "Huge"] == [70000]
+    entry = client.post("/api/leaderboard", headers=headers, json={"username": "Huge", "score": 70000, "gameMode": "walls"}).json()["data"]
+    assert client.get(f"/api/replays/{entry['id']}").status_code == 404
+
+def test_discarded_recordings_are_deleted_by_the_next_flush(tmp_path):
+    import asyncio
+    import os
+    from src.models import ActiveGame
+    from src.replay import ReplayRecorder
+
+    recorder = ReplayRecorder(str(tmp_path))
+    state = get_initial_game_state('walls')
+    game = ActiveGame(id="g1", username="u", score=0, gameMode="walls", snake=state.snake, food=state.food)
+    part = tmp_path / "g1.part"
+
+    async def run():
+        recorder.observe(game)
+        await recorder.flush()
+        assert part.exists()
+        recorder.discard("g1")
+        # Deleting is left to the flush, which runs off the event loop
+        assert part.exists()
+        await recorder.flush()
+        return os.listdir(tmp_path)
+
+    assert asyncio.run(run()) == []
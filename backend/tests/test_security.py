@@ -0,0 +1,136 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from sqlalchemy import select
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from src.main import app
+from src.db import AsyncSessionLocal
+from src.tables import User
+from passlib.context import CryptContext
+from src import security
+from src.security import PasswordHasher, PasswordHasherBusy, password_needs_rehash, create_access_token, decode_access_token
+from src.models import User as PydanticUser
+from src.config import BCRYPT_ROUNDS, AUTH_TOKEN_TTL, _parse_secret_keys
+
+client = TestClient(app)
+
+def test_hasher_rejects_when_saturated():
+    hasher = PasswordHasher(workers=1, queue_limit=1)
+    release = threading.Event()
+
+    async def run():
+        blocked = [asyncio.ensure_future(hasher._run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert hasher.pending == 2
+        with pytest.raises(PasswordHasherBusy):
+            await hasher.verify("password", "hash")
+        release.set()
+        await asyncio.gather(*blocked)
+        assert hasher.pending == 0
+        assert await hasher.verify("secret", await hasher.hash("secret"))
+
+    asyncio.run(run())
+    hasher.shutdown()
+
+def test_login_rehashes_when_cost_changes():
+    weak_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("password123")
+    assert password_needs_rehash(weak_hash)
+
+    async def seed():
+        async with AsyncSessionLocal() as session:
+            session.add(User(id="9", username="OldHash", email="old@game.com", hashed_password=weak_hash))
+            await session.commit()
+
+    async def stored_hash():
+        async with AsyncSessionLocal() as session:
+            return (await session.execute(select(User.hashed_password).where(User.id == "9"))).scalar_one()
+
+    asyncio.run(seed())
+    response = client.post("/api/auth/login", json={"email": "old@game.com", "password": "password123"})
+    assert response.json()["success"] is True
+
+    new_hash = asyncio.run(stored_hash())
+    assert new_hash != weak_hash
+    assert new_hash.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+    assert not password_needs_rehash(new_hash)
+
+USER = PydanticUser(id="42", username="Signer", email="signer@game.com")
+
+def test_token_round_trip_and_expiry():
+    token = create_access_token(USER, now=1_000)
+    claims = decode_access_token(token, now=1_001)
+    assert (claims.sub, claims.username) == ("42", "Signer")
+    assert decode_access_token(token, now=1_000 + AUTH_TOKEN_TTL) is None
+
+def test_tampered_token_is_rejected():
+    body, signature = create_access_token(USER).split(".")
+    forged_body = security._b64encode(security._b64decode(body).replace(b"Signer", b"Hacker"))
+    assert decode_access_token(f"{forged_body}.{signature}") is None
+    assert decode_access_token("garbage") is None
+
+def test_non_ascii_signature_is_rejected(seed_db_sync):
+    body = create_access_token(USER).split(".")[0]
+    assert decode_access_token(f"{body}.\u00e9") is None
+    assert decode_access_token(f"{body}.\ud800") is None
+    # Starlette reads header bytes as latin-1, so b"\xe9" arrives as "é"
+    headers = {"Authorization": f"Bearer {body}.\u00e9".encode("latin-1")}
+    response = client.post("/api/leaderboard", json={"score": 10, "gameMode": "walls"}, headers=headers)
+    assert response.status_code == 401
+    with client.websocket_connect("/api/spectate/ws/play") as ws:
+        ws.send_json({"token": f"{body}.\u00e9", "gameMode": "walls"})
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == 1008
+
+def test_failed_verifications_are_not_cached():
+    security._verified.clear()
+    token = create_access_token(USER)
+    assert decode_access_token(token) is not None
+    for i in range(10):
+        assert decode_access_token(f"{token}{i}") is None
+    assert list(security._verified) == [token]
+    security._verified.clear()
+
+def test_rotated_key_accepted_during_grace_window(monkeypatch):
+    old_token = create_access_token(USER)
+    old_kid = security._SIGNING_KEY_ID
+    monkeypatch.setattr(security, "_KEYS", {"new": b"new-secret", old_kid: security._KEYS[old_kid]})
+    monkeypatch.setattr(security, "_SIGNING_KEY_ID", "new")
+    not_after = time.time() + 3600
+    monkeypatch.setattr(security, "_KEYS_NOT_AFTER", {old_kid: not_after})
+    security._verified.clear()
+
+    # The window is fixed by configuration, so restarting a worker does not reopen it
+    assert decode_access_token(old_token, now=not_after - 1).username == "Signer"
+    assert decode_access_token(old_token, now=not_after) is None
+
+    new_token = create_access_token(USER)
+    assert decode_access_token(new_token).kid == "new"
+    security._verified.clear()
+
+def test_passlib_is_imported_on_first_use():
+    # A fresh interpreter, since this one imported passlib above
+    check = "import sys, src.main; print('passlib' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, check=True).stdout.strip() == "False"
+
+def test_secret_keys_parse_expiries():
+    assert _parse_secret_keys("k2:new:secret,k1:old-secret:1700000000,k0:older:2024-01-02") == [
+        ("k2", "new:secret", None), ("k1", "old-secret", 1_700_000_000.0), ("k0", "older", 1_704_153_600.0)
+    ]
+    assert _parse_secret_keys("generated-secret") == [("default", "generated-secret", None)]
+    with pytest.raises(ValueError):
+        _parse_secret_keys("k2:new,k1:old-secret")
+
+def test_production_refuses_the_development_key():
+    check = "import src.config"
+    env = {**os.environ, "DB_PROFILE": "production"}
+    env.pop("AUTH_SECRET_KEYS", None)
+    refused = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, env=env)
+    assert refused.returncode != 0 and "AUTH_SECRET_KEYS" in refused.stderr
+    env["AUTH_SECRET_KEYS"] = "prod:a-real-secret"
+    subprocess.run([sys.executable, "-c", check], check=True, env=env)
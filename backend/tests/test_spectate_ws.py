@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+import pytest
+from src.main import app
+from src.models import User
+from src.security import create_access_token
+from src.live import hub as live_hub
+
+client = TestClient(app)
+
+def _token(username, user_id):
+    return create_access_token(User(id=user_id, username=username, email="snake@game.com"))
+
+def _hello(**extra):
+    return {"token": _token("SnakeMaster", "1"), "gameMode": "walls", **extra}
+
+HEADERS = {"Authorization": f"Bearer {_token('SnakeMaster', '1')}"}
+
+def test_play_websocket_streams_ticks(seed_db_sync):
+    with client.websocket_connect("/api/spectate/ws/play") as ws:
+        ws.send_json(_hello(ack=True))
+        assert ws.receive_json() == {"success": True}
+
+        ws.send_json({"s": 60, "k": [[11, 10, 1], [10, 10, 0]], "f": [4, 4], "q": 1})
+        assert ws.receive_json() == {"ack": 1}
+        ws.send_json({"s": 70, "k": [[12, 10, 0], [11, 10, 1], [10, 10, 0]], "f": [7, 7], "q": 2})
+        assert ws.receive_json() == {"ack": 2}
+
+    data = client.get("/api/spectate/game1").json()["data"]
+    assert data["score"] == 70
+    assert data["snake"][0] == {"x": 12, "y": 10, "dotSide": "left"}
+    assert data["snake"][1]["dotSide"] == "right"
+    assert data["food"] == {"x": 7, "y": 7}
+
+def test_play_websocket_without_acks(seed_db_sync):
+    with client.websocket_connect("/api/spectate/ws/play") as ws:
+        ws.send_json(_hello())
+        assert ws.receive_json() == {"success": True}
+        ws.send_json({"s": 5, "k": [[1, 1, 0]], "f": [2, 2], "q": 1})
+        ws.send_json({"s": "bad"})
+        assert ws.receive_json() == {"success": False, "error": "Invalid frame"}
+
+    assert client.get("/api/spectate/game1").json()["data"]["score"] == 5
+
+def test_play_websocket_rejects_bad_token(seed_db_sync):
+    with client.websocket_connect("/api/spectate/ws/play") as ws:
+        ws.send_json(_hello(token=_token("SnakeMaster", "1") + "x"))
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == 1008
+
+def test_play_websocket_rejects_unknown_game_mode(seed_db_sync):
+    for mode in ("portals", ["walls"]):
+        with client.websocket_connect("/api/spectate/ws/play") as ws:
+            ws.send_json(_hello(gameMode=mode))
+            with pytest.raises(WebSocketDisconnect) as exc:
+                ws.receive_json()
+        assert exc.value.code == 1008
+
+def test_watch_websocket_pushes_updates(seed_db_sync):
+    with TestClient(app) as c:
+        with c.websocket_connect("/api/spectate/game1/ws") as viewer:
+            assert viewer.receive_json()["score"] == 45
+
+            c.post("/api/spectate/update", json={
+                "username": "SnakeMaster",
+                "score": 55,
+                "gameMode": "walls",
+                "snake": [{"x": 11, "y": 10, "dotSide": "right"}],
+                "food": {"x": 5, "y": 5}
+            }, headers=HEADERS)
+            state = viewer.receive_json()
+            assert state["id"] == "game1"
+            assert state["score"] == 55
+            assert state["snake"] == [{"x": 11, "y": 10, "dotSide": "right"}]
+
+def test_watch_websocket_unknown_game(seed_db_sync):
+    with client.websocket_connect("/api/spectate/missing/ws") as viewer:
+        assert viewer.receive_json() == {"success": False, "error": "Game not found"}
+
+def test_watch_events_unknown_game(seed_db_sync):
+    response = client.get("/api/spectate/missing/events")
+    assert response.json() == {"success": False, "data": None, "error": "Game not found"}
+
+def test_watch_events_streams_state_and_end(seed_db_sync):
+    with TestClient(app) as c:
+        responses = []
+        # The response only returns once the stream ends, so it is read on another thread
+        reader = threading.Thread(target=lambda: responses.append(c.get("/api/spectate/game1/events")))
+        reader.start()
+        for _ in range(200):
+            if live_hub.viewer_count("game1"):
+                break
+            time.sleep(0.01)
+        assert live_hub.viewer_count("game1") == 1
+
+        # Submitting a score ends the game, which ends every spectator's stream
+        c.post("/api/leaderboard", json={"username": "SnakeMaster", "score": 45, "gameMode": "walls"}, headers=HEADERS)
+        reader.join(5)
+        assert not reader.is_alive()
+
+    response = responses[0]
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [e for e in response.text.split("\n\n") if e and not e.startswith(":")]
+    assert events[0].startswith("data: ")
+    state = json.loads(events[0][len("data: "):])
+    assert (state["id"], state["score"]) == ("game1", 45)
+    assert events[-1] == "event: end\ndata: {}"
+    assert live_hub.viewer_count("game1") == 0
+
+def test_play_websocket_deltas_and_resync(seed_db_sync):
+    with client.websocket_connect("/api/spectate/ws/play") as ws:
+        ws.send_json(_hello(ack=True))
+        assert ws.receive_json() == {"success": True}
+
+        ws.send_json({"q": 1, "s": 0, "k": [[10, 10, 0], [9, 10, 1]], "f": [4, 4]})
+        assert ws.receive_json() == {"ack": 1}
+        ws.send_json({"q": 2, "h": [[11, 10, 1]], "p": 1})
+        assert ws.receive_json() == {"ack": 2}
+        ws.send_json({"q": 4, "h": [[12, 10, 0]], "p": 1})
+        assert ws.receive_json() == {"resync": True, "q": 2}
+
+    data = client.get("/api/spectate/game1").json()["data"]
+    assert [(s["x"], s["dotSide"]) for s in data["snake"]] == [(11, "right"), (10, "left")]
+
+def test_http_delta_update_and_catch_up(seed_db_sync):
+    client.post("/api/spectate/update", json={
+        "username": "SnakeMaster",
+        "score": 45,
+        "gameMode": "walls",
+        "snake": [{"x": 10, "y": 10, "dotSide": "left"}],
+        "food": {"x": 5, "y": 5}
+    }, headers=HEADERS)
+    keyframe = client.get("/api/spectate/game1/delta").json()["data"]
+    assert len(keyframe) == 1
+    seq = keyframe[0]["q"]
+    assert keyframe[0]["k"] == [[10, 10, 0]]
+
+    response = client.post("/api/spectate/delta", json={"username": "SnakeMaster", "q": seq + 1, "h": [[11, 10, 1]], "p": 1, "s": 55}, headers=HEADERS)
+    assert response.json()["success"] is True
+    response = client.post("/api/spectate/delta", json={"username": "SnakeMaster", "q": seq + 5, "h": [[12, 10, 0]], "p": 1}, headers=HEADERS)
+    assert response.json() == {"success": False, "data": {"q": seq + 1}, "error": "Resync required"}
+
+    deltas = client.get(f"/api/spectate/game1/delta?since={seq}").json()["data"]
+    assert deltas == [{"q": seq + 1, "h": [[11, 10, 1]], "p": 1, "s": 55}]
+    assert client.get("/api/spectate/missing/delta").json()["error"] == "Game not found"
+
+def test_watch_websocket_delta_format(seed_db_sync):
+    with TestClient(app) as c:
+        with c.websocket_connect("/api/spectate/game1/ws?format=delta") as viewer:
+            keyframe = viewer.receive_json()
+            assert keyframe["k"] == [[10, 10, 0]]
+
+            c.post("/api/spectate/delta", json={"username": "SnakeMaster", "q": keyframe["q"] + 1, "h": [[11, 10, 1]], "p": 1}, headers=HEADERS)
+            assert viewer.receive_json() == {"q": keyframe["q"] + 1, "h": [[11, 10, 1]], "p": 1}
@@ -0,0 +1,96 @@
+import asyncio
+import gzip
+import pytest
+from fastapi.testclient import TestClient
+from src.main import app
+from src.static import static_site, precompress, accepted_encodings, brotli
+
+client = TestClient(app)
+BUNDLE = b"console.log('snake');\n" * 200
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_text("<!doctype html><title>Snake</title>" + " " * 400)
+    (tmp_path / "assets" / "index-Ab12Cd34.js").write_bytes(BUNDLE)
+    (tmp_path / "favicon.ico").write_bytes(b"\x00\x01" * 10)
+    monkeypatch.setattr(static_site, "directory", str(tmp_path))
+    static_site.clear()
+    yield tmp_path
+    static_site.clear()
+
+def test_accept_encoding_parsing():
+    assert accepted_encodings("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("br;q=0, gzip;q=0.5") == {"gzip"}
+    assert accepted_encodings(None) == set()
+
+def test_hashed_assets_are_immutable_and_compressed(site):
+    response = client.get("/assets/index-Ab12Cd34.js", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.content == BUNDLE
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert "Accept-Encoding" in response.headers["vary"]
+
+    identity = client.get("/assets/index-Ab12Cd34.js", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] != response.headers["etag"]
+
+@pytest.mark.skipif(brotli is None, reason="brotli not installed")
+def test_brotli_is_preferred(site):
+    response = client.get("/assets/index-Ab12Cd34.js", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.content == BUNDLE
+
+def test_index_revalidates_with_etag(site):
+    response = client.get("/spectate", headers={"Accept-Encoding": "identity"})
+    assert response.text.startswith("<!doctype html>")
+    assert response.headers["cache-control"] == "no-cache"
+
+    cached = client.get("/", headers={"Accept-Encoding": "identity", "If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+def test_files_are_indexed_once(site):
+    client.get("/favicon.ico")
+    (site / "robots.txt").write_text("User-agent: *")
+    (site / "favicon.ico").unlink()
+    # Served from memory, and files added after indexing fall back to index.html
+    assert client.get("/favicon.ico").content == b"\x00\x01" * 10
+    assert client.get("/robots.txt").text.startswith("<!doctype html>")
+
+def test_missing_asset_is_not_found(site):
+    assert client.get("/assets/index-gone.js").status_code == 404
+
+def test_large_files_use_build_time_variants(site, monkeypatch):
+    monkeypatch.setattr(static_site, "memory_limit", 1024)
+    assert precompress(str(site)) >= 1
+    assert (site / "assets" / "index-Ab12Cd34.js.gz").exists()
+    response = client.get("/assets/index-Ab12Cd34.js", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == BUNDLE
+    assert asyncio.run(static_site.get("assets/index-Ab12Cd34.js")).body is None
+    # Precompressed siblings are variants, not separately served files
+    assert asyncio.run(static_site.get("assets/index-Ab12Cd34.js.gz")) is None
+    assert gzip.decompress((site / "assets" / "index-Ab12Cd34.js.gz").read_bytes()) == BUNDLE
+
+def test_index_is_built_once_off_the_event_loop(site, monkeypatch):
+    scan = static_site._scan
+    on_loop = []
+
+    def recording_scan():
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return scan()
+
+    monkeypatch.setattr(static_site, "_scan", recording_scan)
+
+    async def run():
+        return await asyncio.gather(static_site.get("index.html"), static_site.get("favicon.ico"))
+
+    assert all(entry is not None for entry in asyncio.run(run()))
+    assert client.get("/").status_code == 200
+    assert on_loop == [False]
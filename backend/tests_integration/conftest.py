@@ -8,6 +8,11 @@ import os
 from src.main import app
 from src.db import get_db
 from src.tables import Base
+from src.security import create_access_token
+from src.models import User as PydanticUser
+from src.live import hub as live_hub
+from src.ranking import leaderboard_cache
+from src.replay import replay_recorder, replay_store
 
 # Use a separate test database
 TEST_DATABASE_URL = "sqlite+aiosqlite:///./test_integration.db"
@@ -22,10 +27,15 @@ async def engine():
         os.remove("./test_integration.db")
 
 @pytest_asyncio.fixture(scope="function")
-async def db_session(engine) -> AsyncGenerator[AsyncSession, None]:
+async def db_session(engine, tmp_path) -> AsyncGenerator[AsyncSession, None]:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    live_hub.clear()
+    leaderboard_cache.invalidate()
+    replay_recorder.clear()
+    replay_store.clear()
+    replay_recorder.directory = str(tmp_path / "replays")
     session_maker = async_sessionmaker(engine, expire_on_commit=False)
     async with session_maker() as session:
         yield session
@@ -47,3 +57,12 @@ async def client(db_session) -> AsyncGenerator[AsyncClient, None]:
         yield c
     
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def auth_headers():
+    """Build a bearer token header for any username; tokens are stateless, so no user row is needed."""
+    def build(username, user_id=None):
+        user = PydanticUser.model_construct(id=user_id or username, username=username, email=f"{username}@game.com")
+        return {"Authorization": f"Bearer {create_access_token(user)}"}
+    return build
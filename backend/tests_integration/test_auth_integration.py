@@ -31,13 +31,16 @@ async def test_register_and_login(client: AsyncClient):
     assert data["token"] is not None
     
     # 3. Access a protected route (e.g., get current user)
-    # Note: The current /me implementation doesn't check token, but let's test it anyway
     headers = {"Authorization": f"Bearer {token}"}
     response = await client.get("/api/auth/me", headers=headers)
     assert response.status_code == 200
     data = response.json()
-    # The current mock implementation returns data=None
     assert data["success"] is True
+    assert data["data"]["username"] == "testuser"
+
+    # 4. Without a token nobody is logged in
+    response = await client.get("/api/auth/me")
+    assert response.json()["data"] is None
 
 @pytest.mark.asyncio
 async def test_login_invalid_credentials(client: AsyncClient):
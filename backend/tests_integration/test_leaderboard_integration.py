@@ -2,14 +2,14 @@ import pytest
 from httpx import AsyncClient
 
 @pytest.mark.asyncio
-async def test_leaderboard_flow(client: AsyncClient):
-    # 1. Submit a score (The current API trusts the username in the body, no auth required for this endpoint yet)
+async def test_leaderboard_flow(client: AsyncClient, auth_headers):
+    # 1. Submit a score (the token must belong to the username in the body)
     score_payload = {
         "username": "gamer1",
         "score": 100,
         "gameMode": "pass-through"
     }
-    response = await client.post("/api/leaderboard", json=score_payload)
+    response = await client.post("/api/leaderboard", json=score_payload, headers=auth_headers("gamer1"))
     assert response.status_code == 200
     data = response.json()
     assert data["success"] is True
@@ -29,10 +29,10 @@ async def test_leaderboard_flow(client: AsyncClient):
     assert entries[0]["score"] == 100
 
 @pytest.mark.asyncio
-async def test_leaderboard_filter(client: AsyncClient):
+async def test_leaderboard_filter(client: AsyncClient, auth_headers):
     # Submit scores for different modes
-    await client.post("/api/leaderboard", json={"username": "u1", "score": 10, "gameMode": "pass-through"})
-    await client.post("/api/leaderboard", json={"username": "u2", "score": 20, "gameMode": "walls"})
+    await client.post("/api/leaderboard", json={"username": "u1", "score": 10, "gameMode": "pass-through"}, headers=auth_headers("u1"))
+    await client.post("/api/leaderboard", json={"username": "u2", "score": 20, "gameMode": "walls"}, headers=auth_headers("u2"))
 
     # Filter by pass-through
     response = await client.get("/api/leaderboard?gameMode=pass-through")
@@ -43,7 +43,7 @@ async def test_leaderboard_filter(client: AsyncClient):
     assert not any(e["username"] == "u2" for e in entries)
 
 @pytest.mark.asyncio
-async def test_leaderboard_invalid_gamemode(client: AsyncClient):
+async def test_leaderboard_invalid_gamemode(client: AsyncClient, auth_headers):
     # Submit score with invalid game mode
     # Pydantic validation should catch this and return 422
     score_payload = {
@@ -51,6 +51,34 @@ async def test_leaderboard_invalid_gamemode(client: AsyncClient):
         "score": 9999,
         "gameMode": "invalid-mode"
     }
-    response = await client.post("/api/leaderboard", json=score_payload)
+    response = await client.post("/api/leaderboard", json=score_payload, headers=auth_headers("hacker"))
     assert response.status_code == 422
 
+
+@pytest.mark.asyncio
+async def test_leaderboard_keyset_pagination(client: AsyncClient, auth_headers):
+    for i, score in enumerate([50, 40, 40, 30, 20]):
+        await client.post("/api/leaderboard", json={"username": f"p{i}", "score": score, "gameMode": "walls"}, headers=auth_headers(f"p{i}"))
+    await client.post("/api/leaderboard", json={"username": "other", "score": 45, "gameMode": "pass-through"}, headers=auth_headers("other"))
+
+    seen = []
+    cursor = None
+    while True:
+        url = "/api/leaderboard?gameMode=walls&limit=2" + (f"&cursor={cursor}" if cursor else "")
+        data = (await client.get(url)).json()
+        assert data["success"] is True
+        assert len(data["data"]) <= 2
+        seen.extend(data["data"])
+        cursor = data["nextCursor"]
+        if cursor is None:
+            break
+
+    assert [e["score"] for e in seen] == [50, 40, 40, 30, 20]
+    assert len({e["id"] for e in seen}) == 5
+
+@pytest.mark.asyncio
+async def test_leaderboard_invalid_cursor(client: AsyncClient):
+    response = await client.get("/api/leaderboard?cursor=not-a-cursor")
+    data = response.json()
+    assert data["success"] is False
+    assert data["error"] == "Invalid cursor"
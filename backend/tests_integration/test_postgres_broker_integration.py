@@ -0,0 +1,47 @@
+import asyncio
+import os
+import pytest
+from sqlalchemy.engine import make_url
+from src.broker import PostgresBroker, postgres_connector
+
+# CI points this at its PostgreSQL service; without it there is no server to test against
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+async def _wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+@pytest.mark.asyncio
+async def test_postgres_broker_survives_a_terminated_connection(monkeypatch):
+    monkeypatch.setattr(PostgresBroker, "RETRY_DELAY", 0.05)
+    connect = postgres_connector(make_url(TEST_POSTGRES_URL))
+    received = {"a": [], "b": []}
+    resyncs = []
+    broker_a, broker_b = PostgresBroker(connect, "test_live"), PostgresBroker(connect, "test_live")
+    await broker_a.start({"game": received["a"].append, "leaderboard": resyncs.append})
+    await broker_b.start({"game": received["b"].append})
+    try:
+        broker_a.publish("game", {"t": "remove", "id": "g1"})
+        await _wait_for(lambda: received["b"])
+        assert received["a"] == []
+
+        # What a database restart or an idle-connection killer does to the LISTEN connection
+        admin = await connect()
+        try:
+            await admin.execute("SELECT pg_terminate_backend($1)", broker_a._driver.get_server_pid())
+        finally:
+            await admin.close()
+        await _wait_for(lambda: broker_a.reconnects == 1)
+        assert resyncs == [{"t": "resync"}]
+
+        broker_b.publish("game", {"t": "remove", "id": "g2"})
+        await _wait_for(lambda: received["a"])
+        broker_a.publish("game", {"t": "remove", "id": "g3"})
+        await _wait_for(lambda: [m["id"] for m in received["b"]] == ["g1", "g3"])
+    finally:
+        await broker_a.stop()
+        await broker_b.stop()
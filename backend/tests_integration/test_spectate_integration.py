@@ -2,7 +2,7 @@ import pytest
 from httpx import AsyncClient
 
 @pytest.mark.asyncio
-async def test_spectate_flow(client: AsyncClient):
+async def test_spectate_flow(client: AsyncClient, auth_headers):
     # 1. Update game state (Simulate a user playing)
     update_payload = {
         "username": "player1",
@@ -11,7 +11,7 @@ async def test_spectate_flow(client: AsyncClient):
         "snake": [{"x": 10, "y": 10, "dotSide": "left"}],
         "food": {"x": 5, "y": 5}
     }
-    response = await client.post("/api/spectate/update", json=update_payload)
+    response = await client.post("/api/spectate/update", json=update_payload, headers=auth_headers("player1"))
     assert response.status_code == 200
     assert response.json()["success"] is True
 
@@ -1,56 +1,84 @@
 import React, { useEffect, useState } from 'react';
-import { ActiveGame } from '@/types/game';
+import { ActiveGame, ActiveGameSummary } from '@/types/game';
 import { api } from '@/services/api';
 import SnakeCanvas from '@/components/game/SnakeCanvas';
 import { Users, Eye } from 'lucide-react';
 
 interface SpectatorViewProps {
-  game: ActiveGame;
+  summary: ActiveGameSummary;
 }
 
-const SpectatorView: React.FC<SpectatorViewProps> = ({ game: initialGame }) => {
-  const [game, setGame] = useState<ActiveGame>(initialGame);
+const SpectatorView: React.FC<SpectatorViewProps> = ({ summary }) => {
+  // The list only carries summaries; the full state arrives from the stream or the first poll
+  const [game, setGame] = useState<ActiveGame | null>(null);
+  const gameId = summary.id;
 
   useEffect(() => {
-    const interval = setInterval(async () => {
-      const response = await api.spectate.getGameState(game.id);
-      if (response.success && response.data) {
-        setGame(response.data);
-      }
-    }, 200);
+    let interval: ReturnType<typeof setInterval> | undefined;
 
-    return () => clearInterval(interval);
-  }, [game.id]);
+    const startPolling = () => {
+      interval = setInterval(async () => {
+        const response = await api.spectate.getGameState(gameId);
+        if (response.success && response.data) {
+          setGame(response.data);
+        }
+      }, 200);
+    };
+
+    // Prefer server push; fall back to polling when the stream is unavailable
+    if (typeof EventSource === 'undefined') {
+      startPolling();
+      return () => clearInterval(interval);
+    }
+
+    const source = new EventSource(`/api/spectate/${gameId}/events`);
+    source.onmessage = (event) => {
+      setGame(JSON.parse(event.data));
+    };
+    // The game finished or expired; keep showing its last state
+    source.addEventListener('end', () => source.close());
+    source.onerror = () => {
+      source.close();
+      if (!interval) startPolling();
+    };
+
+    return () => {
+      source.close();
+      clearInterval(interval);
+    };
+  }, [gameId]);
 
   return (
     <div className="game-container">
       <div className="flex items-center justify-between mb-4">
         <div className="flex items-center gap-2">
           <Eye className="w-4 h-4 text-primary" />
-          <span className="text-primary font-medium">{game.username}</span>
+          <span className="text-primary font-medium">{summary.username}</span>
         </div>
         <div className="flex items-center gap-4">
           <span className="text-sm text-muted-foreground">
-            Mode: {game.gameMode === 'walls' ? 'Walls' : 'Pass-through'}
+            Mode: {summary.gameMode === 'walls' ? 'Walls' : 'Pass-through'}
           </span>
-          <span className="font-arcade text-primary">{game.score}</span>
+          <span className="font-arcade text-primary">{game?.score ?? summary.score}</span>
         </div>
       </div>
       <div className="flex justify-center">
-        <SnakeCanvas
-          snake={game.snake}
-          food={game.food}
-          gridSize={20}
-          cellSize={15}
-        />
+        {game && (
+          <SnakeCanvas
+            snake={game.snake}
+            food={game.food}
+            gridSize={20}
+            cellSize={15}
+          />
+        )}
       </div>
     </div>
   );
 };
 
 interface SpectatorListProps {
-  games: ActiveGame[];
-  onSelectGame: (game: ActiveGame) => void;
+  games: ActiveGameSummary[];
+  onSelectGame: (game: ActiveGameSummary) => void;
   selectedGameId?: string;
 }
 
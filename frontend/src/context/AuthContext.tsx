@@ -45,6 +45,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
                     if (response.success === true && response.data === null) {
                         setUser(null);
                         localStorage.removeItem('user');
+                        localStorage.removeItem('token');
                     }
                 }
             } catch (e) {
@@ -65,6 +66,9 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
             if (response.success && response.user) {
                 setUser(response.user);
                 localStorage.setItem('user', JSON.stringify(response.user));
+                if (response.token) {
+                    localStorage.setItem('token', response.token);
+                }
                 return true;
             }
             setError(response.error || 'Login failed');
@@ -86,6 +90,9 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
             if (response.success && response.user) {
                 setUser(response.user);
                 localStorage.setItem('user', JSON.stringify(response.user));
+                if (response.token) {
+                    localStorage.setItem('token', response.token);
+                }
                 return true;
             }
             setError(response.error || 'Signup failed');
@@ -106,6 +113,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
         } finally {
             setUser(null);
             localStorage.removeItem('user');
+            localStorage.removeItem('token');
         }
     }, []);
 
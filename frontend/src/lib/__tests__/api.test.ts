@@ -56,7 +56,7 @@ describe('API Service - Authentication', () => {
       }
 
       if (url.includes('/spectate/active')) {
-        return { ok: true, json: async () => ({ success: true, data: [{ id: 'game1', username: 'Player1', score: 10, gameMode: 'walls', snake: [{ x: 10, y: 10, dotSide: 'left' }], food: { x: 5, y: 5 } }] }) };
+        return { ok: true, json: async () => ({ success: true, data: [{ id: 'game1', username: 'Player1', score: 10, gameMode: 'walls', snakeLength: 1, viewers: 0 }], nextCursor: null }) };
       }
 
       if (url.includes('/spectate/')) {
@@ -276,25 +276,16 @@ describe('API Service - Spectate', () => {
       expect(game).toHaveProperty('username');
       expect(game).toHaveProperty('score');
       expect(game).toHaveProperty('gameMode');
-      expect(game).toHaveProperty('snake');
-      expect(game).toHaveProperty('food');
+      expect(game).toHaveProperty('snakeLength');
+      expect(game).toHaveProperty('viewers');
     });
 
-    it('should return games with valid snake data', async () => {
+    it('should return summaries without snake bodies', async () => {
       const response = await api.spectate.getActiveGames();
       const game = response.data![0];
-      expect(Array.isArray(game.snake)).toBe(true);
-      expect(game.snake.length).toBeGreaterThan(0);
-      expect(game.snake[0]).toHaveProperty('x');
-      expect(game.snake[0]).toHaveProperty('y');
-      expect(game.snake[0]).toHaveProperty('dotSide');
-    });
-
-    it('should return games with valid food data', async () => {
-      const response = await api.spectate.getActiveGames();
-      const game = response.data![0];
-      expect(game.food).toHaveProperty('x');
-      expect(game.food).toHaveProperty('y');
+      expect(game.snakeLength).toBeGreaterThan(0);
+      expect(game).not.toHaveProperty('snake');
+      expect(response.nextCursor).toBeNull();
     });
   });
 
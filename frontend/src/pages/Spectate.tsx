@@ -1,12 +1,12 @@
 import React, { useEffect, useState } from 'react';
-import { ActiveGame } from '@/types/game';
+import { ActiveGameSummary } from '@/types/game';
 import { api } from '@/services/api';
 import SpectatorView, { SpectatorList } from '@/components/spectate/SpectatorView';
 import { Eye, Loader2 } from 'lucide-react';
 
 const Spectate: React.FC = () => {
-  const [games, setGames] = useState<ActiveGame[]>([]);
-  const [selectedGame, setSelectedGame] = useState<ActiveGame | null>(null);
+  const [games, setGames] = useState<ActiveGameSummary[]>([]);
+  const [selectedGame, setSelectedGame] = useState<ActiveGameSummary | null>(null);
   const [isLoading, setIsLoading] = useState(true);
 
   useEffect(() => {
@@ -61,7 +61,7 @@ const Spectate: React.FC = () => {
 
           <div className="flex-1">
             {selectedGame ? (
-              <SpectatorView key={selectedGame.id} game={selectedGame} />
+              <SpectatorView key={selectedGame.id} summary={selectedGame} />
             ) : (
               <div className="game-container text-center py-12">
                 <p className="text-muted-foreground">
@@ -1,13 +1,16 @@
-import { User, LeaderboardEntry, ActiveGame, AuthResponse, ApiResponse, GameMode } from '@/types/game';
+import { User, LeaderboardEntry, ActiveGame, ActiveGameSummary, AuthResponse, ApiResponse, PageResponse, GameMode } from '@/types/game';
 
 // Helper for making API requests
 // T is the full response body type
 const request = async <T>(endpoint: string, options?: RequestInit): Promise<T> => {
   try {
+    // Session token issued by login/signup, sent on every request
+    const token = localStorage.getItem('token');
     const response = await fetch(`/api${endpoint}`, {
       ...options,
       headers: {
         'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
         ...options?.headers,
       },
     });
@@ -76,8 +79,8 @@ export const leaderboardApi = {
 
 // Spectate API
 export const spectateApi = {
-  async getActiveGames(): Promise<ApiResponse<ActiveGame[]>> {
-    return request<ApiResponse<ActiveGame[]>>('/spectate/active');
+  async getActiveGames(): Promise<PageResponse<ActiveGameSummary[]>> {
+    return request<PageResponse<ActiveGameSummary[]>>('/spectate/active');
   },
 
   async getGameState(gameId: string): Promise<ApiResponse<ActiveGame | null>> {
@@ -45,6 +45,15 @@ export interface ActiveGame {
   food: Position;
 }
 
+export interface ActiveGameSummary {
+  id: string;
+  username: string;
+  score: number;
+  gameMode: GameMode;
+  snakeLength: number;
+  viewers: number;
+}
+
 export interface AuthResponse {
   success: boolean;
   user?: User;
@@ -56,3 +65,7 @@ export interface ApiResponse<T> {
   data?: T;
   error?: string;
 }
+
+export interface PageResponse<T> extends ApiResponse<T> {
+  nextCursor?: string | null;
+}